@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import glob
+import subprocess
+import pandas as pd
+import soundfile as sf
+
+# per study index of audio durations, read from file headers only (no decoding)
+# saved as a CSV under PROTECTED/<study>, keyed by path relative to that study folder, and updated incrementally using file size + mtime
+# this lets the transcription length limit and email cost estimate be computed without loading audio or depending on the DPDash QC CSVs
+index_name = "audio_duration_index.csv"
+index_columns = ["path", "size", "mtime_ns", "duration_seconds"]
+
+# get duration in seconds of a single audio file from its header
+# soundfile handles WAVs, anything it can't open (e.g. the raw m4a Zoom audio) falls back on ffprobe
+def get_audio_duration(path):
+	try:
+		return float(sf.info(path).duration)
+	except:
+		pass
+	result = subprocess.run(["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", path], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True)
+	return float(result.stdout.strip())
+
+# load the current index for a study as a dict from relative path to (size, mtime, duration)
+def load_duration_index(data_root, study):
+	index_path = os.path.join(data_root, "PROTECTED", study, index_name)
+	if not os.path.exists(index_path):
+		return {}
+	try:
+		index_df = pd.read_csv(index_path)
+	except:
+		print("Problem loading audio duration index for " + study + ", rebuilding")
+		return {}
+	return {p: (s, m, d) for p, s, m, d in zip(index_df["path"], index_df["size"], index_df["mtime_ns"], index_df["duration_seconds"])}
+
+def save_duration_index(data_root, study, index):
+	index_path = os.path.join(data_root, "PROTECTED", study, index_name)
+	index_df = pd.DataFrame([[p] + list(v) for p, v in index.items()], columns=index_columns)
+	index_df.sort_values(by="path", inplace=True)
+	# write to a temporary file first so an interrupted run never leaves a truncated index behind
+	index_df.to_csv(index_path + ".tmp", index=False)
+	os.replace(index_path + ".tmp", index_path)
+
+# get durations (in seconds) for a list of audio paths, using the index where the file is unchanged and reading headers otherwise
+# returns a dict from each input path to its duration, with None for any file that could not be read
+# index is saved back to disk if anything new was added (and prune=True also drops entries for files that no longer exist)
+def lookup_durations(data_root, study, paths, prune=False):
+	study_root = os.path.join(data_root, "PROTECTED", study)
+	index = load_duration_index(data_root, study)
+	changed = False
+	durations = {}
+	for path in paths:
+		rel_path = os.path.relpath(os.path.abspath(path), study_root)
+		try:
+			stat = os.stat(path)
+		except:
+			durations[path] = None
+			continue
+		cached = index.get(rel_path)
+		if cached is not None and int(cached[0]) == stat.st_size and int(cached[1]) == stat.st_mtime_ns:
+			durations[path] = float(cached[2])
+			continue
+		try:
+			duration = get_audio_duration(path)
+		except:
+			print("Could not read audio duration for " + path)
+			durations[path] = None
+			continue
+		index[rel_path] = (stat.st_size, stat.st_mtime_ns, duration)
+		durations[path] = duration
+		changed = True
+
+	if prune:
+		for rel_path in list(index.keys()):
+			if not os.path.exists(os.path.join(study_root, rel_path)):
+				del index[rel_path]
+				changed = True
+
+	if changed:
+		save_duration_index(data_root, study, index)
+	return durations
+
+# all the audio files the pipeline handles for a study - raw Zoom/onsite audio as well as processed WAVs at each stage
+def study_audio_paths(data_root, study):
+	study_root = os.path.join(data_root, "PROTECTED", study)
+	patterns = ["raw/*/interviews/*/*/*.m4a", "raw/*/interviews/*/*.WAV", "processed/*/interviews/*/*/*.wav"]
+	paths = []
+	for pattern in patterns:
+		paths.extend(glob.glob(os.path.join(study_root, pattern)))
+	return paths
+
+# bring the index fully up to date for a study
+def update_duration_index(data_root, study):
+	durations = lookup_durations(data_root, study, study_audio_paths(data_root, study), prune=True)
+	print("Audio duration index for " + study + " covers " + str(len(durations)) + " files")
+
+if __name__ == '__main__':
+	# Map command line arguments to function arguments.
+	update_duration_index(sys.argv[1], sys.argv[2])
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+
+# prevent librosa from logging a warning every time it is imported
+import warnings
+warnings.filterwarnings("ignore", category=FutureWarning)
+
+import os
+import sys
+import glob
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+# imported once here, so each worker process pays the pandas/numpy/scipy/librosa import cost only once for the whole study
+from sliding_audio_qc_func import sliding_audio_qc
+
+# runs sliding window (and whole file) audio QC on a single pending file, catching any failure so it can be logged in the manifest
+# sliding_audio_qc signals failure for the pipeline via sys.exit(1), so SystemExit needs to be caught here too
+def _run_one_file(wav_path, streaming):
+	name = os.path.basename(wav_path)[:-len(".wav")]
+	out_folder = os.path.join(os.path.dirname(os.path.dirname(wav_path)), "sliding_window_audio_qc", "temp")
+	try:
+		sliding_audio_qc(wav_path, os.path.join(out_folder, name + ".csv"), streaming=streaming, overall_savepath=os.path.join(out_folder, name + ".json"))
+	except SystemExit as e:
+		if e.code is None or e.code == 0:
+			return "success", ""
+		return "failed", "sliding audio QC exited with an error"
+	except Exception as e:
+		return "failed", str(e)
+	return "success", ""
+
+# study-wide audio QC - finds all pending temp_audio WAVs across patients and both interview types, and QCs them on a pool of worker processes
+# writes a manifest CSV with one row per file, giving success or failure, for the bash wrapper to use in its error handling
+def audio_qc_batch(data_root, study, num_workers=1, streaming=False, manifest_path=None):
+	processed_root = os.path.join(data_root, "PROTECTED", study, "processed")
+	pending = []
+	for interview_type in ["open", "psychs"]:
+		cur_paths = glob.glob(os.path.join(processed_root, "*", "interviews", interview_type, "temp_audio", "*.wav"))
+		for wav_path in cur_paths:
+			ptID = wav_path.split("/")[-5]
+			pending.append((interview_type, ptID, wav_path))
+
+	if len(pending) == 0:
+		print("No new audio files to run QC on for study " + study)
+
+	# make the temporary holding folders for the outputs, as was previously done per patient in bash
+	for interview_type, ptID, wav_path in pending:
+		os.makedirs(os.path.join(os.path.dirname(os.path.dirname(wav_path)), "sliding_window_audio_qc", "temp"), exist_ok=True)
+
+	# start the longest recordings first so they don't end up holding up the pool at the end
+	pending.sort(key=lambda x: os.path.getsize(x[2]), reverse=True)
+	with ProcessPoolExecutor(max_workers=num_workers) as executor:
+		futures = [executor.submit(_run_one_file, wav_path, streaming) for interview_type, ptID, wav_path in pending]
+		results = []
+		for (interview_type, ptID, wav_path), future in zip(pending, futures):
+			try:
+				status, message = future.result()
+			except Exception as e: # e.g. worker process killed for using too much memory
+				status, message = "failed", str(e)
+			if status == "failed":
+				print("Sliding audio QC failed for " + interview_type + " " + os.path.basename(wav_path) + " (" + ptID + "): " + message)
+			results.append([interview_type, ptID, os.path.basename(wav_path), status, message])
+
+	manifest = pd.DataFrame(results, columns=["interview_type", "patient", "filename", "status", "message"])
+	manifest.sort_values(by=["interview_type", "patient", "filename"], inplace=True)
+	if manifest_path is not None:
+		manifest.to_csv(manifest_path, index=False)
+	return manifest
+
+if __name__ == '__main__':
+	# Map command line arguments to function arguments.
+	try: # worker count is optional, defaulting to 1
+		num_workers = int(sys.argv[3])
+		if num_workers < 1:
+			num_workers = 1
+	except:
+		num_workers = 1
+
+	try: # optional fourth argument turns on the bounded memory streaming mode
+		streaming = sys.argv[4] == "Y" or sys.argv[4] == "y"
+	except:
+		streaming = False
+
+	try:
+		manifest_path = sys.argv[5]
+	except:
+		manifest_path = None
+
+	audio_qc_batch(sys.argv[1], sys.argv[2], num_workers=num_workers, streaming=streaming, manifest_path=manifest_path)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+
+# prevent librosa from logging a warning every time it is imported
+import warnings
+warnings.filterwarnings("ignore", category=FutureWarning)
+
+import inspect
+import numpy as np
+import librosa
+
+# shared feature computations for the sliding window and overall audio QC
+# both an in memory version (whole file already loaded) and a streaming version (file read in fixed size blocks) are provided here
+# streaming keeps peak memory constant regardless of recording length, so that multiple long interviews can be QCed at once on a shared server
+
+# default number of audio frames read per block in streaming mode - ~22 seconds at 48 kHz
+stream_block_frames = 2**20
+
+# settings librosa uses by default for spectral flatness, needed to reproduce its centered framing across block boundaries
+flatness_n_fft = 2048
+flatness_hop_length = 512
+flatness_pad_mode = inspect.signature(librosa.feature.spectral_flatness).parameters["pad_mode"].default
+
+# features for the windows that fit entirely within the provided audio
+# windows start every window_increment_bins samples, taken from a strided view of the audio (no copy)
+# flatness is computed for a whole batch of windows in one librosa call, with batch_windows controlling STFT memory use
+def full_window_features(data, window_size_bins, window_increment_bins, batch_windows=32):
+	if len(data) < window_size_bins:
+		return np.zeros(0), np.zeros(0)
+	num_full = (len(data) - window_size_bins) // window_increment_bins + 1
+	rms_values = np.zeros(num_full)
+	flatness_values = np.zeros(num_full)
+
+	data = np.ascontiguousarray(data)
+	full_windows = np.lib.stride_tricks.as_strided(data, shape=(num_full, window_size_bins), strides=(data.strides[0]*window_increment_bins, data.strides[0]), writeable=False)
+	for b in range(0, num_full, batch_windows):
+		cur_windows = full_windows[b:b+batch_windows]
+		rms_values[b:b+len(cur_windows)] = np.sqrt(np.nanmean(np.square(cur_windows), axis=1))
+		# multichannel input gives back shape (windows, 1, frames), so average over the last axis per window
+		cur_flatness = librosa.feature.spectral_flatness(y=np.ascontiguousarray(cur_windows))
+		flatness_values[b:b+len(cur_windows)] = np.nanmean(cur_flatness.reshape(len(cur_windows), -1), axis=1)
+
+	return rms_values, flatness_values
+
+# features for the last few windows that run past the end of the file, and so are shorter - done one at a time
+def partial_window_features(data, starts, window_size_bins):
+	rms_values = np.array([np.sqrt(np.nanmean(np.square(data[i:i+window_size_bins]))) for i in starts])
+	flatness_values = np.array([np.nanmean(librosa.feature.spectral_flatness(y=data[i:i+window_size_bins])) for i in starts])
+	return rms_values, flatness_values
+
+# vectorized engine for the sliding window features - returns RMS and mean spectral flatness arrays with one entry per window
+# windows start every window_increment_bins samples, same as looping over range(0,len(data),window_increment_bins)
+def sliding_window_features(data, window_size_bins, window_increment_bins, batch_windows=32):
+	rms_full, flatness_full = full_window_features(data, window_size_bins, window_increment_bins, batch_windows=batch_windows)
+	partial_starts = range(len(rms_full) * window_increment_bins, len(data), window_increment_bins)
+	rms_partial, flatness_partial = partial_window_features(data, partial_starts, window_size_bins)
+	return np.concatenate([rms_full, rms_partial]), np.round(np.concatenate([flatness_full, flatness_partial]),5)
+
+# generator over an open soundfile.SoundFile, giving back float64 mono blocks of at most block_frames samples
+# stereo (or more channels) is collapsed by averaging, like the np.mean(data, axis=1) done on whole files
+def mono_blocks(sound_file, block_frames=stream_block_frames):
+	while True:
+		block = sound_file.read(frames=block_frames, dtype="float64", always_2d=True)
+		if block.shape[0] == 0:
+			return
+		if block.shape[1] > 1:
+			yield np.mean(block, axis=1)
+		else:
+			yield block[:,0]
+
+# streaming counterpart of the feature calculations, consuming an iterator of mono blocks in a single pass
+# per window RMS/flatness are folded in as soon as each window is complete, whole file sums are kept as running accumulators
+# returns a dict with the sliding window arrays (if sliding is True) and the whole file stats (if overall is True)
+def streaming_audio_features(blocks, window_size_bins=None, window_increment_bins=None, sliding=True, overall=True, batch_windows=32):
+	# sliding window state - buffer starts at the beginning of the next window not yet computed
+	window_buffer = np.zeros(0)
+	skip_samples = 0 # only relevant when the window increment is larger than the window size
+	rms_rolling = []
+	flatness_rolling = []
+
+	# whole file state - sample count, sum of squares for RMS, and running mean/M2 for the standard deviation
+	num_samples = 0
+	total_square = 0.0
+	running_count = 0
+	running_mean = 0.0
+	running_m2 = 0.0
+	# flatness framing buffer holds the centered (padded) signal from the start of the next frame not yet computed
+	frame_buffer = None
+	flatness_sum = 0.0
+	flatness_count = 0
+	pad = flatness_n_fft // 2
+	last_samples = np.zeros(0)
+
+	for block in blocks:
+		num_samples = num_samples + len(block)
+
+		if sliding:
+			if skip_samples > 0:
+				cur_skip = min(skip_samples, len(block))
+				block_sliding = block[cur_skip:]
+				skip_samples = skip_samples - cur_skip
+			else:
+				block_sliding = block
+			window_buffer = np.concatenate([window_buffer, block_sliding])
+			cur_rms, cur_flatness = full_window_features(window_buffer, window_size_bins, window_increment_bins, batch_windows=batch_windows)
+			if len(cur_rms) > 0:
+				rms_rolling.append(cur_rms)
+				flatness_rolling.append(cur_flatness)
+				consumed = len(cur_rms) * window_increment_bins
+				if consumed > len(window_buffer):
+					skip_samples = consumed - len(window_buffer)
+				window_buffer = window_buffer[consumed:].copy()
+
+		if overall:
+			total_square = total_square + np.sum(np.square(block))
+			# combine block mean/variance into the running totals (Chan et al. parallel algorithm)
+			block_valid = block[~np.isnan(block)]
+			if len(block_valid) > 0:
+				block_mean = np.mean(block_valid)
+				block_m2 = np.sum(np.square(block_valid - block_mean))
+				new_count = running_count + len(block_valid)
+				delta = block_mean - running_mean
+				running_mean = running_mean + delta * len(block_valid) / new_count
+				running_m2 = running_m2 + block_m2 + np.square(delta) * running_count * len(block_valid) / new_count
+				running_count = new_count
+
+			# spectral flatness over frames of the centered signal, only ever holding about one block worth of frames
+			if frame_buffer is None:
+				head = np.pad(block, (pad, 0), mode=flatness_pad_mode)[:pad]
+				frame_buffer = np.concatenate([head, block])
+			else:
+				frame_buffer = np.concatenate([frame_buffer, block])
+			frame_buffer, cur_sum, cur_count = _fold_flatness_frames(frame_buffer)
+			flatness_sum = flatness_sum + cur_sum
+			flatness_count = flatness_count + cur_count
+			# keep the very end of the signal in case it is needed for the tail padding
+			last_samples = np.concatenate([last_samples, block])[-(pad+1):]
+
+	features = {"num_samples": num_samples}
+	if sliding:
+		# remaining windows extend past the end of the audio
+		partial_starts = range(0, len(window_buffer), window_increment_bins) if skip_samples == 0 else []
+		cur_rms, cur_flatness = partial_window_features(window_buffer, partial_starts, window_size_bins)
+		rms_rolling.append(cur_rms)
+		flatness_rolling.append(cur_flatness)
+		features["rms_rolling"] = np.concatenate(rms_rolling)
+		features["flatness_rolling"] = np.round(np.concatenate(flatness_rolling),5)
+	if overall and num_samples > 0:
+		tail = np.pad(last_samples, (0, pad), mode=flatness_pad_mode)[-pad:]
+		frame_buffer = np.concatenate([frame_buffer, tail])
+		frame_buffer, cur_sum, cur_count = _fold_flatness_frames(frame_buffer)
+		flatness_sum = flatness_sum + cur_sum
+		flatness_count = flatness_count + cur_count
+		features["rms"] = np.sqrt(total_square / num_samples)
+		features["stdev"] = np.sqrt(running_m2 / running_count) if running_count > 0 else np.nan
+		features["mean_flatness"] = flatness_sum / flatness_count
+	return features
+
+# compute flatness for all complete frames in a buffer of the (already padded) signal
+# returns the leftover buffer starting at the next frame, along with the sum and number of frame flatness values
+def _fold_flatness_frames(frame_buffer):
+	if len(frame_buffer) < flatness_n_fft:
+		return frame_buffer, 0.0, 0
+	num_frames = (len(frame_buffer) - flatness_n_fft) // flatness_hop_length + 1
+	cur_end = (num_frames - 1) * flatness_hop_length + flatness_n_fft
+	cur_flatness = librosa.feature.spectral_flatness(y=frame_buffer[:cur_end], n_fft=flatness_n_fft, hop_length=flatness_hop_length, center=False)
+	return frame_buffer[num_frames * flatness_hop_length:].copy(), np.sum(cur_flatness), cur_flatness.size
+
+# whole file stats for audio that is already fully loaded (mono), in the same format as the streaming version returns them
+def overall_features(data):
+	features = {"num_samples": len(data)}
+	features["rms"] = np.sqrt(np.mean(np.square(data)))
+	features["stdev"] = np.nanstd(data)
+	features["mean_flatness"] = np.mean(librosa.feature.spectral_flatness(y=data))
+	return features
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import glob
+import pandas as pd
+
+# per patient store for the DPDash formatted QC CSVs (interviewMonoAudioQC, interviewVideoQC, interviewRedactedTranscriptQC)
+# new rows are appended cheaply to a row log on the PROTECTED side, and the DPDash named CSV on the GENERAL side is only rewritten when the store is materialized
+# (once per patient at the end of a pipeline module run, or later in the summary checks if dpdash_qc_compaction is "N") - rather than rereading and rewriting the full patient history for every update
+# materializing uses the same semantics as the previous direct updates: concatenate onto the existing CSV, drop duplicate patient/day/time rows (keeping the older one),
+# sort by day and time of day, save under the new day range name, and delete the old version
+# QC types that are fully recomputed each time (transcript QC) instead log a complete replacement set of rows, which is written as is
+rowlog_folder_name = "dpdash_qc_rowlog"
+qc_names = ["interviewMonoAudioQC", "interviewVideoQC", "interviewRedactedTranscriptQC"]
+
+def qc_rowlog_path(data_root, study, ptID, interview_type, qc_name, replace=False):
+	log_name = qc_name + "_replace.csv" if replace else qc_name + ".csv"
+	return os.path.join(data_root, "PROTECTED", study, "processed", ptID, "interviews", interview_type, rowlog_folder_name, log_name)
+
+# DPDash CSV names use the site ID (last two digits of study folder)
+def dpdash_name_prefix(study, ptID, interview_type, qc_name):
+	return study[-2:] + "-" + ptID + "-" + qc_name + "_" + interview_type
+
+def dpdash_csv_paths(data_root, study, ptID, interview_type, qc_name):
+	output_folder = os.path.join(data_root, "GENERAL", study, "processed", ptID, "interviews", interview_type)
+	return glob.glob(os.path.join(output_folder, dpdash_name_prefix(study, ptID, interview_type, qc_name) + "-day*.csv"))
+
+# add new QC rows (a DataFrame with the final DPDash columns) to the patient's row log
+def append_qc_rows(data_root, study, ptID, interview_type, qc_name, new_df):
+	if new_df.empty:
+		return
+	rowlog_path = qc_rowlog_path(data_root, study, ptID, interview_type, qc_name)
+	os.makedirs(os.path.dirname(rowlog_path), exist_ok=True)
+	if os.path.exists(rowlog_path):
+		logged_columns = pd.read_csv(rowlog_path, nrows=0).columns.tolist()
+		if logged_columns != new_df.columns.tolist():
+			# QC columns changed since the pending rows were logged, so fold those into the DPDash CSV before starting a new log
+			materialize_qc_csv(data_root, study, ptID, interview_type, qc_name)
+			os.makedirs(os.path.dirname(rowlog_path), exist_ok=True)
+	if os.path.exists(rowlog_path):
+		new_df.to_csv(rowlog_path, mode='a', header=False, index=False)
+	else:
+		new_df.to_csv(rowlog_path, index=False)
+
+# log the complete set of QC rows for a patient, to replace whatever is in the DPDash CSV (and any pending rows) on the next materialize
+def replace_qc_rows(data_root, study, ptID, interview_type, qc_name, all_df):
+	rowlog_path = qc_rowlog_path(data_root, study, ptID, interview_type, qc_name)
+	replace_path = qc_rowlog_path(data_root, study, ptID, interview_type, qc_name, replace=True)
+	os.makedirs(os.path.dirname(replace_path), exist_ok=True)
+	# write to a temporary file first so an interrupted run never leaves a truncated set of rows behind
+	all_df.to_csv(replace_path + ".tmp", index=False)
+	os.replace(replace_path + ".tmp", replace_path)
+	if os.path.exists(rowlog_path):
+		os.remove(rowlog_path)
+
+# combine the existing DPDash CSV for a patient with any pending logged rows, without writing anything
+# returns the combined DataFrame (None if there is nothing at all), along with the list of existing DPDash CSV paths
+# downstream steps that need the latest QC values before the store has been materialized should read them through here
+def load_qc_rows(data_root, study, ptID, interview_type, qc_name):
+	output_paths = dpdash_csv_paths(data_root, study, ptID, interview_type, qc_name)
+	rowlog_path = qc_rowlog_path(data_root, study, ptID, interview_type, qc_name)
+	replace_path = qc_rowlog_path(data_root, study, ptID, interview_type, qc_name, replace=True)
+	pending_df = pd.read_csv(rowlog_path) if os.path.exists(rowlog_path) else None
+
+	if os.path.exists(replace_path):
+		base_df = pd.read_csv(replace_path)
+	elif len(output_paths) == 1:
+		base_df = pd.read_csv(output_paths[0])
+	else:
+		# with 0 or more than 1 existing DPDash CSVs, the pending rows are all there is to combine
+		base_df = None
+	if pending_df is None:
+		return base_df, output_paths
+
+	if base_df is None:
+		join_csv = pending_df
+	else:
+		join_csv = pd.concat([base_df, pending_df])
+	join_csv.reset_index(drop=True, inplace=True)
+	# drop any duplicates in case a file got processed a second time - shouldn't happen via pipeline
+	join_csv.drop_duplicates(subset=["patient", "day", "timeofday"],inplace=True)
+	join_csv.sort_values(by=["day","timeofday"],inplace=True) # make sure concatenated CSV is still sorted primarily by day number and secondarily by time
+	return join_csv, output_paths
+
+# write out the DPDash named CSV for a patient from the store, and clear the row logs
+# does nothing if there are no pending rows
+def materialize_qc_csv(data_root, study, ptID, interview_type, qc_name):
+	rowlog_path = qc_rowlog_path(data_root, study, ptID, interview_type, qc_name)
+	replace_path = qc_rowlog_path(data_root, study, ptID, interview_type, qc_name, replace=True)
+	replacing = os.path.exists(replace_path)
+	if not replacing and not os.path.exists(rowlog_path):
+		return
+	join_csv, output_paths = load_qc_rows(data_root, study, ptID, interview_type, qc_name)
+	output_folder = os.path.join(data_root, "GENERAL", study, "processed", ptID, "interviews", interview_type)
+	# print warning if more than 1 for this patient
+	if len(output_paths) > 1 and not replacing:
+		print("Warning - multiple DPDash CSVs exist for patient " + ptID + ". Saving current CSV separately for now")
+
+	if join_csv is not None and not join_csv.empty:
+		output_path_cur = os.path.join(output_folder, dpdash_name_prefix(study, ptID, interview_type, qc_name) + "-day" + str(join_csv["day"].tolist()[0]) + "to" + str(join_csv["day"].tolist()[-1]) + '.csv')
+		join_csv.to_csv(output_path_cur,index=False)
+	else:
+		output_path_cur = None
+	# delete old version (since naming convention will not overwrite, unless day range is unchanged)
+	# a single existing DPDash file is expected, but when replacing all old ones are cleared
+	if replacing or len(output_paths) == 1:
+		for old_path in output_paths:
+			if output_path_cur is None or os.path.abspath(old_path) != os.path.abspath(output_path_cur):
+				os.remove(old_path)
+
+	for log_path in [rowlog_path, replace_path]:
+		if os.path.exists(log_path):
+			os.remove(log_path)
+	if len(os.listdir(os.path.dirname(rowlog_path))) == 0:
+		os.rmdir(os.path.dirname(rowlog_path))
+
+# materialize every patient/interview type in the study that has pending rows for the given QC type (or for all QC types if none given)
+def materialize_study(data_root, study, qc_name=None):
+	cur_names = qc_names if qc_name is None else [qc_name]
+	for cur_name in cur_names:
+		rowlog_paths = glob.glob(os.path.join(data_root, "PROTECTED", study, "processed", "*", "interviews", "*", rowlog_folder_name, cur_name + ".csv"))
+		rowlog_paths.extend(glob.glob(os.path.join(data_root, "PROTECTED", study, "processed", "*", "interviews", "*", rowlog_folder_name, cur_name + "_replace.csv")))
+		pending = sorted(set([(x.split("/")[-5], x.split("/")[-3]) for x in rowlog_paths]))
+		for ptID, interview_type in pending:
+			try:
+				materialize_qc_csv(data_root, study, ptID, interview_type, cur_name)
+			except Exception as e:
+				print("Problem updating " + cur_name + " DPDash CSV for " + ptID + " " + interview_type + ", pending rows left in place")
+				print(e)
+
+if __name__ == '__main__':
+	# Map command line arguments to function arguments.
+	try: # optional third argument restricts to a single QC type
+		qc_name = sys.argv[3]
+	except:
+		qc_name = None
+	materialize_study(sys.argv[1], sys.argv[2], qc_name=qc_name)
@@ -5,6 +5,17 @@ import sys
 import glob
 import pandas as pd
 import numpy as np
+from audio_duration_index import lookup_durations
+
+# total minutes across a list of audio paths, given a dict of their durations in seconds
+def sum_minutes(paths, durations):
+	total_minutes = 0.0
+	for filep in paths:
+		if durations[filep] is None:
+			print("Problem reading length of " + filep.split("/")[-1] + ", not included in email minute count")
+			continue
+		total_minutes = total_minutes + durations[filep] / 60.0
+	return total_minutes
 
 def get_email_summary_stats(data_root, study, lab_email_path, interview_type):
 	# get paths of interest for all patients in this study
@@ -21,11 +32,11 @@ def get_email_summary_stats(data_root, study, lab_email_path, interview_type):
 	send_paths_list = []
 	pending_paths_list_all = []
 	for folder in temp_folders_list:
-		temp_paths_list.extend(os.listdir(folder))
+		temp_paths_list.extend([os.path.join(folder, x) for x in os.listdir(folder)])
 	for folder in send_folders_list:
-		send_paths_list.extend(os.listdir(folder))
+		send_paths_list.extend([os.path.join(folder, x) for x in os.listdir(folder)])
 	for folder in pending_folders_list:
-		pending_paths_list_all.extend(os.listdir(folder))
+		pending_paths_list_all.extend([os.path.join(folder, x) for x in os.listdir(folder)])
 	# get only the newly uploaded pending files, in case still waiting on prior transcript orders as well
 	pending_paths_list = [x for x in pending_paths_list_all if x.split("/")[-1][0:4]=="new+"] 
 	# don't need to worry about a similar thing for the other two folders though - 
@@ -38,81 +49,16 @@ def get_email_summary_stats(data_root, study, lab_email_path, interview_type):
 	num_rejected = len(temp_paths_list)
 	num_selected = num_pushed + num_failed
 	num_audios = num_selected + num_rejected
-	num_secondary = len([x for x in temp_paths_list if x[0] == "0"]) # see error code guide
-	num_short = len([x for x in temp_paths_list if x[0] == "1"])
-	num_quiet = len([x for x in temp_paths_list if x[0] == "2"])
-
-	# loop through all NEW pending (i.e. successfully pushed this run) audio paths, load DPDash audio QC CSV for each patient to count up the total length in minutes
-	num_minutes = 0.0
-	for filep in pending_paths_list:
-		# find dpdash path from file path
-		filen = filep.split("/")[-1]
-		ptID = filen.split("_")[1]
-		os.chdir(os.path.join(data_root, "GENERAL", study, "processed", ptID, "interviews", interview_type))
-		dpdash_name_format = study[-2:] + "-" + ptID + "-interviewMonoAudioQC_" + interview_type + "-day*.csv"
-		dpdash_name = glob.glob(dpdash_name_format)[0] # DPDash script deletes any older days in this subfolder, so should only get 1 match each time
-		dpdash_qc = pd.read_csv(dpdash_name) 
-		# technically reloading this CSV for each file instead of for each patient, but should be a fast operation because CSV is small
-		# also shouldn't be repeated that much in a normal run, as there cannot be more new uploads for a single patient than the number of days since the last run of the pipeline
-
-		# get day number from file name, to assist in lookup of df
-		day_num = int(filen.split("day")[1].split("_")[0])
-		int_num = int(filen.split("session")[1].split(".")[0])
-		# should always be exactly one matching entry, as only allowing one file into DPDash per day (first submitted)
-		cur_row = dpdash_qc[(dpdash_qc["day"]==day_num) & (dpdash_qc["interview_number"]==int_num)] 
-		# then get total time of that particular recording (in minutes)
-		cur_count = float(cur_row["length_minutes"].tolist()[0])
-
-		# update total count across the entire study
-		num_minutes = num_minutes + cur_count
-
-	# also get total length of files not sent
-	num_minutes_unsent = 0.0
-	for filep in send_paths_list:
-		# find dpdash path from file path
-		filen = filep.split("/")[-1]
-		ptID = filen.split("_")[1]
-		os.chdir(os.path.join(data_root, "GENERAL", study, "processed", ptID, "interviews", interview_type))
-		dpdash_name_format = study[-2:] + "-" + ptID + "-interviewMonoAudioQC_" + interview_type + "-day*.csv"
-		dpdash_name = glob.glob(dpdash_name_format)[0] # DPDash script deletes any older days in this subfolder, so should only get 1 match each time
-		dpdash_qc = pd.read_csv(dpdash_name) 
-		# technically reloading this CSV for each file instead of for each patient, but should be a fast operation because CSV is small
-		# also shouldn't be repeated that much in a normal run, as there cannot be more new uploads for a single patient than the number of days since the last run of the pipeline
-
-		# get day number from file name, to assist in lookup of df
-		day_num = int(filen.split("day")[1].split("_")[0])
-		int_num = int(filen.split("session")[1].split(".")[0])
-		# should always be exactly one matching entry, as only allowing one file into DPDash per day (first submitted)
-		cur_row = dpdash_qc[(dpdash_qc["day"]==day_num) & (dpdash_qc["interview_number"]==int_num)] 
-		# then get total time of that particular recording (in minutes)
-		cur_count = float(cur_row["length_minutes"].tolist()[0])
-
-		# update total count across the entire study
-		num_minutes_unsent = num_minutes_unsent + cur_count
-
-	# and get total length of bad files
-	num_minutes_bad = 0.0
-	for filep in temp_paths_list:
-		# find dpdash path from file path
-		filen = filep.split("/")[-1]
-		ptID = filen.split("_")[1]
-		os.chdir(os.path.join(data_root, "GENERAL", study, "processed", ptID, "interviews", interview_type))
-		dpdash_name_format = study[-2:] + "-" + ptID + "-interviewMonoAudioQC_" + interview_type + "-day*.csv"
-		dpdash_name = glob.glob(dpdash_name_format)[0] # DPDash script deletes any older days in this subfolder, so should only get 1 match each time
-		dpdash_qc = pd.read_csv(dpdash_name) 
-		# technically reloading this CSV for each file instead of for each patient, but should be a fast operation because CSV is small
-		# also shouldn't be repeated that much in a normal run, as there cannot be more new uploads for a single patient than the number of days since the last run of the pipeline
-
-		# get day number from file name, to assist in lookup of df
-		day_num = int(filen.split("day")[1].split("_")[0])
-		int_num = int(filen.split("session")[1].split(".")[0])
-		# should always be exactly one matching entry, as only allowing one file into DPDash per day (first submitted)
-		cur_row = dpdash_qc[(dpdash_qc["day"]==day_num) & (dpdash_qc["interview_number"]==int_num)] 
-		# then get total time of that particular recording (in minutes)
-		cur_count = float(cur_row["length_minutes"].tolist()[0])
-
-		# update total count across the entire study
-		num_minutes_bad = num_minutes_bad + cur_count
+	num_secondary = len([x for x in temp_paths_list if x.split("/")[-1][0] == "0"]) # see error code guide
+	num_short = len([x for x in temp_paths_list if x.split("/")[-1][0] == "1"])
+	num_quiet = len([x for x in temp_paths_list if x.split("/")[-1][0] == "2"])
+
+	# get total length in minutes of the NEW pending (i.e. successfully pushed this run) audio, of the files not sent, and of the bad files
+	# durations come from the study's audio duration index (read from file headers), so there is no need to load the DPDash CSV for each file
+	durations = lookup_durations(data_root, study, pending_paths_list + send_paths_list + temp_paths_list)
+	num_minutes = sum_minutes(pending_paths_list, durations)
+	num_minutes_unsent = sum_minutes(send_paths_list, durations)
+	num_minutes_bad = sum_minutes(temp_paths_list, durations)
 
 	# round the number of minutes when done, for email purposes
 	# note int rounds towards 0, and since our number will always be positive it is equivalent to taking the floor
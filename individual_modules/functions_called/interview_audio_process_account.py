@@ -7,6 +7,7 @@ import glob
 import string
 import pandas as pd
 import numpy as np
+from study_metadata import get_consent_date_str
 
 # final step of audio pipeline is to do various file accounting!
 def interview_raw_audio_account(interview_type, data_root, study, ptID):
@@ -48,10 +49,7 @@ def interview_raw_audio_account(interview_type, data_root, study, ptID):
 	# get current consent date string for accounting purposes, as well as today's date
 	today_str = datetime.date.today().strftime("%Y-%m-%d")
 	# there must be a valid consent date for the patient already in order for there to be files in the filename map folder, which is checked by wrapper before calling
-	study_metadata_path = os.path.join(data_root,"PROTECTED",study,study + "_metadata.csv")
-	study_metadata = pd.read_csv(study_metadata_path)
-	patient_metadata = study_metadata[study_metadata["Subject ID"] == ptID]
-	consent_date_str = patient_metadata["Consent"].tolist()[0]
+	consent_date_str = get_consent_date_str(data_root, study, ptID)
 	# there also must already be this folder with files in it for wrapping bash script to call the function
 	os.chdir(os.path.join(data_root, "PROTECTED", study, "processed", ptID, "interviews", interview_type, "audio_filename_maps"))
 	cur_files = os.listdir(".")
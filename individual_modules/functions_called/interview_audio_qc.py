@@ -12,13 +12,39 @@ import soundfile as sf
 import librosa
 import sys
 import datetime
-import glob
+import json
+from raw_interview_index import raw_interview_names
+from audio_qc_features import mono_blocks, streaming_audio_features
+from dpdash_qc_store import append_qc_rows
+
+# load whole file stats saved by sliding_audio_qc_func.py for the newly converted files, keyed by their renamed filename
+# stats are saved under the pre-rename name in sliding_window_audio_qc/temp, so the filename maps written by the rename step are used to match them up
+# expects to be called from within the temp_audio folder
+def load_cached_overall_stats():
+	cached_stats = {}
+	if not os.path.isdir("../sliding_window_audio_qc/temp"):
+		return cached_stats
+	for stats_file in os.listdir("../sliding_window_audio_qc/temp"):
+		if not stats_file.endswith(".json"):
+			continue
+		name = stats_file[:-len(".json")]
+		try:
+			# second line of the filename map is the renamed file
+			with open(os.path.join("../audio_filename_maps", name + ".txt"), 'r') as f:
+				new_name = f.read().splitlines()[1]
+			with open(os.path.join("../sliding_window_audio_qc/temp", stats_file), 'r') as f:
+				cached_stats[new_name] = json.load(f)
+		except:
+			# if anything is off just fall back on reading the audio for this file
+			continue
+	return cached_stats
 
 # function that focuses on mono overall recording audio to do basic QC for the offsites
 # does QC on all files in current decrypted folder, as per larger pipeline these will be only new files
 # adds outputs to existing QC spreadsheet for given patient if there is one
 # expects files to already be renamed to match our conventions, as is done by default when this is called by main pipeline
-def interview_mono_qc(interview_type, data_root, study, ptID):
+# streaming=True reads each file in blocks so peak memory stays constant regardless of recording length
+def interview_mono_qc(interview_type, data_root, study, ptID, streaming=False):
 	# specify column headers that will be used for every CSV
 	# make it DPDash formatted, but will leave reftime columns blank. others will look up
 	headers=["reftime","day","timeofday","weekday","study","patient","interview_number","length_minutes","overall_db","amplitude_stdev","mean_flatness"]
@@ -48,60 +74,97 @@ def interview_mono_qc(interview_type, data_root, study, ptID):
 		print("Haven't converted any new audio files yet for input patient " + ptID + " " + interview_type)
 		return
 
+	# whole file stats may already have been computed by the sliding window QC pass over the same decode
+	cached_stats = load_cached_overall_stats()
+
+	# raw interview names (sorted, so indexable by session number) are needed for looking up date/time info for each file below
+	# only need to get these once per patient - cached listing shared with the rename and video QC scripts
+	folder_names = raw_interview_names(data_root, study, ptID, interview_type)
 
 	cur_files.sort() # go in order, although can also always sort CSV later.
 	for filename in cur_files:
 		if not filename.endswith(".wav"): # skip any non-audio files (and folders)
 			continue
 
-		try:
-			data, fs = sf.read(filename)
-		except:
-			# ignore bad audio - will want to log this for module, but within pipeline it should have been caught by sliding QC earlier
-			print("(" + filename + " is a corrupted audio file)")
-			continue 
-
-		# get length info
-		ns = data.shape[0]
-		if ns == 0:
-			# ignore empty audio - will want to log this for module, but within pipeline it should have been caught by sliding QC earlier
-			print("(" + filename + " audio is empty)")
-			continue
-		
-		try: 
-			# may not be a second shape number when file is mono, but should check for it to exit if we encounter stereo here
-			cs = data.shape[1] 
-			if cs == 2: 
-				print("(" + filename + " is stereo, expected mono. collapsing for QC calculation)")
-				data = np.mean(data, axis=1)
-		except: # now it is definitely mono
-			pass
-			
-		# append length info
-		sec = float(ns)/fs
-		mins = sec/float(60)
-		# use round so values are reasonably viewable on DPDash
-		lengths.append(round(mins,2))
-
-		# get other audio props
-		data = data.flatten()
-		vol = np.sqrt(np.mean(np.square(data)))
-		gains.append(vol) # vol will be rounded when convert to db later
-		stds.append(round(np.nanstd(data),3))
-		spec_flat = librosa.feature.spectral_flatness(y=data)
-		mean_flats.append(round(np.mean(spec_flat),4))
+		if filename in cached_stats:
+			# no need to read the audio again, just use the saved stats
+			cur_stats = cached_stats[filename]
+			sec = float(cur_stats["num_samples"])/cur_stats["samplerate"]
+			mins = sec/float(60)
+			lengths.append(round(mins,2))
+			gains.append(cur_stats["rms"])
+			stds.append(round(cur_stats["stdev"],3))
+			mean_flats.append(round(cur_stats["mean_flatness"],4))
+		elif streaming:
+			# bounded memory mode - whole file stats are accumulated over fixed size blocks rather than loading the full audio
+			try:
+				sound_file = sf.SoundFile(filename)
+			except:
+				print("(" + filename + " is a corrupted audio file)")
+				continue
+
+			with sound_file:
+				ns = sound_file.frames
+				fs = sound_file.samplerate
+				if ns == 0:
+					print("(" + filename + " audio is empty)")
+					continue
+				if sound_file.channels == 2:
+					print("(" + filename + " is stereo, expected mono. collapsing for QC calculation)")
+				try:
+					features = streaming_audio_features(mono_blocks(sound_file), sliding=False)
+				except RuntimeError:
+					print("(" + filename + " is a corrupted audio file)")
+					continue
+
+			sec = float(ns)/fs
+			mins = sec/float(60)
+			lengths.append(round(mins,2))
+			gains.append(features["rms"])
+			stds.append(round(features["stdev"],3))
+			mean_flats.append(round(features["mean_flatness"],4))
+		else:
+			try:
+				data, fs = sf.read(filename)
+			except:
+				# ignore bad audio - will want to log this for module, but within pipeline it should have been caught by sliding QC earlier
+				print("(" + filename + " is a corrupted audio file)")
+				continue 
+
+			# get length info
+			ns = data.shape[0]
+			if ns == 0:
+				# ignore empty audio - will want to log this for module, but within pipeline it should have been caught by sliding QC earlier
+				print("(" + filename + " audio is empty)")
+				continue
 		
+			try: 
+				# may not be a second shape number when file is mono, but should check for it to exit if we encounter stereo here
+				cs = data.shape[1] 
+				if cs == 2: 
+					print("(" + filename + " is stereo, expected mono. collapsing for QC calculation)")
+					data = np.mean(data, axis=1)
+			except: # now it is definitely mono
+				pass
+
+			# append length info
+			sec = float(ns)/fs
+			mins = sec/float(60)
+			# use round so values are reasonably viewable on DPDash
+			lengths.append(round(mins,2))
+
+			# get other audio props
+			data = data.flatten()
+			vol = np.sqrt(np.mean(np.square(data)))
+			gains.append(vol) # vol will be rounded when convert to db later
+			stds.append(round(np.nanstd(data),3))
+			spec_flat = librosa.feature.spectral_flatness(y=data)
+			mean_flats.append(round(np.mean(spec_flat),4))
+
 		# finally add the lookup of other stats based on the renamed file
 		# format should be [study]_[ptID]_offsiteInterview_audio_day[4digit#]_session[3digit#].wav
 		study_day = int(filename.split("day")[1].split("_")[0])
 		int_num = int(filename.split("session")[1].split(".")[0])
-		folder_paths = os.listdir(os.path.join(data_root, "PROTECTED", study, "raw", ptID, "interviews", interview_type))
-		raw_folder_names = [x.split("/")[-1] for x in folder_paths]
-		folder_names = [x for x in raw_folder_names if (os.path.isdir(os.path.join(data_root, "PROTECTED", study, "raw", ptID, "interviews", interview_type, x)) and len(x.split(" ")) > 1 and len(x.split(" ")[0]) == 10 and len(x.split(" ")[1]) == 8) or (x.endswith(".WAV") and len(x) == 18)] # keep only files that seem to meet the convention
-		if interview_type == "psychs":
-			# make the onsites named the same as offsites for sorting purposess
-			folder_names = [x[0:4] + "-" + x[4:6] + "-" + x[6:8] + " " + x[8:10] + "." + x[10:12] + "." + x[12:14] if x.endswith(".WAV") else x for x in folder_names]
-		folder_names.sort() # the way zoom puts date/time in text in the folder name means it will always sort in chronological order
 		cur_name = folder_names[int_num-1] # index using interview number, but adjust for 0-indexing
 		date_str = cur_name.split(" ")[0] # will use the date for getting weekday
 		time_str = cur_name.split(" ")[1] # this can be used almost directly for time of day - just need to replace dots with colons
@@ -131,31 +194,9 @@ def interview_mono_qc(interview_type, data_root, study, ptID):
 		vals = values[i]
 		new_csv[h] = vals
 
-	# now prepare to save new CSV for this patient (or update existing CSV if there is one)
-	os.chdir(os.path.join(data_root, "GENERAL", study, "processed", ptID, "interviews", interview_type))
-
-	# now save CSV
-	# using site ID (last two digits of folder) in DPDash name again
-	output_path_format = study[-2:]+"-"+ptID+"-interviewMonoAudioQC_" + interview_type + "-day*.csv"
-	output_paths = glob.glob(output_path_format)
-	# single existing DPDash file is expected - do concatenation and then delete old version (since naming convention will not overwrite)
-	if len(output_paths) == 1:
-		old_df = pd.read_csv(output_paths[0])
-		join_csv=pd.concat([old_df, new_csv])
-		join_csv.reset_index(drop=True, inplace=True)
-		# drop any duplicates in case audio got decrypted a second time - shouldn't happen via pipeline
-		join_csv.drop_duplicates(subset=["patient", "day", "timeofday"],inplace=True)
-		join_csv.sort_values(by=["day","timeofday"],inplace=True) # make sure concatenated CSV is still sorted primarily by day number and secondarily by time
-		output_path_cur = study[-2:] + "-" + ptID + "-interviewMonoAudioQC_" + interview_type + "-day" + str(join_csv["day"].tolist()[0]) + "to" + str(join_csv["day"].tolist()[-1]) + '.csv'
-		join_csv.to_csv(output_path_cur,index=False)
-		os.remove(output_paths[0])
-		return # function is now done if we are in the single existing dp dash case
-	# print warning if more than 1 for this patient
-	if len(output_paths) > 1:
-		print("Warning - multiple DPDash CSVs exist for patient " + ptID + ". Saving current CSV separately for now")
-	# with 0 or more than 1, just save this as is
-	output_path_cur = study[-2:] + "-" + ptID + "-interviewMonoAudioQC_" + interview_type + "-day" + str(study_days[0]) + "to" + str(study_days[-1]) + '.csv'
-	new_csv.to_csv(output_path_cur,index=False)
+	# now add the new rows to the DPDash QC store for this patient
+	# the DPDash named CSV itself (using site ID in the name) gets updated once for the whole study at the end of the audio QC module
+	append_qc_rows(data_root, study, ptID, interview_type, "interviewMonoAudioQC", new_csv)
 	
 	# if reach the end, exit with code indicating there was no problem
 	sys.exit(0)
@@ -163,7 +204,11 @@ def interview_mono_qc(interview_type, data_root, study, ptID):
 if __name__ == '__main__':
 	# Map command line arguments to function arguments.
 	try:
-		interview_mono_qc(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4])
+		try: # optional fifth argument turns on the bounded memory streaming mode
+			streaming = sys.argv[5] == "Y" or sys.argv[5] == "y"
+		except:
+			streaming = False
+		interview_mono_qc(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4], streaming=streaming)
 	except Exception as e:
 		# if audio QC fails, exit with error code for bash caller to pick up
 		print("Audio QC script crashed with the following error!")
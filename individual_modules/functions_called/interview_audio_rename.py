@@ -3,18 +3,15 @@
 import os
 import sys
 import datetime
-import pandas as pd
+from raw_interview_index import raw_interview_sessions
+from study_metadata import get_consent_date
 
 # files decrypted by bash script are just named using top level interview folder info, so still containing date time
 # this function will rename all newly decrypted files to match proper study convention, for use in summary audio QC calculations and TranscribeMe upload
 # each call of function does so for one patient
 def interview_mono_rename(interview_type, data_root, study, ptID):
 	try:
-		study_metadata_path = os.path.join(data_root,"PROTECTED",study,study + "_metadata.csv")
-		study_metadata = pd.read_csv(study_metadata_path)
-		patient_metadata = study_metadata[study_metadata["Subject ID"] == ptID]
-		consent_date_str = patient_metadata["Consent"].tolist()[0]
-		consent_date = datetime.datetime.strptime(consent_date_str,"%Y-%m-%d")
+		consent_date = get_consent_date(data_root, study, ptID)
 	except:
 		# occasionally we encounter issues with the study metadata file, so adding a check here
 		print("No consent date information in the study metadata CSV for input patient " + ptID + ", or problem with input arguments")
@@ -35,14 +32,8 @@ def interview_mono_rename(interview_type, data_root, study, ptID):
 		return
 
 	# if reach this point, there should definitely be corresponding raw audio folders
-	raw_folder_paths = os.listdir(os.path.join(data_root, "PROTECTED", study, "raw", ptID, "interviews", interview_type))
-	raw_folder_names_int = [x.split("/")[-1] for x in raw_folder_paths]
-	raw_folder_names = [x for x in raw_folder_names_int if (os.path.isdir(os.path.join(data_root, "PROTECTED", study, "raw", ptID, "interviews", interview_type, x)) and len(x.split(" ")) > 1 and len(x.split(" ")[0]) == 10 and len(x.split(" ")[1]) == 8) or (x.endswith(".WAV") and len(x) == 18)] # keep only files that seem to meet the convention
-	if interview_type == "psychs":
-		# make the onsites named the same as offsites for sorting purposess
-		raw_folder_names = [x[0:4] + "-" + x[4:6] + "-" + x[6:8] + " " + x[8:10] + "." + x[10:12] + "." + x[12:14] if x.endswith(".WAV") else x for x in raw_folder_names]
-	raw_folder_names.sort() # the way zoom puts date/time in text in the folder name means it will always sort in chronological order
-	raw_audio_formatted = [x.split(" ")[0] + "+" + x.split(" ")[1] + ".wav" for x in raw_folder_names]
+	# (cached listing of the raw folder, shared with the QC scripts - maps each raw interview date/time to its session number)
+	raw_sessions = raw_interview_sessions(data_root, study, ptID, interview_type)
 
 	for filename in cur_files:
 		if not filename.endswith(".wav"): # skip any non-audio files (and folders)
@@ -52,7 +43,7 @@ def interview_mono_rename(interview_type, data_root, study, ptID):
 		else:
 			filename_check = filename
 
-		session_num = raw_audio_formatted.index(filename_check) + 1
+		session_num = raw_sessions[filename_check[:-len(".wav")].replace("+", " ")][0]
 
 		date_str = filename_check.split("+")[0]
 		cur_date = datetime.datetime.strptime(date_str,"%Y-%m-%d")
@@ -2,19 +2,18 @@
 
 import os
 import sys
-import glob
 import shutil
 import pandas as pd
 import numpy as np
+from dpdash_qc_store import load_qc_rows
 
 def move_audio_to_send(interview_type, data_root, study, ptID, length_cutoff, db_cutoff):
 	# navigate to folder of interest, load initial CSVs
 	try:
-		os.chdir(os.path.join(data_root, "GENERAL", study, "processed", ptID, "interviews", interview_type))
-		# using study identifier again now, only last 2 digits
-		dpdash_name_format = study[-2:] + "-" + ptID + "-interviewMonoAudioQC_" + interview_type + "-day*.csv"
-		dpdash_name = glob.glob(dpdash_name_format)[0] # DPDash script deletes any older days in this subfolder, so should only get 1 match each time
-		dpdash_qc = pd.read_csv(dpdash_name)
+		# read through the DPDash QC store, so the newest rows are included even if they haven't been written to the DPDash CSV yet
+		dpdash_qc, _ = load_qc_rows(data_root, study, ptID, interview_type, "interviewMonoAudioQC")
+		if dpdash_qc is None:
+			raise FileNotFoundError
 		os.chdir(os.path.join(data_root, "PROTECTED", study, "processed", ptID, "interviews", interview_type))
 		os.chdir("temp_audio") # now actually go into folder with audios to be checked
 	except:
@@ -11,7 +11,8 @@ import json
 import logging
 logging.basicConfig()
 
-import pysftp
+import time
+from transcribeme_sftp_session import transcribeme_session, parse_server_args
 
 def map_transcription_language(language_code: int) -> str:
 	"""
@@ -134,26 +135,24 @@ def get_transcription_language(subject_id: str, study: str, data_root: Path) ->
 
 	return map_transcription_language(int(language_code))
 
-def transcript_pull(interview_type, data_root, study, ptID, username, password, transcription_language, pipeline=False, lab_email_path=None):
+# pull the transcripts that are ready for one patient's pending audio of the given interview type, given the set of file names currently in the TranscribeMe output folder
+# only transcripts that are in that listing are downloaded, so audio still being transcribed costs no extra requests to the server
+# (TranscribeMe puts .txt files into the top level of the session's output folder as they are done)
+# returns the list of names (on the TranscribeMe server) of the transcripts that were successfully pulled, for use in cleaning up the server after
+# if a timings dict is given, the seconds taken by each successful download are recorded in it by transcript name
+def patient_pull(interview_type, data_root, study, ptID, transcription_language, session, available, pipeline=False, timings=None):
 	# track transcripts that got properly pulled this time, for use in cleaning up server later
 	successful_transcripts = []
 
-	# hardcode the basic properties for the transcription service, password is only sftp-related input for now
-	source_directory = "output" # need to ensure transcribeme is actually putting .txt files into the top level output directory as they are done, consistently!
-	host = "sftp.transcribeme.com"
-
+	directory = os.path.join(data_root, "PROTECTED", study, "processed", ptID, "interviews", interview_type, "pending_audio")
 	try:
-		directory = os.path.join(data_root, "PROTECTED", study, "processed", ptID, "interviews", interview_type, "pending_audio")
-		os.chdir(directory) 
+		cur_pending = sorted(os.listdir(directory))
 	except:
 		# no files for this patient then
-		return
-
-	# loop through files in pending, trying to pull corresponding txt files that are in the transcribeme output folder
-	cur_pending = os.listdir(".")
+		return successful_transcripts
 	if len(cur_pending) == 0:
 		# no files for this patient
-		return
+		return successful_transcripts
 
 	print("Pulling new " + interview_type + " transcripts to server for participant " + ptID + " (if available)")
 
@@ -167,28 +166,34 @@ def transcript_pull(interview_type, data_root, study, ptID, username, password,
 		pass
 	
 	for filename in cur_pending:
+		if "session" not in filename:
+			# can't work out the transcript name without the usual naming convention (also skips anything already marked done+ earlier in the run)
+			if not filename.startswith("done+"):
+				print("Skipping " + filename + " in pending_audio for " + ptID + " " + interview_type + ", as it doesn't follow the naming convention")
+			continue
 		# setup expected source filepath and desired destination filepath
 		rootname = filename.split(".")[0]
 		transname = rootname + ".txt"
 		transname_lookup = rootname.split("session")[0] + transcription_language + "_session" + rootname.split("session")[1] + ".txt"
-		src_path = os.path.join(source_directory, transname_lookup)
+		if transname_lookup not in available:
+			# nothing to do here, most likely need to just keep waiting on this transcript
+			continue
+		src_path = os.path.join(session.layout["output"], transname_lookup)
 		# for now put all pulled transcripts into the prescreening folder. eventually that will change though, will need to be random process for sites that have completed initial reviews
 		local_path = os.path.join(data_root, "PROTECTED", study, "processed", ptID, "interviews", interview_type, "transcripts", "prescreening", transname)
-		# now actually attempt the pull. will hit the except in all cases where the transcript isn't available yet, but don't want that to crash rest of code obviously
+		# now actually attempt the pull. the transcript is known to be there, but don't want any unexpected error to crash rest of code obviously
 		try:
-			cnopts = pysftp.CnOpts()
-			cnopts.hostkeys = None # ignore hostkey
-			with pysftp.Connection(host, username=username, password=password, cnopts=cnopts) as sftp:
-				sftp.get(src_path, local_path)
+			start_time = time.time()
+			session.run(lambda sftp: sftp.get(src_path, local_path))
+			if timings is not None:
+				timings[transname_lookup] = time.time() - start_time
 			successful_transcripts.append(transname_lookup) # if we reach this line it means transcript has been successfully pulled onto PHOENIX
 			# this audio is no longer pending then, decrypted copy should be deleted from briefcase
 			if pipeline:
 				pending_rename = "done+" + filename # + not used in transcript names, so will make it easy to separate prepended info back out
-				os.rename(filename,pending_rename) # if part of pipeline will just temporarily rename with prepended code, parent script will use this to generate email and then move
-		except:
-			# nothing to do here, most likely need to just keep waiting on this transcript
-			# in future could look into detecting types of connection errors, perhaps not always assuming a miss means not transcribed yet
-			# even the current email alerts should make other issues easy to catch over time though, so not a big priority
+				os.rename(os.path.join(directory, filename), os.path.join(directory, pending_rename)) # if part of pipeline will just temporarily rename with prepended code, parent script will use this to generate email and then move
+		except Exception as e:
+			print("Problem pulling available transcript " + transname_lookup + " (" + str(e) + "), will try again next run")
 			try:
 				# seems this sometimes creates an empty file at the prescreening path, so just remove that for clarity
 				os.remove(local_path)
@@ -197,56 +202,112 @@ def transcript_pull(interview_type, data_root, study, ptID, username, password,
 
 	# log some very basic info about success of script
 	print("(" + str(len(successful_transcripts)) + " total transcripts pulled)")
+	return successful_transcripts
 
-	# now do cleanup on trancribeme server for those transcripts successfully pulled
-	input_directory = "audio"
-	prev_problem = False # for preventing repetitive warning going into the email
-	for transcript in successful_transcripts:
-		# will remove decrypted audio from TranscribeMe's server, as they do not need it anymore
+# do cleanup on trancribeme server for the given list of (patient ID, transcript name) for transcripts successfully pulled, all over the same session
+# the audio is removed from TranscribeMe's server, as they do not need it anymore, and the transcript is moved into the study's archive folder (by default a subfolder of output)
+# available is the listing of the output folder from before the pull, which already tells whether an archive folder there exists
+def clean_up_pulled(study, pulled, session, available, pipeline=False, lab_email_path=None):
+	if len(pulled) == 0:
+		return
+	archive_folder = session.layout["archive"].format(study=study)
+	if os.path.dirname(archive_folder) != session.layout["output"] or os.path.basename(archive_folder) not in available:
+		try:
+			session.run(lambda sftp: sftp.mkdir(archive_folder))
+		except:
+			pass # renames below will then fail and be reported
+	problem_patients = [] # for preventing repetitive warning going into the email
+	for ptID, transcript in pulled:
 		match_name = transcript.split(".")[0] 
-		match_audio = match_name + ".wav"
-		remove_path = os.path.join(input_directory, match_audio)
-		# will also move the pulled transcript into an archive subfolder of output on their server (organized by study)
-		cur_path = os.path.join(source_directory, transcript)
-		archive_name = study + "_archive"
-		archive_path = os.path.join(source_directory, archive_name, transcript)
-		archive_folder = os.path.join(source_directory, archive_name) # also need just the folder path so it can be made if doesn't exist yet
-		# actually connect to server to do the updates for current transcript
-		# (note it hasn't been a problem previously to establish new connection each time - 
-		#  but in future may want to refactor so only need to establish connection once per patient instead of per file)
+		remove_path = os.path.join(session.layout["audio"], match_name + ".wav")
+		cur_path = os.path.join(session.layout["output"], transcript)
+		archive_path = os.path.join(archive_folder, transcript)
 		try:
-			cnopts = pysftp.CnOpts()
-			cnopts.hostkeys = None # ignore hostkey
-			with pysftp.Connection(host, username=username, password=password, cnopts=cnopts) as sftp:
-				sftp.remove(remove_path) 
-				if not sftp.exists(archive_folder):
-					sftp.mkdir(archive_folder)
-				sftp.rename(cur_path, archive_path)
+			session.run(lambda sftp: sftp.remove(remove_path))
+			session.run(lambda sftp: sftp.rename(cur_path, archive_path))
 		except:
-			# expect failures here to be rare (if generic connection problems successful_transcripts would likely be empty)
+			# expect failures here to be rare (if generic connection problems the pull itself would likely have failed)
 			print("Error cleaning up TranscribeMe server, please check on file " + match_name)
-			# also add a related warning in this patient's section of email file if this was called via pipeline - but just make it a generic one liner
-			if pipeline and not prev_problem:
+			# also add a related warning to the email file if this was called via pipeline - but just make it a generic one liner per patient
+			# cleanup happens once for the whole study after the pull, so these end up above the patient sections - the text makes clear it is a note for the run rather than for the section below it
+			if pipeline and ptID not in problem_patients:
 				with open(lab_email_path, 'a') as f:
 					# not a particularly urgent problem, but could go unnoticed for a long time if not notified, and best practice is to minimize number of copies/locations with decrypted audio
-					warning_text = "[May have encountered a problem cleaning up completed audios for " + OLID + " on TranscribeMe server, please review manually]"
+					warning_text = "[Study level note on TranscribeMe server cleanup: may have encountered a problem cleaning up completed audios for participant " + ptID + ", please review manually]"
 					f.write("\n") # add a blank line before the warning
 					f.write(warning_text)
 					f.write("\n") # and add a blank line after
 
-				prev_problem = True # now that it's been added no need to add again if another problem arises
+				problem_patients.append(ptID) # now that it's been added no need to add again if another problem arises
+
+# pull the available transcripts for a single patient and interview type, then clean up the server
+def transcript_pull(interview_type, data_root, study, ptID, username, password, transcription_language, pipeline=False, lab_email_path=None, session=None):
+	own_session = session is None
+	if own_session:
+		session = transcribeme_session(username, password)
+	try:
+		available = set(session.run(lambda sftp: sftp.listdir(session.layout["output"])))
+		pulled = patient_pull(interview_type, data_root, study, ptID, transcription_language, session, available, pipeline=pipeline)
+		clean_up_pulled(study, [(ptID, x) for x in pulled], session, available, pipeline=pipeline, lab_email_path=lab_email_path)
+	finally:
+		if own_session:
+			session.close()
+
+# pull the available transcripts for every patient in the study with pending audio, open interviews first and then psychs
+# the TranscribeMe output folder is listed once for the whole run, and server cleanup for everything pulled is done together at the end, over the same connection
+# (the session can also be passed in, to share it across studies - otherwise server_args can give the host, port and folder layout to use instead of TranscribeMe's)
+# if a timings dict is given, the seconds taken by each successful download are recorded in it by transcript name
+def pull_study_transcripts(data_root, study, username, password, transcription_language, pipeline=False, lab_email_path=None, session=None, server_args=None, timings=None):
+	processed_root = os.path.join(data_root, "PROTECTED", study, "processed")
+	pending = []
+	for interview_type in ["open", "psychs"]:
+		for ptID in sorted(os.listdir(processed_root)):
+			pending_folder = os.path.join(processed_root, ptID, "interviews", interview_type, "pending_audio")
+			if os.path.isdir(pending_folder) and len(os.listdir(pending_folder)) > 0:
+				pending.append((interview_type, ptID))
+	if len(pending) == 0:
+		# no need to connect at all if nothing is being waited on
+		return
+
+	own_session = session is None
+	if own_session:
+		session = transcribeme_session(username, password, **(server_args if server_args is not None else {}))
+	try:
+		try:
+			available = set(session.run(lambda sftp: sftp.listdir(session.layout["output"])))
+		except Exception as e:
+			print("Unable to list TranscribeMe output folder (" + str(e) + "), no transcripts pulled this run")
+			return
+		pulled = []
+		try:
+			for interview_type, ptID in pending:
+				# a problem with one patient shouldn't stop the rest of the study from being pulled
+				try:
+					pulled.extend([(ptID, x) for x in patient_pull(interview_type, data_root, study, ptID, transcription_language, session, available, pipeline=pipeline, timings=timings)])
+				except Exception as e:
+					print("Problem pulling " + interview_type + " transcripts for " + ptID + " (" + str(e) + "), will try again next run")
+		finally:
+			# whatever did get pulled (and so marked done+ in pipeline mode) always needs its server cleanup
+			clean_up_pulled(study, pulled, session, available, pipeline=pipeline, lab_email_path=lab_email_path)
+	finally:
+		if own_session:
+			session.close()
 
 if __name__ == '__main__':
 	# Map command line arguments to function arguments.
-	try:
-		if sys.argv[8] == "Y":
-			# if called from main pipeline want to just rename the pulled files in pending_audio here, so email script can use it before deletion
-			transcript_pull(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4], sys.argv[5], sys.argv[6], sys.argv[7], pipeline=True, lab_email_path=sys.argv[9])
-			# should always expect a 5th argument if here, as that means coming from pipeline. otherwise no need to even enter the lab_email_path setting
+	# given an interview type first this pulls for a single patient, otherwise the arguments start at the data root and transcripts are pulled for the whole study
+	# if called from main pipeline want to just rename the pulled files in pending_audio here, so email script can use it before deletion - otherwise just deleting the audio immediately
+	# (should always expect an email path argument after pipeline if it is "Y", as that means coming from pipeline. otherwise no need to even enter the lab_email_path setting)
+	# (if pipeline argument never even provided just want to ignore, not crash)
+	if sys.argv[1] in ["open", "psychs"]:
+		if len(sys.argv) > 9 and sys.argv[8] == "Y":
+			transcript_pull(*sys.argv[1:8], pipeline=True, lab_email_path=sys.argv[9])
 		else:
-			# otherwise just deleting the audio immediately
-			transcript_pull(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4], sys.argv[5], sys.argv[6], sys.argv[7])
-	except:
-		# if pipeline argument never even provided just want to ignore, not crash
-		transcript_pull(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4], sys.argv[5], sys.argv[6], sys.argv[7])
-    
\ No newline at end of file
+			transcript_pull(*sys.argv[1:8])
+	else:
+		# for the whole study, server host and port can follow the email path (blank for the TranscribeMe defaults)
+		server_args = parse_server_args(sys.argv[8:10])
+		if len(sys.argv) > 7 and sys.argv[6] == "Y":
+			pull_study_transcripts(*sys.argv[1:6], pipeline=True, lab_email_path=sys.argv[7], server_args=server_args)
+		else:
+			pull_study_transcripts(*sys.argv[1:6], server_args=server_args)
@@ -8,6 +8,11 @@ from pathlib import Path
 from typing import Optional, Dict
 import pandas as pd
 import json
+import time
+import threading
+import paramiko
+from concurrent.futures import ThreadPoolExecutor
+from transcribeme_sftp_session import transcribeme_session, transcribeme_layout, parse_server_args, TranscribeMeConnectionError
 
 # make sure if paramiko throws an error it will get mentioned in log files
 import logging
@@ -136,25 +141,142 @@ def get_transcription_language(subject_id: str, study: str, data_root: Path) ->
 
 
 
-def transcript_push(interview_type, data_root, study, ptID, username, password, transcription_language, pipeline=False):
-	# currently only expect this to be called from wrapping bash script (possibly via main pipeline), so means there definitely will be some audio to push for this ptID
-	print("Pushing " + interview_type + " audio to TranscribeMe for participant " + ptID)
-	# print statement useful here because the process can be slow, will give user an idea of how far along we are
-
-	# initialize list to keep track of which audio files will need to be moved at end of patient run
-	push_list = []
-
-	# hardcode the basic properties for the transcription service, as these shouldn't change
-	destination_directory = "audio"
-	host = "sftp.transcribeme.com"
-
+# limiter shared by all upload streams, to keep their combined rate under the given megabytes per second
+# returns a function to call with the number of bytes just sent, which sleeps as long as needed to get back under the limit
+# (time spent idle doesn't build up credit for a later burst)
+def upload_rate_limiter(megabytes_per_second):
+	bytes_per_second = megabytes_per_second * 1024 * 1024
+	lock = threading.Lock()
+	state = {"next_time": 0.0} # time by which everything sent so far would have been sent at the limit
+	def limit(num_bytes):
+		with lock:
+			now = time.time()
+			state["next_time"] = max(state["next_time"], now - num_bytes / bytes_per_second) + num_bytes / bytes_per_second
+			wait = state["next_time"] - now
+		if wait > 0:
+			time.sleep(wait)
+	return limit
+
+# uploads are retried this many times in total, waiting upload_backoff seconds after the first failure and doubling the wait after each one after that
+# (only for failures once connected - if the server can't be connected to or the login is rejected, the rest of the run's uploads are skipped instead)
+upload_attempts = 4
+upload_backoff = 10
+# size of the blocks read from the local file (paramiko splits them into individual SFTP write requests)
+upload_block_size = 1024 * 1024
+
+# name a file is uploaded under until it is complete - hidden and with a different extension, so a partial upload is never picked up as audio
+def remote_temp_path(remote_path):
+	return os.path.join(os.path.dirname(remote_path), "." + os.path.basename(remote_path) + ".part")
+
+# upload a file over the given pysftp connection so that it only ever appears at remote_path once it is complete
+# the data is written to a temporary name, continuing from wherever an earlier interrupted upload of it left off, and is only renamed to remote_path once its size matches the local file
+# (writes on the SSH channel reach the server in order, so an interrupted upload leaves a clean prefix of the file to resume from - but if the server itself reported an error, the partial copy is removed so the next attempt starts over)
+# limit, if given, is called with the number of bytes after each block is sent (see upload_rate_limiter)
+# returns the number of bytes sent this time
+def resumable_upload(sftp, local_path, remote_path, limit=None):
+	temp_path = remote_temp_path(remote_path)
+	local_size = os.path.getsize(local_path)
+	try:
+		offset = sftp.stat(temp_path).st_size
+	except IOError:
+		offset = 0
+	if offset > local_size:
+		offset = 0 # not a partial copy of this file, so start over
+
+	sent = 0
+	if offset < local_size or offset == 0: # (a complete copy may already be there if only the rename failed last time)
+		try:
+			with open(local_path, 'rb') as local_file, sftp.open(temp_path, 'r+' if offset > 0 else 'w') as remote_file:
+				local_file.seek(offset)
+				remote_file.seek(offset)
+				remote_file.set_pipelined(True)
+				while True:
+					block = local_file.read(upload_block_size)
+					if len(block) == 0:
+						break
+					remote_file.write(block)
+					sent = sent + len(block)
+					if limit is not None:
+						limit(len(block))
+		except Exception:
+			try:
+				sftp.remove(temp_path) # only works if the connection is still up, in which case the server had a problem with the write
+			except:
+				pass
+			raise
+
+	# check the complete copy is there before it becomes visible under its real name
+	remote_size = sftp.stat(temp_path).st_size
+	if remote_size != local_size:
+		sftp.remove(temp_path)
+		raise IOError("Size of uploaded " + os.path.basename(remote_path) + " (" + str(remote_size) + " bytes) does not match local file (" + str(local_size) + " bytes)")
 	try:
-		directory = os.path.join(data_root, "PROTECTED", study, "processed", ptID, "interviews", interview_type, "audio_to_send")
-		os.chdir(directory) 
-	except:
+		# atomically replaces anything already at remote_path, on servers that support it
+		sftp.sftp_client.posix_rename(temp_path, remote_path)
+	except IOError:
+		# otherwise a plain rename, which needs the destination cleared first (as a re-upload would previously have overwritten it)
+		if sftp.exists(remote_path):
+			sftp.remove(remote_path)
+		sftp.rename(temp_path, remote_path)
+	return sent
+
+# upload the given (local path, remote path) pairs through the session, running as many uploads at once as the session has connections
+# (largest files are started first, so a long interview doesn't end up uploading alone at the end)
+# with bandwidth_limit, the combined upload rate is kept under that many megabytes per second
+# each upload is retried with exponential backoff, resuming from what already reached the server
+# but if the server can't be connected to or logged in to, the remaining uploads are skipped, as they would only fail the same way after waiting out the backoff
+# returns the set of local paths that were uploaded successfully
+# if a timings dict is given, the seconds taken by each successful upload (including any retries) are recorded in it by local path
+def upload_files(session, uploads, bandwidth_limit=None, attempts=upload_attempts, backoff=upload_backoff, timings=None):
+	limit = upload_rate_limiter(bandwidth_limit) if bandwidth_limit is not None else None
+	stop_uploads = threading.Event() # set once connecting has failed, so every stream stops (and it is only logged once)
+
+	def stop(message):
+		if not stop_uploads.is_set():
+			stop_uploads.set()
+			print(message + ", skipping remaining uploads this run")
+
+	def upload(local_path, remote_path):
+		start_time = time.time()
+		for attempt in range(attempts):
+			if stop_uploads.is_set():
+				return False
+			try:
+				session.run(resumable_upload, local_path, remote_path, limit=limit)
+				if timings is not None:
+					timings[local_path] = time.time() - start_time
+				return True
+			except paramiko.AuthenticationException as e:
+				stop("Problem logging in to " + session.host + " (" + str(e) + "), check TranscribeMe login info")
+				return False
+			except TranscribeMeConnectionError as e:
+				stop(str(e))
+				return False
+			except Exception as e:
+				# any files that had problem with push will still be in to_send after this script runs, so just log it here
+				# (in the past have run out of storage space in the input folder, not sure if that specific issue could be caught by the python errors though)
+				if attempt == attempts - 1:
+					print("Problem uploading " + os.path.basename(local_path) + " (" + str(e) + "), giving up for this run")
+					return False
+				wait = backoff * (2 ** attempt)
+				print("Problem uploading " + os.path.basename(local_path) + " (" + str(e) + "), retrying in " + str(wait) + " seconds")
+				stop_uploads.wait(wait) # (cut short if another stream finds the server unreachable meanwhile)
+
+	if len(uploads) == 0:
+		return set()
+	uploads = sorted(uploads, key=lambda x: os.path.getsize(x[0]), reverse=True)
+	with ThreadPoolExecutor(max_workers=min(session.size, len(uploads))) as executor:
+		results = list(executor.map(lambda x: upload(x[0], x[1]), uploads))
+	return set([x[0] for x, success in zip(uploads, results) if success])
+
+# the (local path, remote path) uploads for the WAV files waiting in one patient's audio_to_send folder for the given interview type, or None if there is no such folder
+# remote paths are in the given server audio folder
+def patient_uploads(interview_type, data_root, study, ptID, transcription_language, audio_directory=transcribeme_layout["audio"]):
+	directory = os.path.join(data_root, "PROTECTED", study, "processed", ptID, "interviews", interview_type, "audio_to_send")
+	if not os.path.isdir(directory):
 		# if this is called by pipeline or even the modular wrapping bash script the directory will exist
 		print("audio_to_send folder does not exist for patient " + ptID + " " + interview_type + ", ensure running this script from main pipeline")
-		return
+		return None
 	
 	try:
 		sociodemographics_language = get_transcription_language(subject_id=ptID, study=study, data_root=data_root)
@@ -164,50 +286,119 @@ def transcript_push(interview_type, data_root, study, ptID, username, password,
 		print(f"Error getting transcription language from sociodemographics survey: {e}")
 		print(f"Using default transcription language: {transcription_language}")
 		pass
-	
-	# loop through the WAV files in to_send, push them to TranscribeMe
-	for filename in os.listdir("."):
+
+	uploads = []
+	for filename in sorted(os.listdir(directory)):
 		if not filename.endswith(".wav"):
 			continue
-		
-		# source filepath is just filename, setup desired destination path
+		if "session" not in filename:
+			# can't add the language marker without the usual naming convention, so leave it in to_send for manual review
+			print("Skipping " + filename + " in audio_to_send for " + ptID + " " + interview_type + ", as it doesn't follow the naming convention")
+			continue
+		# setup desired destination path, with the language marker added
 		filename_with_lang = filename.split("session")[0] + transcription_language + "_session" + filename.split("session")[1]
-		dest_path = os.path.join(destination_directory, filename_with_lang)
-
-		# now actually attempt the push - should work unless there is an unexpected error, but of course will catch those so entire script doesn't fail
-		try:
-			cnopts = pysftp.CnOpts()
-			cnopts.hostkeys = None # ignore hostkey
-			with pysftp.Connection(host, username=username, password=password, cnopts=cnopts) as sftp:
-				sftp.put(filename, dest_path)
-			push_list.append(filename) # if get to this point push was successful, add to list
-		except:
-			# any files that had problem with push will still be in to_send after this script runs, so can just pass here
-			# in future may try to catch specific types of errors to identify when the problem is incorrect login info versus something else 
-			# (in the past have run out of storage space in the input folder, not sure if that specific issue could be caught by the python errors though)
-			pass 
-
-	# now move all the successfully uploaded files from to_send to pending_audio
-	# if this was called via pipeline, also prepend "new+" to name as a temporary marker for email alert generation
-	for filename in push_list:
+		uploads.append((os.path.join(directory, filename), os.path.join(audio_directory, filename_with_lang)))
+	return uploads
+
+# move successfully uploaded files from their audio_to_send folder to the neighbouring pending_audio folder
+# if this was called via pipeline, also prepend "new+" to name as a temporary marker for email alert generation
+def move_pushed_audio(local_paths, pipeline=False):
+	for local_path in local_paths:
+		filename = os.path.basename(local_path)
+		pending_folder = os.path.join(os.path.dirname(os.path.dirname(local_path)), "pending_audio")
 		# get path to move to in the different cases
 		if pipeline:
 			new_name = "new+" + filename # + not used in transcript names, so will make it easy to separate prepended info back out
-			new_path = "../pending_audio/" + new_name
 		else:
-			new_path = "../pending_audio/" + filename
-		# move the file
-		shutil.move(filename, new_path)
+			new_name = filename
+		shutil.move(local_path, os.path.join(pending_folder, new_name))
+
+# push the audio waiting in one patient's audio_to_send folder for the given interview type, moving each file that uploads successfully to pending_audio
+# uploads go through the given session if there is one (so connections can be shared across patients), otherwise one is opened just for this patient with the given number of streams
+def transcript_push(interview_type, data_root, study, ptID, username, password, transcription_language, pipeline=False, session=None, streams=1, bandwidth_limit=None):
+	# currently only expect this to be called from wrapping bash script (possibly via main pipeline), so means there definitely will be some audio to push for this ptID
+	print("Pushing " + interview_type + " audio to TranscribeMe for participant " + ptID)
+	# print statement useful here because the process can be slow, will give user an idea of how far along we are
+
+	own_session = session is None
+	if own_session:
+		session = transcribeme_session(username, password, streams=streams)
+	try:
+		uploads = patient_uploads(interview_type, data_root, study, ptID, transcription_language, audio_directory=session.layout["audio"])
+		if uploads is None:
+			return
+		pushed = upload_files(session, uploads, bandwidth_limit=bandwidth_limit)
+	finally:
+		if own_session:
+			session.close()
+
+	move_pushed_audio([x[0] for x in uploads if x[0] in pushed], pipeline=pipeline)
+
+# push all audio waiting to be sent for the study (open interviews and psychs), sharing the TranscribeMe connection(s) across every patient
+# with streams above 1 that many files are uploaded at once, each over its own connection, and bandwidth_limit caps their combined rate in megabytes per second
+# (the session can also be passed in, to share it across studies - otherwise server_args can give the host, port and folder layout to use instead of TranscribeMe's)
+# if a timings dict is given, the seconds taken by each successful upload are recorded in it by local path
+# the wrapping bash script makes sure each patient with audio_to_send also has a pending_audio folder before this is called
+def push_study_audio(data_root, study, username, password, transcription_language, pipeline=False, session=None, streams=1, bandwidth_limit=None, server_args=None, timings=None):
+	own_session = session is None
+	if own_session:
+		session = transcribeme_session(username, password, streams=streams, **(server_args if server_args is not None else {}))
+
+	processed_root = os.path.join(data_root, "PROTECTED", study, "processed")
+	uploads = []
+	for interview_type in ["open", "psychs"]:
+		print("Uploading " + interview_type + " interviews to TranscribeMe")
+		for ptID in sorted(os.listdir(processed_root)):
+			to_send_folder = os.path.join(processed_root, ptID, "interviews", interview_type, "audio_to_send")
+			if not os.path.isdir(to_send_folder) or len(os.listdir(to_send_folder)) == 0:
+				continue
+			print("Pushing " + interview_type + " audio to TranscribeMe for participant " + ptID)
+			# a problem with one patient's files shouldn't stop the rest of the study from uploading
+			try:
+				uploads.extend(patient_uploads(interview_type, data_root, study, ptID, transcription_language, audio_directory=session.layout["audio"]))
+			except Exception as e:
+				print("Problem preparing " + interview_type + " audio for " + ptID + " (" + str(e) + "), skipping this patient for now")
+	if len(uploads) == 0:
+		return # (the session only connects once it is used, so nothing to close)
+
+	start_time = time.time()
+	try:
+		pushed = upload_files(session, uploads, bandwidth_limit=bandwidth_limit, timings=timings)
+	finally:
+		if own_session:
+			session.close()
+	total_megabytes = sum([os.path.getsize(x) for x in pushed]) / (1024.0 * 1024.0)
+	print("(" + str(len(pushed)) + " of " + str(len(uploads)) + " files uploaded, " + str(round(total_megabytes, 1)) + " MB in " + str(round(time.time() - start_time, 1)) + " seconds over "
+		  + str(session.num_connections) + " connection(s))")
+
+	move_pushed_audio([x[0] for x in uploads if x[0] in pushed], pipeline=pipeline)
 
 if __name__ == '__main__':
 	# Map command line arguments to function arguments.
-	try:
-		if sys.argv[8] == "Y":
-			# if called from main pipeline want to just rename the pulled files in pending_audio here, so email script can use it before deletion
-			transcript_push(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4], sys.argv[5], sys.argv[6], sys.argv[7], pipeline=True)
-		else:
-			# otherwise just deleting the audio immediately
-			transcript_push(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4], sys.argv[5], sys.argv[6], sys.argv[7])
-	except:
-		# if pipeline argument never even provided just want to ignore, not crash
-		transcript_push(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4], sys.argv[5], sys.argv[6], sys.argv[7])
+	# given an interview type first this pushes the audio of a single patient, otherwise the arguments start at the data root and all of the study's audio to send is pushed
+	if sys.argv[1] in ["open", "psychs"]:
+		try:
+			# if called from main pipeline want to rename the pushed files in pending_audio, so the email script can use them
+			pipeline = sys.argv[8] == "Y"
+		except:
+			# if pipeline argument never even provided just want to ignore, not crash
+			pipeline = False
+		transcript_push(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4], sys.argv[5], sys.argv[6], sys.argv[7], pipeline=pipeline)
+	else:
+		try:
+			pipeline = sys.argv[6] == "Y"
+		except:
+			pipeline = False
+		try: # number of files to upload at once, default of 1
+			streams = max(int(sys.argv[7]), 1)
+		except:
+			streams = 1
+		try: # cap on combined upload rate in MB/s, default of none
+			bandwidth_limit = float(sys.argv[8])
+			if bandwidth_limit <= 0:
+				bandwidth_limit = None
+		except:
+			bandwidth_limit = None
+		# server host and port, blank for the TranscribeMe defaults
+		server_args = parse_server_args(sys.argv[9:11])
+		push_study_audio(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4], sys.argv[5], pipeline=pipeline, streams=streams, bandwidth_limit=bandwidth_limit, server_args=server_args)
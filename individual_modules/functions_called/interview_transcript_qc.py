@@ -1,230 +1,254 @@
 #!/usr/bin/env python
 
 import os
-import pandas as pd 
-import numpy as np 
+import pandas as pd
+import numpy as np
 import sys
-import glob
+import hashlib
+from dpdash_qc_store import dpdash_csv_paths, qc_rowlog_path, replace_qc_rows
+
+# specify column headers that will be used for every CSV
+# make it DPDash formatted, but will leave reftime/weekday/timeofday columns blank
+# Note the sentence-related features from internal lab feature have been renamed to "turn", as TranscribeMe is not providing sentence-level splitting here
+headers=["reftime","day","timeofday","weekday","study","patient","interview_number","transcript_name","num_subjects", # metadata
+		 "num_turns_S1","num_words_S1","min_words_in_turn_S1","max_words_in_turn_S1", # per subject speaking amount stats
+		 "num_turns_S2","num_words_S2","min_words_in_turn_S2","max_words_in_turn_S2", # generally should have S1 and S2 as main interviewer and patient
+		 "num_turns_S3","num_words_S3","min_words_in_turn_S3","max_words_in_turn_S3", # expect at most 3 relevant subject IDs usually
+		 "num_inaudible","num_questionable","num_crosstalk","num_redacted","num_commas","num_dashes", # transcription accuracy related measures
+		 "final_timestamp_minutes","min_timestamp_space","max_timestamp_space","min_timestamp_space_per_word","max_timestamp_space_per_word"] # timestamp accuracy related measures
+# the columns computed per transcript (everything but the blank and constant columns)
+feature_headers = ["day","interview_number"] + headers[headers.index("transcript_name"):]
+
+# per transcript QC results are cached between runs in the patient's PROTECTED interview type folder, keyed by transcript CSV name along with its size, modification time, and MD5 hash
+# so only new or changed transcripts need to be recomputed each time
+# bump the feature version whenever the QC features change (e.g. new columns are added), so that all cached rows get recomputed
+transcript_qc_feature_version = 1
+cache_columns = ["transcript_name","file_size","file_mtime_ns","file_md5","feature_version"] + [x for x in feature_headers if x != "transcript_name"]
+
+def transcript_qc_cache_path(data_root, study, ptID, interview_type):
+	return os.path.join(data_root, "PROTECTED", study, "processed", ptID, "interviews", interview_type, "transcript_qc_cache.csv")
+
+# load the cache as a dict from transcript name to the cached row (as a dict), dropping any rows from a different feature version
+def load_transcript_qc_cache(cache_path):
+	if not os.path.exists(cache_path):
+		return {}
+	try:
+		cache_df = pd.read_csv(cache_path)
+		if cache_df.columns.tolist() != cache_columns:
+			return {}
+	except:
+		print("Problem reading transcript QC cache " + cache_path + ", recomputing all transcripts")
+		return {}
+	cache_df = cache_df[cache_df["feature_version"] == transcript_qc_feature_version]
+	return {row["transcript_name"]: row for row in cache_df.to_dict(orient="records")}
+
+# save the cache, via a temporary file so an interrupted run doesn't leave a truncated cache behind
+def save_transcript_qc_cache(cache_path, cache_rows):
+	cache_df = pd.DataFrame(cache_rows, columns=cache_columns)
+	os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+	cache_df.to_csv(cache_path + ".tmp", index=False)
+	os.replace(cache_path + ".tmp", cache_path)
+
+def file_md5(filename):
+	with open(filename, 'rb') as f:
+		return hashlib.md5(f.read()).hexdigest()
+
+# check whether a transcript's cache entry is still valid for the file, or the transcript needs to be recomputed
+# size and modification time are checked first, falling back on the content hash when only the modification time differs (e.g. file was copied again unchanged)
+def cached_transcript_valid(cached_row, filename, file_stats):
+	if cached_row["file_size"] != file_stats.st_size:
+		return False
+	if cached_row["file_mtime_ns"] == file_stats.st_mtime_ns:
+		return True
+	return cached_row["file_md5"] == file_md5(filename)
+
+# subject IDs that get their own speaking amount columns
+reported_subjects = ["S1","S2","S3"]
+# (feature name, string counted in the lower cased text of the turns) for the transcription accuracy markers
+# assume a bracket should never follow a ? unless the entire word is bracketed in, for the questionable count
+marker_strings = [("num_inaudible", "[inaudible]"), ("num_questionable", "?]"), ("num_crosstalk", "[crosstalk]"),
+				  ("num_redacted", "redacted"), ("num_commas", ","), ("num_dashes", "-")]
+
+# whole number values of a column of timestamp parts as floats, raising ValueError if any aren't whole numbers
+def _whole_number_part(part):
+	values = part.astype(float)
+	if (values % 1 != 0).any():
+		raise ValueError("timestamp part is not a whole number")
+	return values
+
+# convert a Series of timestamp strings to a float number of minutes
+# timestamps are HH:MM:SS.mmm, but the format sometimes will not include an hours time (MM:SS.mmm), which is used for all of them if any don't fit the first
+def timestamp_minutes(times):
+	parts = times.astype(str).str.split(":", expand=True)
+	if parts.shape[1] >= 3 and not parts[2].isna().any():
+		try:
+			return _whole_number_part(parts[0]) * 60.0 + _whole_number_part(parts[1]) + parts[2].astype(float) / 60.0
+		except ValueError:
+			pass
+	return _whole_number_part(parts[0]) + parts[1].astype(float) / 60.0
+
+# compute the QC features for a single transcript CSV, returning a dict keyed by the feature_headers column names
+# returns None (after logging why) if the transcript can't be used
+def transcript_qc_features(filename):
+	# load in CSV and clear any rows where there is a missing value (should always be a subject, timestamp, and text; code is written so metadata will always be filled so it should only filter out problems on part of transcript)
+	try:
+		cur_trans = pd.read_csv(filename)
+		cur_trans = cur_trans[["subject", "timefromstart", "text"]]
+		cur_trans.dropna(inplace=True)
+	except:
+		# ignore bad CSV - will want to log this for pipeline
+		print("(" + filename + " is an incorrectly formatted CSV, please review)")
+		return None
+
+	# ensure transcript is not empty
+	if cur_trans.empty:
+		print("Current transcript is empty, skipping this file (" + filename + ")")
+		return None
+
+	# add metadata info
+	try:
+		day_num = int(filename.split("day")[1].split("_")[0])
+		int_num = int(filename.split("session")[1].split("_")[0])
+	except:
+		print("Current transcript has incorrect filenaming convention, skipping for now (" + filename + ")")
+		return None
+	features = {}
+	features["transcript_name"] = filename
+	features["day"] = day_num
+	features["interview_number"] = int_num
+
+	# number of words per turn based on spaces
+	cur_turns = cur_trans["text"].astype(str)
+	words_per = cur_turns.str.count(" ") + 1
+
+	# now get word stats for all subjects at once
+	subject_stats = words_per.groupby(cur_trans["subject"]).agg(["size", "sum", "min", "max"])
+	features["num_subjects"] = subject_stats.shape[0]
+	# generally should have S1 and S2 as main interviewer and patient, and at most 3 relevant subject IDs usually - any not present get 0s
+	for subject in reported_subjects:
+		if subject in subject_stats.index:
+			features["num_turns_" + subject] = subject_stats.at[subject, "size"]
+			features["num_words_" + subject] = subject_stats.at[subject, "sum"]
+			features["min_words_in_turn_" + subject] = subject_stats.at[subject, "min"]
+			features["max_words_in_turn_" + subject] = subject_stats.at[subject, "max"]
+		else:
+			features["num_turns_" + subject] = 0
+			features["num_words_" + subject] = 0
+			features["min_words_in_turn_" + subject] = 0
+			features["max_words_in_turn_" + subject] = 0
+
+	# count number of [inaudible] occurences, number of [*?] occurences (where * is any guess at what was said), and number of REDACTED occurences
+	# also count numbers of single dashes and commas as quick check on disfluency/verbatim transcription quality
+	# none of these can span a line break, so they are counted over all turns joined together (and case shouldn't matter)
+	all_text = "\n".join(cur_turns.tolist()).lower()
+	for feature_name, marker in marker_strings:
+		features[feature_name] = all_text.count(marker)
+
+	# finally timestamp related stats, again regardless of subject
+	cur_minutes = timestamp_minutes(cur_trans["timefromstart"]).to_numpy()
+	# get last timestamp - note this will be for the time *before* the last turn
+	features["final_timestamp_minutes"] = round(float(cur_minutes[-1]),2)
+
+	cur_seconds = cur_minutes * 60.0 # convert the minutes to a number of seconds!
+
+	# get min and max space between timestamps, and then as a function of number of words in the intermediate turn
+	# these have units of seconds here
+	differences_list = np.diff(cur_seconds)
+	if len(differences_list) == 0:
+		# current transcript is of minimal length (1 turn), so no valid timestamp differences, use nan
+		features["min_timestamp_space"] = np.nan
+		features["max_timestamp_space"] = np.nan
+		features["min_timestamp_space_per_word"] = np.nan
+		features["max_timestamp_space_per_word"] = np.nan
+	else:
+		# use round so values are reasonably viewable on DPDash
+		features["min_timestamp_space"] = round(np.nanmin(differences_list),3)
+		features["max_timestamp_space"] = round(np.nanmax(differences_list),3)
+		weighted_list = differences_list / words_per.to_numpy()[:-1].astype(float)
+		features["min_timestamp_space_per_word"] = round(np.nanmin(weighted_list),3)
+		features["max_timestamp_space_per_word"] = round(np.nanmax(weighted_list),3)
+	return features
 
 # Function to generate summary values for each available transcript csv
 # Output will primarily serve as QC for transcription process, to be used in conjunction with audio QC
 def interview_transcript_qc(interview_type, data_root, study, ptID):
 	print("Running " + interview_type + " Interview Transcript QC for " + ptID) # if calling from bash module, this will only print for patients that have phone transcript CSVs (whether new or not)
-	# note this script reruns QC on all transcripts in the GENERAL processed folder for given interview type every time (should be fast though, makes it easier to add features)
-
-	# specify column headers that will be used for every CSV
-	# make it DPDash formatted, but will leave reftime/weekday/timeofday columns blank
-	# Note the sentence-related features from internal lab feature have been renamed to "turn", as TranscribeMe is not providing sentence-level splitting here
-	headers=["reftime","day","timeofday","weekday","study","patient","interview_number","transcript_name","num_subjects", # metadata
-			 "num_turns_S1","num_words_S1","min_words_in_turn_S1","max_words_in_turn_S1", # per subject speaking amount stats
-			 "num_turns_S2","num_words_S2","min_words_in_turn_S2","max_words_in_turn_S2", # generally should have S1 and S2 as main interviewer and patient
-			 "num_turns_S3","num_words_S3","min_words_in_turn_S3","max_words_in_turn_S3", # expect at most 3 relevant subject IDs usually
-			 "num_inaudible","num_questionable","num_crosstalk","num_redacted","num_commas","num_dashes", # transcription accuracy related measures
-			 "final_timestamp_minutes","min_timestamp_space","max_timestamp_space","min_timestamp_space_per_word","max_timestamp_space_per_word"] # timestamp accuracy related measures
-
-	# initialize lists to fill in df
-	# metadata ones
-	study_days = []
-	# study and patient list will be same thing n times, so just do at end (same with reftime/weekday nans)
-	int_nums=[]
-	fnames=[]
-	nsubjs=[]
-	# S1 stats
-	nsens_S1=[]
-	nwords_S1=[]
-	minwordsper_S1=[]
-	maxwordsper_S1=[]
-	# S2 stats
-	nsens_S2=[]
-	nwords_S2=[]
-	minwordsper_S2=[]
-	maxwordsper_S2=[]
-	# S3 stats
-	nsens_S3=[]
-	nwords_S3=[]
-	minwordsper_S3=[]
-	maxwordsper_S3=[]
-	# transcript quality
-	ninaud=[]
-	nquest=[]
-	ncross=[]
-	nredact=[]
-	ncommas=[]
-	ndashes = []
-	# timestamp quality
-	fintimes=[]
-	minspaces=[]
-	maxspaces=[]
-	minspacesweighted=[]
-	maxspacesweighted=[]
+	# the DPDash CSV always covers all transcripts in the GENERAL processed folder for given interview type, but only new or changed transcripts are actually recomputed - the rest come from the cache
 
 	try:
 		os.chdir(os.path.join(data_root,"GENERAL", study, "processed", ptID, "interviews", interview_type, "transcripts", "csv"))
 	except:
 		# should generally not reach this error if calling from main pipeline bash script
-		print("No redacted transcript CSVs yet for " + ptID + " " + interview_type + ", or problem with input arguments") 
+		print("No redacted transcript CSVs yet for " + ptID + " " + interview_type + ", or problem with input arguments")
 		return
 
 	cur_files = os.listdir(".")
 	if len(cur_files) == 0:
 		# should generally not reach this error if calling from main pipeline bash script
-		print("No redacted transcript CSVs yet for " + ptID + " " + interview_type + ", or problem with input arguments") 
+		print("No redacted transcript CSVs yet for " + ptID + " " + interview_type + ", or problem with input arguments")
 		return
 
+	cache_path = transcript_qc_cache_path(data_root, study, ptID, interview_type)
+	cached_rows = load_transcript_qc_cache(cache_path)
+	cache_rows = []
+	num_computed = 0
+	cache_changed = False
+
 	cur_files.sort() # go in order, although can also always sort CSV later.
 	for filename in cur_files:
 		if not filename.endswith(".csv"): # skip any non-csv files (and folders) in case they exist
 			continue
-		# load in CSV and clear any rows where there is a missing value (should always be a subject, timestamp, and text; code is written so metadata will always be filled so it should only filter out problems on part of transcript)
-		try:
-			cur_trans = pd.read_csv(filename)
-			cur_trans = cur_trans[["subject", "timefromstart", "text"]]
-			cur_trans.dropna(inplace=True)
-		except:
-			# ignore bad CSV - will want to log this for pipeline
-			print("(" + filename + " is an incorrectly formatted CSV, please review)")
-			continue 
-
-		# ensure transcript is not empty
-		if cur_trans.empty:
-			print("Current transcript is empty, skipping this file (" + filename + ")")
-			continue
-		
-		# add metadata info to lists for CSV
-		try:
-			day_num = int(filename.split("day")[1].split("_")[0])
-			int_num = int(filename.split("session")[1].split("_")[0])
-		except:
-			print("Current transcript has incorrect filenaming convention, skipping for now (" + filename + ")")
-			continue
-		fnames.append(filename)
-		study_days.append(day_num)
-		int_nums.append(int_num)
-
-		# get total number of subjects
-		nsubjs.append(len(set(cur_trans["subject"].tolist())))
-		
-		# now get word stats per subject
-		cur_trans_S1 = cur_trans[cur_trans["subject"]=="S1"] # for S1 it must have at least 1 turn, so no empty check		
-		cur_turns_S1 = [x.lower() for x in cur_trans_S1["text"].tolist()] # case shouldn't matter
-		nsens_S1.append(len(cur_turns_S1))
-		words_per_S1 = [len(x.split(" ")) for x in cur_turns_S1]
-		nwords_S1.append(np.nansum(words_per_S1))
-		minwordsper_S1.append(np.nanmin(words_per_S1))
-		maxwordsper_S1.append(np.nanmax(words_per_S1))
-		# repeat for S2
-		cur_trans_S2 = cur_trans[cur_trans["subject"]=="S2"]
-		if cur_trans_S2.empty:
-			nsens_S2.append(0)
-			nwords_S2.append(0)
-			minwordsper_S2.append(0)
-			maxwordsper_S2.append(0)
-		else:		
-			cur_turns_S2 = [x.lower() for x in cur_trans_S2["text"].tolist()] # case shouldn't matter
-			nsens_S2.append(len(cur_turns_S2))
-			words_per_S2 = [len(x.split(" ")) for x in cur_turns_S2]
-			nwords_S2.append(np.nansum(words_per_S2))
-			minwordsper_S2.append(np.nanmin(words_per_S2))
-			maxwordsper_S2.append(np.nanmax(words_per_S2))
-		# finally S3
-		cur_trans_S3 = cur_trans[cur_trans["subject"]=="S3"]
-		if cur_trans_S3.empty:
-			nsens_S3.append(0)
-			nwords_S3.append(0)
-			minwordsper_S3.append(0)
-			maxwordsper_S3.append(0)
-		else:		
-			cur_turns_S3 = [x.lower() for x in cur_trans_S3["text"].tolist()] # case shouldn't matter
-			nsens_S3.append(len(cur_turns_S3))
-			words_per_S3 = [len(x.split(" ")) for x in cur_turns_S3]
-			nwords_S3.append(np.nansum(words_per_S3))
-			minwordsper_S3.append(np.nanmin(words_per_S3))
-			maxwordsper_S3.append(np.nanmax(words_per_S3))
-
-		# count number of [inaudible] occurences, number of [*?] occurences (where * is any guess at what was said), and number of REDACTED occurences
-		# also count numbers of single dashes and commas as quick check on disfluency/verbatim transcription quality
-		# start by getting all turns regardless of subject
-		cur_turns = [x.lower() for x in cur_trans["text"].tolist()] # case shouldn't matter
-		# also need to get words per here to use later
-		words_per = [len(x.split(" ")) for x in cur_turns]
-		inaud_per = [x.count("[inaudible]") for x in cur_turns]
-		quest_per = [x.count("?]") for x in cur_turns] # assume bracket should never follow a ? unless the entire word is bracketed in
-		cross_per = [x.count("[crosstalk]") for x in cur_turns]
-		redact_per = [x.count("redacted") for x in cur_turns]
-		commas_per = [x.count(",") for x in cur_turns]
-		dash_per = [x.count("-") for x in cur_turns]
-		ninaud.append(np.nansum(inaud_per))
-		nquest.append(np.nansum(quest_per))
-		ncross.append(np.nansum(cross_per))
-		nredact.append(np.nansum(redact_per))
-		ncommas.append(np.nansum(commas_per))
-		ndashes.append(np.nansum(dash_per))
-
-		# finally timestamp related stats, again regardless of subject 
-		# get last timestamp - note this will be for the time *before* the last turn
-		cur_times = cur_trans["timefromstart"].tolist()
-		# convert all timestamps to a float value indicating number of minutes
-		try:
-			cur_minutes = [float(int(x.split(":")[0]))*60.0 + float(int(x.split(":")[1])) + float(x.split(":")[2])/60.0 for x in cur_times]
-		except:
-			cur_minutes = [float(int(x.split(":")[0])) + float(x.split(":")[1])/60.0 for x in cur_times] # format sometimes will not include an hours time, so need to catch that
-		fintimes.append(round(cur_minutes[-1],2))
-
-		cur_seconds = [m * 60.0 for m in cur_minutes] # convert the minutes to a number of seconds!
-
-		# get min and max space between timestamps, and then as a function of number of words in the intermediate turn
-		# these have units of seconds here
-		differences_list = [j - i for i, j in zip(cur_seconds[: -1], cur_seconds[1 :])]
-		if len(differences_list) == 0:
-			# current transcript is of minimal length (1 turn), so no valid timestamp differences, append nan
-			minspaces.append(np.nan)
-			maxspaces.append(np.nan)
-			minspacesweighted.append(np.nan)
-			maxspacesweighted.append(np.nan)
+		file_stats = os.stat(filename)
+		cur_row = cached_rows.get(filename)
+		if cur_row is not None and cached_transcript_valid(cur_row, filename, file_stats):
+			if cur_row["file_mtime_ns"] != file_stats.st_mtime_ns:
+				# content unchanged, update modification time so the hash isn't needed next time
+				cur_row["file_mtime_ns"] = file_stats.st_mtime_ns
+				cache_changed = True
 		else:
-			# use round so values are reasonably viewable on DPDash
-			minspaces.append(round(np.nanmin(differences_list),3))
-			maxspaces.append(round(np.nanmax(differences_list),3))
-			weighted_list = [j/float(i) for i, j in zip(words_per[: -1], differences_list)]
-			minspacesweighted.append(round(np.nanmin(weighted_list),3))
-			maxspacesweighted.append(round(np.nanmax(weighted_list),3))
-
-	# get pt and study lists, and also an empty list for reftime, weekday, and timeofday columns
-	studies = [study for x in range(len(fnames))]
-	patients = [ptID for x in range(len(fnames))]
-	ref_times = [np.nan for x in range(len(fnames))]
-	week_days = [np.nan for x in range(len(fnames))]
-	times = [np.nan for x in range(len(fnames))]
+			features = transcript_qc_features(filename)
+			if features is None:
+				continue
+			num_computed = num_computed + 1
+			cur_row = {"file_size": file_stats.st_size, "file_mtime_ns": file_stats.st_mtime_ns, "file_md5": file_md5(filename), "feature_version": transcript_qc_feature_version}
+			cur_row.update(features)
+		cache_rows.append(cur_row)
+	# the QC rows have changed if any transcript was recomputed, or any cached one is no longer there
+	rows_changed = num_computed > 0 or len(cache_rows) != len(cached_rows)
+
+	if len(cache_rows) == 0:
+		print("No valid transcript CSVs for " + ptID + " " + interview_type)
+		return
+	if rows_changed or cache_changed:
+		save_transcript_qc_cache(cache_path, cache_rows)
 
 	# construct CSV - always includes all transcripts for this patient/interview type, and will be overwritten each time
-	values = [ref_times, study_days, times, week_days, studies, patients, int_nums, fnames, nsubjs, 
-			  nsens_S1, nwords_S1, minwordsper_S1, maxwordsper_S1,
-			  nsens_S2, nwords_S2, minwordsper_S2, maxwordsper_S2,
-			  nsens_S3, nwords_S3, minwordsper_S3, maxwordsper_S3,
-			  ninaud, nquest, ncross, nredact, ncommas, ndashes, 
-			  fintimes, minspaces, maxspaces, minspacesweighted, maxspacesweighted]
 	new_csv = pd.DataFrame()
-	for i in range(len(headers)):
-		h = headers[i]
-		vals = values[i]
-		new_csv[h] = vals
-
-	# now prepare to save new CSV for this patient
-	os.chdir(os.path.join(data_root, "GENERAL", study, "processed", ptID, "interviews", interview_type))
-	# switching back to study identifier in DPDash CSV name
-	output_path_format = study[-2:]+"-"+ptID+"-interviewRedactedTranscriptQC_" + interview_type + "-day*.csv"
-	output_paths = glob.glob(output_path_format)
-	# delete any old DPDash transcript CSVs
+	for h in headers:
+		if h in feature_headers:
+			new_csv[h] = [x[h] for x in cache_rows]
+		elif h == "study":
+			new_csv[h] = [study for x in cache_rows]
+		elif h == "patient":
+			new_csv[h] = [ptID for x in cache_rows]
+		else:
+			# empty reftime, weekday, and timeofday columns
+			new_csv[h] = [np.nan for x in cache_rows]
+	study_days = new_csv["day"].tolist()
+
+	# now log the full set of rows in the DPDash QC store for this patient, to replace the existing DPDash CSV when the store is next materialized
+	# (switching back to study identifier in the DPDash CSV name there)
+	# if there are already rows waiting in the store those are always replaced, otherwise compare against the existing DPDash CSV
+	output_paths = dpdash_csv_paths(data_root, study, ptID, interview_type, "interviewRedactedTranscriptQC")
+	if os.path.exists(qc_rowlog_path(data_root, study, ptID, interview_type, "interviewRedactedTranscriptQC", replace=True)):
+		output_paths = []
 	cur_day_string = str(study_days[0]) + "to" + str(study_days[-1]) + '.csv' # check to see if the new one is actually new though
 	for old_dp in output_paths:
-		if old_dp.split("-day")[-1] == cur_day_string:
-			return # do nothing if we already have!
-		os.remove(old_dp)
-	# save the current one finally
-	output_path_cur = study[-2:] + "-" + ptID + "-interviewRedactedTranscriptQC_" + interview_type + "-day" + str(study_days[0]) + "to" + str(study_days[-1]) + '.csv'
-	new_csv.to_csv(output_path_cur,index=False)
+		if old_dp.split("-day")[-1] == cur_day_string and not rows_changed:
+			return # do nothing if we already have, and no transcripts were new or changed
+	replace_qc_rows(data_root, study, ptID, interview_type, "interviewRedactedTranscriptQC", new_csv)
 	return
-			
+
 if __name__ == '__main__':
     # Map command line arguments to function arguments.
     interview_transcript_qc(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4])
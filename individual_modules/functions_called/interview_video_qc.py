@@ -9,148 +9,140 @@ import sys
 import datetime
 import pandas as pd
 import numpy as np
-import glob
 
 # new imports for video
 import cv2
 from feat import Detector
+from raw_interview_index import raw_interview_names
+from study_metadata import get_consent_date, get_study_days
+from dpdash_qc_store import append_qc_rows
+from video_frame_sampler import iter_sampled_frames, read_frame_source
+from video_qc_detection import detect_faces_scaled, detect_faces_deduplicated, default_batch_megabytes, save_face_detections, parse_scale_args
+from video_qc_adaptive import adaptive_frame_faces, parse_adaptive_args
 
-# run video QC on the newly extracted frames, also handling the file name map for videos here
-def interview_video_qc(interview_type, data_root, study, ptID):
-	# if can't find valid metadata info for the patient, can't move forward here
-	try:
-		study_metadata_path = os.path.join(data_root,"PROTECTED",study,study + "_metadata.csv")
-		study_metadata = pd.read_csv(study_metadata_path)
-		patient_metadata = study_metadata[study_metadata["Subject ID"] == ptID]
-		consent_date_str = patient_metadata["Consent"].tolist()[0]
-		consent_date = datetime.datetime.strptime(consent_date_str,"%Y-%m-%d")
-	except:
-		# occasionally we encounter issues with the study metadata file, so adding a check here
-		print("No consent date information in the study metadata CSV for input patient " + ptID + ", or problem with input arguments")
-		sys.exit(1) # exit with an error code so that wrapping script knows the patient should be disregarded
-
-	# start by looking for new files to process
-	try:
-		os.chdir(os.path.join(data_root,"PROTECTED", study, "processed", ptID, "interviews", interview_type, "video_frames"))
-	except:
-		# should generally not reach this warning if calling from main pipeline bash script
-		print("Haven't extracted any video frames yet for input patient " + ptID + " " + interview_type + ", or problem with input arguments") 
-		return
-
-	cur_folders = os.listdir(".")
-	if len(cur_folders) == 0:
-		# should generally not reach this warning if calling from main pipeline bash script
-		print("Haven't extracted any video frames yet for input patient " + ptID + " " + interview_type + ", or problem with input arguments") 
+# generator of (frame name, BGR image) for the sampled frames of one interview folder
+# normally loads the JPEGs saved by the frame extraction step, but if that step was run in the in memory mode the frames are decoded straight from the video instead
+# (with save_frames True, those decoded frames are also saved as JPEGs in the folder for audit)
+# an image that can't be loaded is yielded as None, so the detector fails on it and it gets logged and excluded like any other bad frame
+def interview_frames(folder, save_frames=False):
+	frame_source = read_frame_source(folder)
+	jpg_files = [x for x in os.listdir(folder) if x.endswith(".jpg")] # only process images
+	if frame_source is None or len(jpg_files) > 0:
+		for file in jpg_files:
+			yield file.split(".")[0], cv2.imread(os.path.join(folder, file))
 		return
 
-	# get any the folders that don't have PyFeat outputs for their frames yet
-	cur_folders_unprocessed = [x for x in cur_folders if not os.path.isdir(x + "/PyFeatOutputs")]
-	if len(cur_folders_unprocessed) == 0:
-		print("No new videos for input patient " + ptID + " " + interview_type)
-		return
-	# go in chronological order
-	cur_folders_unprocessed.sort()
-
-	# set up PyFeat
-	# ok to use default models for what we are tracking, need None for the others to avoid memory issues!
-	detector = Detector(au_model=None,emotion_model=None)
+	video_path, interval_minutes = frame_source
+	try:
+		for frame_name, cur_seconds, frame in iter_sampled_frames(video_path, interval_minutes=interval_minutes):
+			if save_frames:
+				cv2.imwrite(os.path.join(folder, frame_name + ".jpg"), frame)
+			yield frame_name, frame
+	except Exception as e:
+		# frames decoded up to this point are still used, if none were the interview is treated as failed extraction as usual
+		print("Problem decoding frames from " + video_path)
+		print(e)
 
-	# loop through folders to actually process, keeping track of bare bones features for now
-	final_folder_names = []
-	num_frames = []
-	min_faces_in_frame = []
-	max_faces_in_frame = []
-	mean_faces_in_frame = []
-	min_face_confidence = []
-	max_face_confidence = []
-	mean_face_confidence = []
-	min_face_area = []
-	max_face_area = []
-	mean_face_area = []
-	for folder in cur_folders_unprocessed:
-		os.chdir(folder)
-		os.mkdir("PyFeatOutputsTemp") # use temp name for now so wrapping bash script will still know the newest files - that script will rename when done
-		# set up lists for tracking within this interview
-		frames_count = 0
-		face_nums_list = []
-		face_conf_list = []
-		face_area_list = []
-		for file in os.listdir("."):
-			if not file.endswith(".jpg"):
-				# only process images
-				continue
-			try:
-				# actually load in the image
-				cur_image = cv2.imread(file)
-				# run PyFeat
-				image_results = detector.detect_faces(cur_image)
-			except:
-				print("Problem running PyFeat on frame " + file + " - it will be excluded from stats for " + folder)
-				continue
-			# save only the most relevant features for QC for right now
-			# image results is a list of lists containing the basic features for each detected face, make it into a DF first
-			image_core_faces = pd.DataFrame()
-			image_core_faces["FaceRectX"] = [x[0] for x in image_results]
-			image_core_faces["FaceRectY"] = [x[1] for x in image_results]
-			image_core_faces["FaceRectWidth"] = [x[2] for x in image_results]
-			image_core_faces["FaceRectHeight"] = [x[3] for x in image_results]
-			image_core_faces["FaceScore"] = [x[4] for x in image_results]
-			image_core_faces["FaceNumber"] = range(image_core_faces.shape[0])
-			# one file per image
-			image_core_faces.to_csv("PyFeatOutputsTemp/" + file.split(".")[0] + ".csv", index=False)
-			# increment stats now
-			frames_count = frames_count + 1
-			face_nums_list.append(image_core_faces.shape[0])
-			face_conf_list.extend(image_core_faces["FaceScore"].tolist())
-			cur_faces_area = [float(x) * y for x,y in zip(image_core_faces["FaceRectHeight"].tolist(),image_core_faces["FaceRectWidth"].tolist())]
-			face_area_list.extend(cur_faces_area)
-		
-		# check if the interview failed to have any images even loaded, skip these for now along with warning log
-		if frames_count == 0:
-			print("No valid images were successfully extracted from " + folder + ", removing this interview from processing records for now")
-			# remove the directory so it can be recognized as process failing
-			os.rmdir("PyFeatOutputsTemp") # note this only works anyway if the directory is empty!
-			os.chdir("..") # back out of folder before continuing loop
+# run face detection on all the sampled frames of one interview, saving the face level outputs for every frame in one CSV in a PyFeatOutputsTemp subfolder of its frames folder
+# returns a dict of the interview level stats (keyed by DPDash column name), or None if no frames could be processed
+# save_frames only matters for interviews extracted in the in memory mode, see interview_frames
+# batch_size is the number of same size frames passed to the face detector at once, with batch_megabytes capping the memory those frames can take up
+# max_dimension and scale optionally downscale frames before detection (see detection_scale_factor), with face boxes mapped back to original pixels after
+# adaptive is None for the fixed sample schedule, or a tuple of (starting interval in minutes, minimum frames, maximum frames) to sample adaptively based on the detection results
+# - this only applies to interviews extracted in the in memory mode, as the frames must be decoded from the video as detection goes (see video_qc_adaptive.py)
+# hash_distance is None to run the detector on every frame, or the maximum number of differing difference hash bits for a frame to reuse the results of an earlier near duplicate frame instead
+def folder_face_stats(folder_path, detector, save_frames=False, batch_size=1, batch_megabytes=default_batch_megabytes, max_dimension=None, scale=None, adaptive=None, hash_distance=None):
+	folder = os.path.basename(os.path.normpath(folder_path))
+	output_folder = os.path.join(folder_path, "PyFeatOutputsTemp")
+	os.mkdir(output_folder) # use temp name for now so wrapping bash script will still know the newest files - that script will rename when done
+	# set up lists for tracking within this interview
+	frames_count = 0
+	face_nums_list = []
+	face_conf_list = []
+	face_area_list = []
+	frame_faces = []
+	# run PyFeat, in batches of frames where configured
+	detect = lambda frames: detect_faces_scaled(detector, frames, batch_size=batch_size, batch_megabytes=batch_megabytes, max_dimension=max_dimension, scale=scale)
+	# skip near duplicate frames if configured, keeping track of which frame's results each reused
+	reused = {}
+	if hash_distance is not None:
+		detect_unique = detect
+		detect = lambda frames: detect_faces_deduplicated(detect_unique, frames, reused, max_distance=hash_distance)
+	frame_source = read_frame_source(folder_path)
+	if adaptive is not None and frame_source is not None and len([x for x in os.listdir(folder_path) if x.endswith(".jpg")]) == 0:
+		try:
+			frame_results = adaptive_frame_faces(frame_source[0], detect, interval_minutes=adaptive[0], min_frames=adaptive[1], max_frames=adaptive[2],
+												 save_folder=folder_path if save_frames else None)
+		except Exception as e:
+			# treated as failed extraction below, same as when no frames can be decoded in the fixed schedule
+			print("Problem decoding frames from " + frame_source[0])
+			print(e)
+			frame_results = []
+	else:
+		frame_results = detect(interview_frames(folder_path, save_frames=save_frames))
+	for frame_name, image_results in frame_results:
+		if image_results is None:
+			print("Problem running PyFeat on frame " + frame_name + " - it will be excluded from stats for " + folder)
 			continue
+		# save only the most relevant features for QC for right now
+		# image results is a list of lists containing the basic features for each detected face, make it into a DF first
+		image_core_faces = pd.DataFrame()
+		image_core_faces["FaceRectX"] = [x[0] for x in image_results]
+		image_core_faces["FaceRectY"] = [x[1] for x in image_results]
+		image_core_faces["FaceRectWidth"] = [x[2] for x in image_results]
+		image_core_faces["FaceRectHeight"] = [x[3] for x in image_results]
+		image_core_faces["FaceScore"] = [x[4] for x in image_results]
+		image_core_faces["FaceNumber"] = range(image_core_faces.shape[0])
+		# kept for the single per interview output file
+		frame_faces.append((frame_name, image_core_faces))
+		# increment stats now
+		frames_count = frames_count + 1
+		face_nums_list.append(image_core_faces.shape[0])
+		face_conf_list.extend(image_core_faces["FaceScore"].tolist())
+		cur_faces_area = [float(x) * y for x,y in zip(image_core_faces["FaceRectHeight"].tolist(),image_core_faces["FaceRectWidth"].tolist())]
+		face_area_list.extend(cur_faces_area)
+	
+	# check if the interview failed to have any images even loaded, skip these for now along with warning log
+	if frames_count == 0:
+		print("No valid images were successfully extracted from " + folder + ", removing this interview from processing records for now")
+		# remove the directory so it can be recognized as process failing
+		os.rmdir(output_folder) # note this only works anyway if the directory is empty!
+		return None
+	# save the face level outputs for all frames at once
+	save_face_detections(output_folder, frame_faces, reused=reused)
 
-		# add to overall list for this interview
-		final_folder_names.append(folder)
-		num_frames.append(frames_count)
-		min_faces_in_frame.append(np.min(face_nums_list))
-		max_faces_in_frame.append(np.max(face_nums_list))
-		# use round so values are reasonably viewable on DPDash
-		mean_faces_in_frame.append(round(np.mean(face_nums_list),2))
-		if len(face_conf_list) == 0:
-			# handle case where no faces were detected at all
-			min_face_confidence.append(np.nan)
-			max_face_confidence.append(np.nan)
-			mean_face_confidence.append(np.nan)
-			min_face_area.append(np.nan)
-			max_face_area.append(np.nan)
-			mean_face_area.append(np.nan)
-		else:
-			min_face_confidence.append(round(np.min(face_conf_list),3))
-			max_face_confidence.append(round(np.max(face_conf_list),3))
-			mean_face_confidence.append(round(np.mean(face_conf_list),3))
-			min_face_area.append(round(np.min(face_area_list),1))
-			max_face_area.append(round(np.max(face_area_list),1))
-			mean_face_area.append(round(np.mean(face_area_list),1))
-		# back out of folder before continuing loop
-		os.chdir("..") 
+	stats = {}
+	stats["number_extracted_frames"] = frames_count
+	stats["minimum_faces_detected_in_frame"] = np.min(face_nums_list)
+	stats["maximum_faces_detected_in_frame"] = np.max(face_nums_list)
+	# use round so values are reasonably viewable on DPDash
+	stats["mean_faces_detected_in_frame"] = round(np.mean(face_nums_list),2)
+	if len(face_conf_list) == 0:
+		# handle case where no faces were detected at all
+		for stat_name in ["minimum_face_confidence_score","maximum_face_confidence_score","mean_face_confidence_score","minimum_face_area","maximum_face_area","mean_face_area"]:
+			stats[stat_name] = np.nan
+	else:
+		stats["minimum_face_confidence_score"] = round(np.min(face_conf_list),3)
+		stats["maximum_face_confidence_score"] = round(np.max(face_conf_list),3)
+		stats["mean_face_confidence_score"] = round(np.mean(face_conf_list),3)
+		stats["minimum_face_area"] = round(np.min(face_area_list),1)
+		stats["maximum_face_area"] = round(np.max(face_area_list),1)
+		stats["mean_face_area"] = round(np.mean(face_area_list),1)
+	return stats
+
+# add the metadata for a patient's newly processed interviews to their face detection stats, and log the resulting rows to the DPDash QC store
+# takes the frames folder names (raw interview date + time) and the corresponding stats dicts from folder_face_stats
+# also handles the file name map for videos, written into each frames folder
+def record_video_qc(interview_type, data_root, study, ptID, final_folder_names, final_folder_stats):
+	frames_root = os.path.join(data_root,"PROTECTED", study, "processed", ptID, "interviews", interview_type, "video_frames")
 
 	# initialize DF with current stats
 	new_df = pd.DataFrame()
 	new_df["raw_filename"] = final_folder_names
-	new_df["number_extracted_frames"] = num_frames
-	new_df["minimum_faces_detected_in_frame"] = min_faces_in_frame
-	new_df["maximum_faces_detected_in_frame"] = max_faces_in_frame
-	new_df["mean_faces_detected_in_frame"] = mean_faces_in_frame
-	new_df["minimum_face_confidence_score"] = min_face_confidence
-	new_df["maximum_face_confidence_score"] = max_face_confidence
-	new_df["mean_face_confidence_score"] = mean_face_confidence
-	new_df["minimum_face_area"] = min_face_area
-	new_df["maximum_face_area"] = max_face_area
-	new_df["mean_face_area"] = mean_face_area
+	for stat_name in ["number_extracted_frames","minimum_faces_detected_in_frame","maximum_faces_detected_in_frame","mean_faces_detected_in_frame",
+					  "minimum_face_confidence_score","maximum_face_confidence_score","mean_face_confidence_score",
+					  "minimum_face_area","maximum_face_area","mean_face_area"]:
+		new_df[stat_name] = [x[stat_name] for x in final_folder_stats]
 
 	# now need to add metadata columns to the csv using the raw filename parameter
 	# first specify column headers for final DPDash CSV
@@ -160,33 +152,27 @@ def interview_video_qc(interview_type, data_root, study, ptID):
 			 "minimum_face_area","maximum_face_area","mean_face_area"]
 	# initialize lists to fill in df
 	# reftime column will leave blank so can just make it np.nan at the end
-	study_days = []
 	times = []
 	week_days = []
 	# study and patient list will be same thing n times, so just do at end
 	int_nums=[]
 
 	# if reach this point, there should definitely be corresponding raw audio folders - need that list to find the interview number
-	raw_folder_paths = os.listdir(os.path.join(data_root, "PROTECTED", study, "raw", ptID, "interviews", interview_type))
-	raw_folder_names_int = [x.split("/")[-1] for x in raw_folder_paths]
-	# keep only files that seem to meet the convention, also know they will always be Zoom to have video
-	raw_folder_names = [x for x in raw_folder_names_int if (os.path.isdir(os.path.join(data_root, "PROTECTED", study, "raw", ptID, "interviews", interview_type, x)) and len(x.split(" ")) > 1 and len(x.split(" ")[0]) == 10 and len(x.split(" ")[1]) == 8)] 
-	raw_folder_names.sort() # the way zoom puts date/time in text in the folder name means it will always sort in chronological order
+	# keep only folders that seem to meet the convention, also know they will always be Zoom to have video (cached listing shared with the audio scripts)
+	raw_folder_names = raw_interview_names(data_root, study, ptID, interview_type, include_onsite=False)
 	raw_video_formatted = [x.split(" ")[0] + "+" + x.split(" ")[1] for x in raw_folder_names]
 
-	# now use compiled info to get the metadata needed
+	# day numbers for all the new interviews at once (study day starts at 1 on day of consent)
+	study_days = get_study_days(data_root, study, [ptID for x in final_folder_names], [x.split("+")[0] for x in final_folder_names])
+
+	# now use compiled info to get the rest of the metadata needed
 	for folder in final_folder_names:
 		# interview number
 		session_num = raw_video_formatted.index(folder) + 1
 		int_nums.append(session_num)
 
-		# day number
-		date_str = folder.split("+")[0]
-		cur_date = datetime.datetime.strptime(date_str,"%Y-%m-%d")
-		day_num = (cur_date - consent_date).days + 1 # study day starts at 1 on day of consent
-		study_days.append(day_num)
-
 		# weekday encoding
+		date_str = folder.split("+")[0]
 		cur_weekday = datetime.datetime.strptime(date_str,"%Y-%m-%d").weekday()
 		dpdash_weekday = ((cur_weekday + 2) % 7) + 1 # dpdash requires 1 through 7, with 1 being Saturday, so it is different than standard datetime convention
 		week_days.append(dpdash_weekday)
@@ -217,38 +203,86 @@ def interview_video_qc(interview_type, data_root, study, ptID):
 	# in the folder with the extracted frames and now pyfeat outputs, also add a txt that contains the eventual rename of the corresponding video file
 	for og_name,ft_name in zip(new_df["raw_filename"].tolist(),new_df["rename"].tolist()):
 		# name of the txt will simply be the same as the name of the folder
-		log_name = os.path.join(og_name, og_name + ".txt")
+		log_name = os.path.join(frames_root, og_name, og_name + ".txt")
 		with open(log_name, 'w') as f:
 			f.write(ft_name)
 
 	# make sure columns in right order and drop the PII date column
 	new_df = new_df[headers]
 
-	# now prepare to save new CSV for this patient (or update existing CSV if there is one)
-	os.chdir(os.path.join(data_root, "GENERAL", study, "processed", ptID, "interviews", interview_type))
-	# find if there are existing CSVs for this particular subject/type videos
-	# switching back to study identifier in DPDash CSV name
-	output_path_format = study[-2:]+"-"+ptID+"-interviewVideoQC_" + interview_type + "-day*.csv"
-	output_paths = glob.glob(output_path_format)
-	# single existing DPDash file is expected - do concatenation and then delete old version (since naming convention will not overwrite)
-	if len(output_paths) == 1:
-		old_df = pd.read_csv(output_paths[0])
-		join_csv=pd.concat([old_df, new_df])
-		join_csv.reset_index(drop=True, inplace=True)
-		# drop any duplicates in case audio got decrypted a second time - shouldn't happen via pipeline
-		join_csv.drop_duplicates(subset=["patient", "day", "timeofday"],inplace=True)
-		join_csv.sort_values(by=["day","timeofday"],inplace=True) # make sure concatenated CSV is still sorted primarily by day number and secondarily by time
-		output_path_cur = study[-2:] + "-" + ptID + "-interviewVideoQC_" + interview_type + "-day" + str(join_csv["day"].tolist()[0]) + "to" + str(join_csv["day"].tolist()[-1]) + '.csv'
-		join_csv.to_csv(output_path_cur,index=False)
-		os.remove(output_paths[0])
-		return # function is now done if we are in the single existing dpdash case
-	# print warning if more than 1 for this patient
-	if len(output_paths) > 1:
-		print("Warning - multiple DPDash CSVs exist for patient " + ptID + ". Saving current CSV separately for now")
-	# with 0 or more than 1, just save this as is
-	output_path_cur = study[-2:] + "-" + ptID + "-interviewVideoQC_" + interview_type + "-day" + str(study_days[0]) + "to" + str(study_days[-1]) + '.csv'
-	new_df.to_csv(output_path_cur,index=False)
+	# now add the new rows to the DPDash QC store for this patient
+	# the DPDash named CSV itself (switching back to study identifier in the name) gets updated once for the whole study at the end of the video QC module
+	append_qc_rows(data_root, study, ptID, interview_type, "interviewVideoQC", new_df)
+
+# run video QC on the newly extracted frames for a patient, also handling the file name map for videos here
+# see folder_face_stats for the face detection options
+def interview_video_qc(interview_type, data_root, study, ptID, save_frames=False, batch_size=1, batch_megabytes=default_batch_megabytes, max_dimension=None, scale=None, adaptive=None, hash_distance=None):
+	# if can't find valid metadata info for the patient, can't move forward here
+	try:
+		consent_date = get_consent_date(data_root, study, ptID)
+	except:
+		# occasionally we encounter issues with the study metadata file, so adding a check here
+		print("No consent date information in the study metadata CSV for input patient " + ptID + ", or problem with input arguments")
+		sys.exit(1) # exit with an error code so that wrapping script knows the patient should be disregarded
+
+	# start by looking for new files to process
+	try:
+		os.chdir(os.path.join(data_root,"PROTECTED", study, "processed", ptID, "interviews", interview_type, "video_frames"))
+	except:
+		# should generally not reach this warning if calling from main pipeline bash script
+		print("Haven't extracted any video frames yet for input patient " + ptID + " " + interview_type + ", or problem with input arguments") 
+		return
+
+	cur_folders = os.listdir(".")
+	if len(cur_folders) == 0:
+		# should generally not reach this warning if calling from main pipeline bash script
+		print("Haven't extracted any video frames yet for input patient " + ptID + " " + interview_type + ", or problem with input arguments") 
+		return
+
+	# get any the folders that don't have PyFeat outputs for their frames yet
+	cur_folders_unprocessed = [x for x in cur_folders if not os.path.isdir(x + "/PyFeatOutputs")]
+	if len(cur_folders_unprocessed) == 0:
+		print("No new videos for input patient " + ptID + " " + interview_type)
+		return
+	# go in chronological order
+	cur_folders_unprocessed.sort()
+
+	# set up PyFeat
+	# ok to use default models for what we are tracking, need None for the others to avoid memory issues!
+	detector = Detector(au_model=None,emotion_model=None)
+
+	# loop through folders to actually process, keeping track of bare bones features for now
+	final_folder_names = []
+	final_folder_stats = []
+	for folder in cur_folders_unprocessed:
+		stats = folder_face_stats(folder, detector, save_frames=save_frames, batch_size=batch_size, batch_megabytes=batch_megabytes, max_dimension=max_dimension, scale=scale, adaptive=adaptive, hash_distance=hash_distance)
+		if stats is None:
+			continue
+		# add to overall list for this interview
+		final_folder_names.append(folder)
+		final_folder_stats.append(stats)
+
+	record_video_qc(interview_type, data_root, study, ptID, final_folder_names, final_folder_stats)
 
 if __name__ == '__main__':
     # Map command line arguments to function arguments.
-    interview_video_qc(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4])
\ No newline at end of file
+    try: # optional fifth argument saves the frames decoded in the in memory mode as JPEGs for audit
+        save_frames = sys.argv[5] == "Y" or sys.argv[5] == "y"
+    except:
+        save_frames = False
+    try: # optional sixth and seventh arguments set the face detection batch size and its memory ceiling in MB
+        batch_size = max(int(sys.argv[6]), 1)
+    except:
+        batch_size = 1
+    try:
+        batch_megabytes = max(int(sys.argv[7]), 1)
+    except:
+        batch_megabytes = default_batch_megabytes
+    max_dimension, scale = parse_scale_args(sys.argv[8:10])
+    adaptive = parse_adaptive_args(sys.argv[10:14])
+    try: # optional fifteenth argument turns on near duplicate frame skipping, with the given maximum hash distance
+        hash_distance = max(int(sys.argv[14]), 0)
+    except:
+        hash_distance = None
+    interview_video_qc(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4], save_frames=save_frames, batch_size=batch_size, batch_megabytes=batch_megabytes, max_dimension=max_dimension, scale=scale,
+                       adaptive=adaptive, hash_distance=hash_distance)
\ No newline at end of file
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+import os
+import json
+
+# cached listing of a patient's raw interview folder (PROTECTED/<study>/raw/<pt>/interviews/<type>), shared by audio rename, audio QC and video QC
+# the listing is built once with os.scandir (so no separate isdir stat call per entry) and saved under PROTECTED/<study>/raw_interview_index,
+# then reused until the modification time of the raw folder changes, i.e. until an interview is added, removed or renamed there
+# also kept in memory for the rest of the current process, so repeated lookups within one run don't even need to load the JSON
+index_folder_name = "raw_interview_index"
+_memory_cache = {}
+
+# returns the raw entries as a list of [name, is_dir] pairs
+def _raw_entries(data_root, study, ptID, interview_type):
+	raw_folder = os.path.join(data_root, "PROTECTED", study, "raw", ptID, "interviews", interview_type)
+	raw_mtime = os.stat(raw_folder).st_mtime_ns # will raise if the raw folder doesn't exist, same as the os.listdir it replaces
+	cache_key = (raw_folder, raw_mtime)
+	if cache_key in _memory_cache:
+		return _memory_cache[cache_key]
+
+	index_path = os.path.join(data_root, "PROTECTED", study, index_folder_name, ptID + "_" + interview_type + ".json")
+	try:
+		with open(index_path, 'r') as f:
+			saved_index = json.load(f)
+		if saved_index["mtime_ns"] == raw_mtime:
+			_memory_cache[cache_key] = saved_index["entries"]
+			return saved_index["entries"]
+	except:
+		pass # no index saved yet (or unreadable), so build it
+
+	with os.scandir(raw_folder) as it:
+		entries = [[x.name, x.is_dir()] for x in it]
+	entries.sort()
+	_memory_cache[cache_key] = entries
+	try:
+		os.makedirs(os.path.dirname(index_path), exist_ok=True)
+		# write to a temporary file first so a concurrent reader never sees a partial index
+		with open(index_path + ".tmp", 'w') as f:
+			json.dump({"mtime_ns": raw_mtime, "entries": entries}, f)
+		os.replace(index_path + ".tmp", index_path)
+	except:
+		print("Unable to save raw interview index for " + ptID + " " + interview_type + ", continuing without it")
+	return entries
+
+# sorted raw interview names for a patient and interview type, filtered to those that meet the naming convention
+# Zoom folders are named "YYYY-MM-DD HH.MM.SS", and onsite psychs audio is a single YYYYMMDDHHMMSS.WAV file
+# with include_onsite True (audio side) the onsite WAVs are counted, and for psychs reformatted to match the Zoom names so they sort together
+# with include_onsite False (video side) only the Zoom folders are counted, as only they can have video
+# the position in the returned list (plus 1) is the session number
+def raw_interview_names(data_root, study, ptID, interview_type, include_onsite=True):
+	entries = _raw_entries(data_root, study, ptID, interview_type)
+	names = [x for x,is_dir in entries if (is_dir and len(x.split(" ")) > 1 and len(x.split(" ")[0]) == 10 and len(x.split(" ")[1]) == 8) or (include_onsite and x.endswith(".WAV") and len(x) == 18)]
+	if include_onsite and interview_type == "psychs":
+		# make the onsites named the same as offsites for sorting purposess
+		names = [x[0:4] + "-" + x[4:6] + "-" + x[6:8] + " " + x[8:10] + "." + x[10:12] + "." + x[12:14] if x.endswith(".WAV") else x for x in names]
+	names.sort() # the way zoom puts date/time in text in the folder name means it will always sort in chronological order
+	return names
+
+# dict from each (formatted) raw interview name to its session number and raw path
+def raw_interview_sessions(data_root, study, ptID, interview_type, include_onsite=True):
+	raw_folder = os.path.join(data_root, "PROTECTED", study, "raw", ptID, "interviews", interview_type)
+	entries = _raw_entries(data_root, study, ptID, interview_type)
+	# the psychs onsite names were reformatted, so map back to the actual entry on disk for the path
+	original_names = {}
+	for x,is_dir in entries:
+		if include_onsite and interview_type == "psychs" and x.endswith(".WAV") and len(x) == 18:
+			original_names[x[0:4] + "-" + x[4:6] + "-" + x[6:8] + " " + x[8:10] + "." + x[10:12] + "." + x[12:14]] = x
+		else:
+			original_names[x] = x
+	names = raw_interview_names(data_root, study, ptID, interview_type, include_onsite=include_onsite)
+	return {name: (i + 1, os.path.join(raw_folder, original_names[name])) for i, name in enumerate(names)}
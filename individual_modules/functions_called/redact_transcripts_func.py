@@ -2,89 +2,110 @@
 
 import os
 import sys
+import glob
 
-# helper function takes path (filename) to raw transcript txt file and saves a new copy with PII redacted at savepath
-# relies on PII marked within curly brackets. each instance of curly brackets will have all words within (separated on spaces) replaced with "REDACTED"
-# assumes that after each { a } will follow before another {, that an unmatched bracket (or an empty set of braces) will not occur, and there will be some character between any } and {. 
+# redaction of transcripts for GENERAL, relying on PII marked within curly brackets. each instance of curly brackets will have all words within (separated on spaces) replaced with "REDACTED"
+# assumes that after each { a } will follow before another {, that an unmatched bracket (or an empty set of braces) will not occur, and there will be some character between any } and {.
 # this matches the TranscribeMe convention for marking PII. also, because of subject IDs/timestamps we know a line will never begin with a {. it plausibly could end with a } though
+# transcripts are streamed line by line, with each line scanned once and the output assembled with joins
+
+# "REDACTED" words to stand in for the given braced content
+def _redacted_words(contents):
+	# find how many words occur inside the curly brace by splitting on spaces - assume there will always be at least one word inside the braces!
+	return " ".join(["REDACTED" for x in range(contents.count(" ") + 1)])
+
+# redact a single line (already stripped of trailing white space), returning None if the redaction convention is violated
+def redact_line(line):
+	pre_redact_list = line.split("{")
+	if len(pre_redact_list) == 1: # if no redaction at all in this line keep it as is
+		return line
+	# anything that comes before the first redaction is kept as is
+	segments = [pre_redact_list[0]]
+	last_index = len(pre_redact_list) - 1
+	for i in range(1, len(pre_redact_list)):
+		contents = pre_redact_list[i]
+		if i == last_index and contents.endswith("}"):
+			# the last brace in the line ends the line, so here just need to add the redaction, not any subsequent text
+			segments.append(_redacted_words(contents) + "}")
+			continue
+		# expect each of these items to have a single } with meaningful content both before and after (except for the final one, which may end the line)
+		if contents.count("}") != 1:
+			return None
+		to_redact, after = contents.split("}")
+		# the content before is what needs to be redacted, the content after can be kept as is
+		segments.append(_redacted_words(to_redact) + "}" + after)
+	return "{".join(segments)
+
+# helper function takes path (filename) to raw transcript txt file and saves a new copy with PII redacted at savepath
+# the redacted copy is written under a temporary name and only moved to savepath once the whole transcript has been redacted,
+# so if the convention is violated (or anything else goes wrong partway) no partial copy is left behind in GENERAL
+# returns True if the redacted copy was saved
 def redact_transcript(filename, savepath):
 	# do argument sanity check first
 	# if calling via pipeline, shouldn't hit these messages
 	if not os.path.isfile(filename):
 		print("Input transcript path is not a file (" + filename + "), skipping")
-		return
+		return False
 	if os.path.exists(savepath):
 		print("Intended output path already exists (" + savepath + "), skipping")
-		return
+		return False
 
-	# get a list of the lines in the input transcript txt file
-	with open(filename, 'r') as input_file: # read mode
-		input_lines = input_file.readlines()
-		# remove white space characters from the ends of the lines for cleaning
-		input_lines = [line.rstrip() for line in input_lines]
-
-	# now go line by line through the input and write a modified version to the output file
-	output_file = open(savepath, 'w') # write mode
-	for line in input_lines:
-		pre_redact_list = line.split("{")
-		if len(pre_redact_list) == 1: # if no redaction at all in this line write it as is and continue
-			output_file.write(pre_redact_list[0])
-			output_file.write("\n") # add a new line after each line is written! good for reading in txt file, csv conversion script will strip
-			continue
-		# handle anything that comes before the first redaction, start string that will be written to new file for this line
-		modified_line = pre_redact_list[0] + "{"
+	temp_path = savepath + ".tmp"
+	violated = False
+	try:
+		with open(filename, 'r') as input_file, open(temp_path, 'w') as output_file:
+			for line in input_file:
+				# remove white space characters from the ends of the lines for cleaning
+				modified_line = redact_line(line.rstrip())
+				if modified_line is None:
+					print("Redaction convention violated in file (" + filename + "), please review manually")
+					violated = True
+					break
+				# add a new line after each line is written! good for reading in txt file, csv conversion script will strip
+				output_file.write(modified_line + "\n")
+	except:
+		# delete it as a protection for accidentally putting PII in general
+		if os.path.exists(temp_path):
+			os.remove(temp_path)
+		raise
+	if violated:
+		os.remove(temp_path) # delete it as a protection for accidentally putting PII in general
+		return False
+	os.replace(temp_path, savepath)
+	return True
 
-		# now start going through the redactions
-		for contents in pre_redact_list[1:-1]: # exclude very last brace in a given line here, as it may end the line and needs to be treated slightly differently
-			cur_post_redact_list = contents.split("}")
-			# expect each of these items to have a single } with meaningful content both before and after
-			if len(cur_post_redact_list) != 2:
-				print("Redaction convention violated in file (" + filename + "), please review manually")
-				output_file.close()
-				os.remove(savepath) # delete it as a protection for accidentally putting PII in general
-				return
-			# the content before is what needs to be redacted, the content after can be kept as is
-			# find how many words occur inside the curly brace by splitting the first part by spaces
-			to_redact = len(cur_post_redact_list[0].split(" "))
-			for word in range(to_redact-1):
-				modified_line = modified_line + "REDACTED "
-			modified_line = modified_line + "REDACTED}" # assume there will always be at least one word inside the braces! could add more safety checks here?
-			# now add the normal content back, plus the front curly brace as we know we are not on the last one yet if in this loop
-			modified_line = modified_line + cur_post_redact_list[1] + "{"
-		
-		# now just handle final redaction in the line
-		final_redaction = pre_redact_list[-1]
-		if final_redaction[-1] == '}': # handle case where the last character is a curly brace ender separately
-			# here just need to add the redaction, not any subsequent text. do that part as before
-			to_redact = len(final_redaction.split(" "))
-			for word in range(to_redact-1):
-				modified_line = modified_line + "REDACTED "
-			modified_line = modified_line + "REDACTED}"
-		else: # when there is content after the final redaction, handle similarly as before, just don't add an extra {
-			cur_post_redact_list = final_redaction.split("}")
-			# expect each of these items to have a single } with meaningful content both before and after
-			if len(cur_post_redact_list) != 2:
-				print("Redaction convention violated in file (" + filename + "), please review manually")
-				output_file.close()
-				os.remove(savepath) # delete it as a protection for accidentally putting PII in general
-				return
-			# the content before is what needs to be redacted, the content after can be kept as is
-			# find how many words occur inside the curly brace by splitting the first part by spaces
-			to_redact = len(cur_post_redact_list[0].split(" "))
-			for word in range(to_redact-1):
-				modified_line = modified_line + "REDACTED "
-			modified_line = modified_line + "REDACTED}" # assume there will always be at least one word inside the braces! could add more safety checks here?
-			# now add the normal content back
-			modified_line = modified_line + cur_post_redact_list[1]
-		
-		# finally can write the new line that was put together
-		output_file.write(modified_line)
-		output_file.write("\n") # add a new line after each line is written! good for reading in txt file, csv conversion script will strip
-	
-	# done going through the transcript, can close the file and return
-	output_file.close()
-	return
+# batch version for the whole study - creates redacted GENERAL copies for all of the study's top level PROTECTED transcripts that don't have one yet, open interviews first and then psychs
+# (only transcripts on the top level of the PROTECTED transcripts folder have made it past the review step, if selected)
+def redact_study_transcripts(data_root, study):
+	processed_root = os.path.join(data_root, "PROTECTED", study, "processed")
+	for interview_type in ["open", "psychs"]:
+		print("Processing new " + interview_type + " interview transcripts")
+		for ptID in sorted(os.listdir(processed_root)):
+			transcripts_folder = os.path.join(processed_root, ptID, "interviews", interview_type, "transcripts")
+			if not os.path.isdir(transcripts_folder):
+				continue
+			cur_files = sorted(glob.glob(os.path.join(transcripts_folder, "*.txt")))
+			if len(cur_files) == 0:
+				continue
+			print("On patient " + ptID)
+			# make GENERAL side transcript folder for the patient if needed (up to the interview type should already exist here per main pipeline)
+			general_folder = os.path.join(data_root, "GENERAL", study, "processed", ptID, "interviews", interview_type, "transcripts")
+			if not os.path.isdir(general_folder):
+				os.mkdir(general_folder)
+			for filename in cur_files:
+				savepath = os.path.join(general_folder, os.path.basename(filename)[:-len(".txt")] + "_REDACTED.txt")
+				if os.path.exists(savepath):
+					continue
+				try:
+					redact_transcript(filename, savepath)
+				except Exception as e:
+					print("Problem redacting " + os.path.basename(filename) + ", skipping for now")
+					print(e)
 
 if __name__ == '__main__':
 	# Map command line arguments to function arguments.
-	redact_transcript(sys.argv[1], sys.argv[2])
+	# given a data root folder and study, redact all new transcripts in the study, otherwise redact the single given transcript to the given output path
+	if os.path.isdir(sys.argv[1]):
+		redact_study_transcripts(sys.argv[1], sys.argv[2])
+	else:
+		redact_transcript(sys.argv[1], sys.argv[2])
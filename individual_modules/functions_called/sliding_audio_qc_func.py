@@ -11,11 +11,12 @@ from scipy.io import wavfile
 import soundfile as sf
 import librosa
 import sys
+import json
+from audio_qc_features import sliding_window_features, overall_features, mono_blocks, streaming_audio_features
 
-def sliding_audio_qc(filename,savepath,window_size=0.05,window_increment=0.05):
-	# specify column headers that will be used for every CSV
-	headers=["minutes_start","minutes_end","overall_db","mean_flatness"]
-
+# original in memory path - whole file is read at once
+# returns the same features dict as the streaming path, with whole file stats also included if overall is True
+def _load_and_compute(filename, window_size, window_increment, overall=False):
 	# read in audio
 	try:
 		data, fs = sf.read(filename)
@@ -47,16 +48,54 @@ def sliding_audio_qc(filename,savepath,window_size=0.05,window_increment=0.05):
 	window_size_bins = int(window_size * 60.0 * fs)
 	window_increment_bins = int(window_increment * 60.0 * fs)
 
-	# compute features
-	data_rms_rolling = [np.sqrt(np.nanmean(np.square(data[i:i+window_size_bins]))) for i in range(0,len(data),window_increment_bins)]
-	data_flatness_rolling = [round(np.nanmean(librosa.feature.spectral_flatness(y=data[i:i+window_size_bins])),5) for i in range(0,len(data),window_increment_bins)]
+	# compute features for all windows at once
+	data_rms_rolling, data_flatness_rolling = sliding_window_features(data, window_size_bins, window_increment_bins)
+	features = {"rms_rolling": data_rms_rolling, "flatness_rolling": data_flatness_rolling, "samplerate": fs}
+	if overall:
+		# whole file stats from the same decode, so the summary QC step does not need to read the audio again
+		features.update(overall_features(data))
+	return features
+
+# streaming=True reads the audio in blocks instead of loading it all, keeping peak memory constant for long recordings
+# if overall_savepath is provided, the whole file stats used by interview_audio_qc.py are computed in the same pass and saved there as JSON
+def sliding_audio_qc(filename,savepath,window_size=0.05,window_increment=0.05,streaming=False,overall_savepath=None):
+	# specify column headers that will be used for every CSV
+	headers=["minutes_start","minutes_end","overall_db","mean_flatness"]
+
+	if streaming:
+		# bounded memory mode - audio is read in fixed size blocks and never fully loaded
+		try:
+			sound_file = sf.SoundFile(filename)
+		except:
+			print("(" + filename + " is a corrupted audio file)")
+			sys.exit(1) # use sys.exit(1) to signal to pipeline the code has failed for this file
+
+		with sound_file:
+			if sound_file.frames == 0:
+				print("(" + filename + " audio is empty)")
+				sys.exit(1)
+			if sound_file.channels == 2:
+				print("(" + filename + " is not mono)")
+			fs = sound_file.samplerate
+			window_size_bins = int(window_size * 60.0 * fs)
+			window_increment_bins = int(window_increment * 60.0 * fs)
+			try:
+				features = streaming_audio_features(mono_blocks(sound_file), window_size_bins, window_increment_bins, overall=overall_savepath is not None)
+			except RuntimeError:
+				print("(" + filename + " is a corrupted audio file)")
+				sys.exit(1)
+		features["samplerate"] = fs
+	else:
+		features = _load_and_compute(filename, window_size, window_increment, overall=overall_savepath is not None)
+	data_rms_rolling = features["rms_rolling"]
+	data_flatness_rolling = features["flatness_rolling"]
 	minutes_bins = range(len(data_rms_rolling))
 	minutes = [round(x*window_increment,3) for x in minutes_bins]
 	end_minutes = [round(x + window_size,3) for x in minutes]
 
 	# convert RMS to decibels
 	ref_rms=float(2*(10**(-5)))
-	c1_db = [round(20 * np.log10(x/ref_rms),2) for x in data_rms_rolling] 
+	c1_db = np.round(20 * np.log10(data_rms_rolling/ref_rms),2)
 
 	# construct and save CSV
 	values = [minutes,end_minutes,c1_db,data_flatness_rolling]
@@ -67,6 +106,12 @@ def sliding_audio_qc(filename,savepath,window_size=0.05,window_increment=0.05):
 		new_csv[h] = vals
 	new_csv.to_csv(savepath,index=False)
 
+	# save the whole file stats for the summary QC step too if requested
+	if overall_savepath is not None:
+		overall_stats = {"num_samples": int(features["num_samples"]), "samplerate": int(features["samplerate"]), "rms": float(features["rms"]), "stdev": float(features["stdev"]), "mean_flatness": float(features["mean_flatness"])}
+		with open(overall_savepath, 'w') as f:
+			json.dump(overall_stats, f)
+
 if __name__ == '__main__':
 	# Map command line arguments to function arguments.
 
@@ -77,4 +122,14 @@ if __name__ == '__main__':
 		window_size=0.05
 		window_increment=0.05
 
-	sliding_audio_qc(sys.argv[1], sys.argv[2], window_size=window_size, window_increment=window_increment)
+	try: # optional fifth argument turns on the bounded memory streaming mode
+		streaming = sys.argv[5] == "Y" or sys.argv[5] == "y"
+	except:
+		streaming = False
+
+	try: # optional sixth argument gives a path to also save whole file stats from the same decode
+		overall_savepath = sys.argv[6]
+	except:
+		overall_savepath = None
+
+	sliding_audio_qc(sys.argv[1], sys.argv[2], window_size=window_size, window_increment=window_increment, streaming=streaming, overall_savepath=overall_savepath)
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+
+import os
+import datetime
+import pandas as pd
+
+# lookup layer for the study metadata CSV (PROTECTED/<study>/<study>_metadata.csv)
+# each CSV is loaded once per process into a dict keyed by Subject ID, with the consent date already parsed,
+# and reloaded only if the file's modification time changes - so study-wide runs don't reread and refilter it per patient/interview type
+_metadata_cache = {}
+
+# returns dict from Subject ID to a dict of that subject's metadata row, plus "consent_date" (a datetime, or None if missing/unparseable)
+# if a subject ID appears more than once, the first row is used (as with the previous per module lookups)
+def load_study_metadata(data_root, study):
+	study_metadata_path = os.path.join(data_root, "PROTECTED", study, study + "_metadata.csv")
+	metadata_mtime = os.stat(study_metadata_path).st_mtime_ns
+	cached = _metadata_cache.get(study_metadata_path)
+	if cached is not None and cached[0] == metadata_mtime:
+		return cached[1]
+
+	study_metadata = pd.read_csv(study_metadata_path)
+	subjects = {}
+	for row in study_metadata.to_dict("records"):
+		subject_id = row["Subject ID"]
+		if subject_id in subjects:
+			continue
+		try:
+			row["consent_date"] = datetime.datetime.strptime(row["Consent"],"%Y-%m-%d")
+		except:
+			row["consent_date"] = None
+		subjects[subject_id] = row
+	_metadata_cache[study_metadata_path] = (metadata_mtime, subjects)
+	return subjects
+
+# raw consent date string as it appears in the metadata CSV (used for accounting records)
+# raises KeyError if the subject isn't in the metadata
+def get_consent_date_str(data_root, study, ptID):
+	return load_study_metadata(data_root, study)[ptID]["Consent"]
+
+# consent date for a subject as a datetime
+# raises KeyError if the subject isn't in the metadata, and ValueError if they don't have a valid consent date
+def get_consent_date(data_root, study, ptID):
+	consent_date = load_study_metadata(data_root, study)[ptID]["consent_date"]
+	if consent_date is None:
+		raise ValueError("No valid consent date for " + ptID)
+	return consent_date
+
+# study day number for a single date (datetime or YYYY-MM-DD string) - study day starts at 1 on day of consent
+def get_study_day(data_root, study, ptID, date):
+	if not isinstance(date, datetime.datetime):
+		date = datetime.datetime.strptime(date,"%Y-%m-%d")
+	return (date - get_consent_date(data_root, study, ptID)).days + 1
+
+# bulk version - study day numbers for many interviews at once, given equal length lists of subject IDs and dates (YYYY-MM-DD strings or datetimes)
+# returns a list of ints, with None where the subject has no valid consent date or the date can't be parsed
+def get_study_days(data_root, study, ptIDs, dates):
+	subjects = load_study_metadata(data_root, study)
+	consent_dates = pd.to_datetime(pd.Series([subjects[x]["consent_date"] if x in subjects else None for x in ptIDs], dtype="object"), errors="coerce")
+	interview_dates = pd.to_datetime(pd.Series(list(dates), dtype="object"), format="%Y-%m-%d", errors="coerce")
+	day_nums = (interview_dates - consent_dates).dt.days + 1
+	return [None if pd.isnull(x) else int(x) for x in day_nums]
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+
+# pysftp warns on every connection that there is no known_hosts entry, which isn't relevant for the stand-in
+import warnings
+warnings.filterwarnings("ignore", message="Failed to load HostKeys")
+
+import os
+import io
+import sys
+import time
+import wave
+import shutil
+import tempfile
+import contextlib
+import numpy as np
+import pandas as pd
+from transcribeme_sftp_session import transcribeme_session
+from transcribeme_sftp_standin import start_standin_server
+from interview_transcribeme_sftp_push import push_study_audio
+from interview_transcribeme_sftp_pull import pull_study_transcripts
+
+# benchmark for the TranscribeMe push and pull code - not part of the pipeline, meant to be run by hand when choosing transcribeme_upload_streams or checking changes to the SFTP code
+# runs against the local stand-in server with synthetic WAVs in a throwaway PHOENIX style folder, so nothing is ever sent to TranscribeMe:
+# for each combination of file count, file size and number of upload streams it times pushing all of the audio, then writes a synthetic transcript for each uploaded file
+# into the stand-in's output folder and times pulling them back, reporting overall MB/s and per file latency for both
+# (everything stays on this machine, so results show the overhead of the code and connections rather than the network - use transcribeme_upload_limit to mimic a slower uplink)
+
+benchmark_study = "BENCH"
+benchmark_language = "ENGLISH"
+files_per_patient = 4
+transcript_kilobytes = 50
+
+# write a WAV of random 16 bit samples at 16 kHz mono (like the pipeline's processed audio) of about the given size
+def synthetic_wav(path, size_bytes):
+	rng = np.random.default_rng(0)
+	num_samples = max(size_bytes - 44, 0) // 2 # 44 byte header
+	with wave.open(path, 'wb') as f:
+		f.setnchannels(1)
+		f.setsampwidth(2)
+		f.setframerate(16000)
+		while num_samples > 0:
+			block = min(num_samples, 1024 * 1024)
+			f.writeframes(rng.integers(-2000, 2000, size=block, dtype=np.int16).tobytes())
+			num_samples = num_samples - block
+
+# set up the study folder with num_files copies of the given WAV waiting in audio_to_send, spread over patients files_per_patient at a time
+# (along with the other folders the wrapping bash scripts would have made)
+def setup_benchmark_study(data_root, source_wav, num_files):
+	processed_root = os.path.join(data_root, "PROTECTED", benchmark_study, "processed")
+	if os.path.isdir(processed_root):
+		shutil.rmtree(processed_root)
+	for index in range(num_files):
+		ptID = "BM" + str(index // files_per_patient).zfill(4)
+		interview_folder = os.path.join(processed_root, ptID, "interviews", "open")
+		for folder in ["audio_to_send", "pending_audio", os.path.join("transcripts", "prescreening")]:
+			os.makedirs(os.path.join(interview_folder, folder), exist_ok=True)
+		session_number = index % files_per_patient + 1
+		filename = benchmark_study + "_" + ptID + "_openAudio_day" + str(session_number).zfill(4) + "_session" + str(session_number).zfill(3) + ".wav"
+		shutil.copyfile(source_wav, os.path.join(interview_folder, "audio_to_send", filename))
+
+# stand in for TranscribeMe finishing every uploaded audio - write a synthetic transcript to output for each file in audio
+def complete_transcriptions(server_root, layout):
+	line = "S1 00:00:01.000 " + " ".join(["word"] * 20) + "\n"
+	text = line * max(int(transcript_kilobytes * 1024 / len(line)), 1)
+	for filename in os.listdir(os.path.join(server_root, layout["audio"])):
+		if filename.endswith(".wav"):
+			with open(os.path.join(server_root, layout["output"], filename[:-len(".wav")] + ".txt"), 'w') as f:
+				f.write(text)
+
+def _clear_folder(folder):
+	for filename in os.listdir(folder):
+		path = os.path.join(folder, filename)
+		if os.path.isdir(path):
+			shutil.rmtree(path)
+		else:
+			os.remove(path)
+
+def benchmark_transcribeme_sftp(file_counts=[4, 16], file_sizes_mb=[5, 50], stream_counts=[1, 4], bandwidth_limit=None, work_folder=None, output_path=None):
+	remove_work_folder = work_folder is None
+	if work_folder is None:
+		work_folder = tempfile.mkdtemp(prefix="transcribeme_sftp_benchmark_")
+	data_root = os.path.join(work_folder, "PHOENIX")
+	server_root = os.path.join(work_folder, "server")
+	os.makedirs(server_root, exist_ok=True)
+	port, stop_server = start_standin_server(server_root)
+	print("Benchmarking against stand-in server on port " + str(port) + " in " + work_folder)
+
+	rows = []
+	try:
+		for file_mb in file_sizes_mb:
+			source_wav = os.path.join(work_folder, "source.wav")
+			synthetic_wav(source_wav, int(file_mb * 1024 * 1024))
+			for num_files in file_counts:
+				for streams in stream_counts:
+					setup_benchmark_study(data_root, source_wav, num_files)
+					session = transcribeme_session("benchmark", "benchmark", streams=streams, host="127.0.0.1", port=port)
+					for folder in [session.layout["audio"], session.layout["output"]]:
+						_clear_folder(os.path.join(server_root, folder))
+
+					# the pipeline functions log a line per patient, so that output is set aside to keep the results readable
+					push_timings = {}
+					start_time = time.time()
+					with contextlib.redirect_stdout(io.StringIO()):
+						push_study_audio(data_root, benchmark_study, "benchmark", "benchmark", benchmark_language, session=session, bandwidth_limit=bandwidth_limit, timings=push_timings)
+					push_seconds = time.time() - start_time
+					push_connections = session.num_connections
+					session.close()
+
+					complete_transcriptions(server_root, session.layout)
+					pull_megabytes = sum([os.path.getsize(os.path.join(server_root, session.layout["output"], x)) for x in os.listdir(os.path.join(server_root, session.layout["output"]))]) / (1024.0 * 1024.0)
+					session = transcribeme_session("benchmark", "benchmark", host="127.0.0.1", port=port)
+					pull_timings = {}
+					start_time = time.time()
+					with contextlib.redirect_stdout(io.StringIO()):
+						pull_study_transcripts(data_root, benchmark_study, "benchmark", "benchmark", benchmark_language, session=session, timings=pull_timings)
+					pull_seconds = time.time() - start_time
+					session.close()
+
+					push_megabytes = len(push_timings) * os.path.getsize(source_wav) / (1024.0 * 1024.0)
+					rows.append([num_files, file_mb, streams, len(push_timings), round(push_seconds, 3), round(push_megabytes / push_seconds, 2) if push_seconds > 0 else np.nan,
+								 round(np.mean(list(push_timings.values())), 3) if len(push_timings) > 0 else np.nan,
+								 round(np.max(list(push_timings.values())), 3) if len(push_timings) > 0 else np.nan, push_connections,
+								 len(pull_timings), round(pull_seconds, 3), round(pull_megabytes / pull_seconds, 2) if pull_seconds > 0 else np.nan,
+								 round(np.mean(list(pull_timings.values())), 3) if len(pull_timings) > 0 else np.nan])
+	finally:
+		stop_server()
+		if remove_work_folder:
+			shutil.rmtree(work_folder, ignore_errors=True)
+
+	results = pd.DataFrame(rows, columns=["num_files", "file_mb", "streams", "files_pushed", "push_seconds", "push_mb_per_second", "push_mean_file_seconds", "push_max_file_seconds", "push_connections",
+										  "files_pulled", "pull_seconds", "pull_mb_per_second", "pull_mean_file_seconds"])
+	pd.set_option("display.width", 250)
+	print(results.to_string(index=False))
+	if output_path is not None:
+		results.to_csv(output_path, index=False)
+	return results
+
+# comma separated list of numbers from the command line, or the default if blank or invalid
+def _number_list(arg, default, number_type=int):
+	try:
+		values = [number_type(x) for x in arg.split(",") if x != ""]
+		return values if len(values) > 0 else default
+	except:
+		return default
+
+if __name__ == '__main__':
+	# Map command line arguments to function arguments.
+	# all optional - comma separated file counts, file sizes in MB and stream counts to try, then an upload bandwidth limit in MB/s, output CSV path and a work folder to use instead of a temporary one
+	file_counts = _number_list(sys.argv[1], [4, 16]) if len(sys.argv) > 1 else [4, 16]
+	file_sizes_mb = _number_list(sys.argv[2], [5, 50], number_type=float) if len(sys.argv) > 2 else [5, 50]
+	stream_counts = _number_list(sys.argv[3], [1, 4]) if len(sys.argv) > 3 else [1, 4]
+	try:
+		bandwidth_limit = float(sys.argv[4])
+		if bandwidth_limit <= 0:
+			bandwidth_limit = None
+	except:
+		bandwidth_limit = None
+	try:
+		output_path = sys.argv[5] if sys.argv[5] != "" else None
+	except:
+		output_path = None
+	try:
+		work_folder = sys.argv[6] if sys.argv[6] != "" else None
+	except:
+		work_folder = None
+	benchmark_transcribeme_sftp(file_counts=file_counts, file_sizes_mb=file_sizes_mb, stream_counts=stream_counts, bandwidth_limit=bandwidth_limit, work_folder=work_folder, output_path=output_path)
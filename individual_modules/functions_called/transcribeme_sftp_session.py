@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+
+import os
+import socket
+import pysftp
+import paramiko
+import time
+import queue
+
+# make sure if paramiko throws an error it will get mentioned in log files
+import logging
+logging.basicConfig()
+
+# persistent SFTP session with the TranscribeMe server, so that a whole run (all patients and interview types of a study, or several studies) can share one authenticated connection
+# instead of repeating the SSH handshake and login for every file. the connection is opened on first use and kept until closed,
+# and if an operation fails because the connection dropped, it is reopened and the operation retried
+# if the connection can't be opened at all though (server unreachable or refusing connections), that is raised straight away as TranscribeMeConnectionError
+# rather than retried, as it is unlikely to change within a run - callers can then give up on the rest of the run instead of waiting it out file by file
+# for transfers in parallel there is also a small pool of such sessions with the same interface, which runs each operation on whichever session is free
+
+# server address and folder layout default to TranscribeMe's, but can be given for a session so the push and pull code can be pointed at another server (like the local stand-in used for benchmarking)
+# audio is uploaded to the audio folder, finished transcripts appear in the output folder, and pulled transcripts are archived in a per study folder (the archive path is formatted with the study)
+transcribeme_host = "sftp.transcribeme.com"
+transcribeme_port = 22
+transcribeme_layout = {"audio": "audio", "output": "output", "archive": os.path.join("output", "{study}_archive")}
+# seconds to wait for the server to accept a connection before giving up on it
+transcribeme_connect_timeout = 30
+
+class TranscribeMeConnectionError(Exception):
+	pass
+
+# pysftp connection that opens its socket with a timeout (pysftp itself has no option for one, so an unreachable server would otherwise hang until the OS gives up)
+class _TimeoutConnection(pysftp.Connection):
+	def __init__(self, *args, connect_timeout=None, **kwargs):
+		self._connect_timeout = connect_timeout
+		super().__init__(*args, **kwargs)
+
+	def _start_transport(self, host, port):
+		self._transport = paramiko.Transport(socket.create_connection((host, port), timeout=self._connect_timeout))
+		if self._cnopts.ciphers is not None:
+			self._transport.get_security_options().ciphers = self._cnopts.ciphers
+
+class TranscribeMeSession:
+	def __init__(self, username, password, host=transcribeme_host, port=transcribeme_port, layout=None, reconnect_attempts=2, reconnect_wait=5, connect_timeout=transcribeme_connect_timeout):
+		self.username = username
+		self.password = password
+		self.host = host
+		self.port = port
+		self.layout = dict(transcribeme_layout)
+		if layout is not None:
+			self.layout.update(layout)
+		self.reconnect_attempts = reconnect_attempts # how many times to reconnect and retry a single operation
+		self.reconnect_wait = reconnect_wait # seconds to wait before reconnecting
+		self.connect_timeout = connect_timeout
+		self.num_connections = 0 # connections opened over the life of the session, for logging
+		self.size = 1 # number of operations that can run at once
+		self._sftp = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+	# the open pysftp connection, connecting first if needed
+	# raises TranscribeMeConnectionError if it can't be opened (or paramiko's AuthenticationException if the login is rejected)
+	def connection(self):
+		if self._sftp is None:
+			cnopts = pysftp.CnOpts()
+			cnopts.hostkeys = None # ignore hostkey
+			try:
+				self._sftp = _TimeoutConnection(self.host, username=self.username, password=self.password, port=self.port, cnopts=cnopts, connect_timeout=self.connect_timeout)
+			except paramiko.AuthenticationException:
+				raise
+			except Exception as e:
+				raise TranscribeMeConnectionError("Unable to connect to " + self.host + " port " + str(self.port) + " (" + str(e) + ")") from e
+			self.num_connections = self.num_connections + 1
+		return self._sftp
+
+	# whether there is currently an open connection that is still usable
+	def is_connected(self):
+		if self._sftp is None:
+			return False
+		try:
+			return self._sftp.sftp_client.get_channel().get_transport().is_active()
+		except:
+			return False
+
+	# run operation(sftp, *args, **kwargs) with the open connection, returning its result
+	# errors from the operation itself (like a missing remote file) are raised as usual, but if the connection turns out to have dropped
+	# it is reopened and the operation retried, so operations should be safe to repeat (failing to connect or log in at all is not retried though)
+	def run(self, operation, *args, **kwargs):
+		attempt = 0
+		while True:
+			sftp = self.connection()
+			try:
+				return operation(sftp, *args, **kwargs)
+			except Exception:
+				if self.is_connected() or attempt >= self.reconnect_attempts:
+					raise
+				attempt = attempt + 1
+				print("Connection to " + self.host + " failed, reconnecting (attempt " + str(attempt) + ")")
+				self.close()
+				time.sleep(self.reconnect_wait)
+
+	def close(self):
+		if self._sftp is not None:
+			try:
+				self._sftp.close()
+			except:
+				pass
+			self._sftp = None
+
+class TranscribeMeSessionPool:
+	def __init__(self, username, password, size=2, **session_args):
+		self.size = size
+		self.sessions = [TranscribeMeSession(username, password, **session_args) for x in range(size)]
+		self.host = self.sessions[0].host
+		self.port = self.sessions[0].port
+		self.layout = self.sessions[0].layout
+		# most recently used session is handed out first, so extra connections are only opened once operations actually overlap
+		self._free = queue.LifoQueue()
+		for session in self.sessions:
+			self._free.put(session)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+	@property
+	def num_connections(self):
+		return sum([x.num_connections for x in self.sessions])
+
+	# run operation(sftp, *args, **kwargs) on a free session (waiting for one if needed), with the same reconnect handling as a single session
+	def run(self, operation, *args, **kwargs):
+		session = self._free.get()
+		try:
+			return session.run(operation, *args, **kwargs)
+		finally:
+			self._free.put(session)
+
+	def close(self):
+		for session in self.sessions:
+			session.close()
+
+# a single session, or a pool of them when more than one stream is wanted
+def transcribeme_session(username, password, streams=1, **session_args):
+	if streams > 1:
+		return TranscribeMeSessionPool(username, password, size=streams, **session_args)
+	return TranscribeMeSession(username, password, **session_args)
+
+# command line handling for the server settings, given the list of (up to) two argument strings - host, then port
+# returns the keyword arguments for transcribeme_session, leaving out any that are blank or invalid so the TranscribeMe defaults are used
+def parse_server_args(args):
+	session_args = {}
+	try:
+		if args[0] != "":
+			session_args["host"] = args[0]
+	except:
+		pass
+	try:
+		session_args["port"] = int(args[1])
+	except:
+		pass
+	return session_args
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import time
+import socket
+import threading
+import paramiko
+
+# make sure if paramiko throws an error it will get mentioned in log files
+# (except for the stand-in's own server side connections, which would otherwise log an error every time a client disconnects)
+import logging
+logging.basicConfig()
+logging.getLogger("paramiko.transcribeme_standin").setLevel(logging.CRITICAL)
+
+from transcribeme_sftp_session import transcribeme_layout
+
+# local stand-in for the TranscribeMe SFTP server - not part of the pipeline, meant for measuring and regression testing the push and pull code without touching the vendor's server
+# serves a local folder over SFTP (paramiko based, localhost only), set up with the same folder layout as TranscribeMe: audio for uploads and output for returned transcripts,
+# with study archive folders made within output by the pull code as usual. the push and pull code can be pointed at it with the session host and port settings
+# it supports just the operations the pipeline uses (listing, stat, reading/writing files, remove, rename, posix rename and mkdir)
+
+# SFTP file handle for a local file
+class _StandinHandle(paramiko.SFTPHandle):
+	def stat(self):
+		try:
+			return paramiko.SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+		except OSError as e:
+			return paramiko.SFTPServer.convert_errno(e.errno)
+
+# SFTP operations on the served folder - the root folder is given via the server interface
+class _StandinSFTP(paramiko.SFTPServerInterface):
+	def __init__(self, server, *args, **kwargs):
+		super().__init__(server, *args, **kwargs)
+		self.root_folder = server.root_folder
+
+	# local path for a remote path, which can't escape the served folder
+	def _local_path(self, path):
+		return os.path.join(self.root_folder, self.canonicalize(path).lstrip("/"))
+
+	def canonicalize(self, path):
+		return "/" + os.path.normpath("/" + path).lstrip("/")
+
+	def list_folder(self, path):
+		local_path = self._local_path(path)
+		try:
+			listing = []
+			for filename in os.listdir(local_path):
+				attributes = paramiko.SFTPAttributes.from_stat(os.stat(os.path.join(local_path, filename)))
+				attributes.filename = filename
+				listing.append(attributes)
+			return listing
+		except OSError as e:
+			return paramiko.SFTPServer.convert_errno(e.errno)
+
+	def stat(self, path):
+		try:
+			return paramiko.SFTPAttributes.from_stat(os.stat(self._local_path(path)))
+		except OSError as e:
+			return paramiko.SFTPServer.convert_errno(e.errno)
+
+	def lstat(self, path):
+		try:
+			return paramiko.SFTPAttributes.from_stat(os.lstat(self._local_path(path)))
+		except OSError as e:
+			return paramiko.SFTPServer.convert_errno(e.errno)
+
+	def open(self, path, flags, attr):
+		local_path = self._local_path(path)
+		try:
+			file_descriptor = os.open(local_path, flags, 0o644)
+		except OSError as e:
+			return paramiko.SFTPServer.convert_errno(e.errno)
+		if flags & os.O_WRONLY:
+			mode = "ab" if flags & os.O_APPEND else "wb"
+		elif flags & os.O_RDWR:
+			mode = "a+b" if flags & os.O_APPEND else "r+b"
+		else:
+			mode = "rb"
+		handle = _StandinHandle(flags)
+		handle.filename = local_path
+		handle.readfile = os.fdopen(file_descriptor, mode)
+		handle.writefile = handle.readfile
+		return handle
+
+	def remove(self, path):
+		try:
+			os.remove(self._local_path(path))
+		except OSError as e:
+			return paramiko.SFTPServer.convert_errno(e.errno)
+		return paramiko.SFTP_OK
+
+	def rename(self, oldpath, newpath):
+		# like a standard SFTP server, a plain rename won't replace an existing file
+		if os.path.exists(self._local_path(newpath)):
+			return paramiko.SFTP_FAILURE
+		try:
+			os.rename(self._local_path(oldpath), self._local_path(newpath))
+		except OSError as e:
+			return paramiko.SFTPServer.convert_errno(e.errno)
+		return paramiko.SFTP_OK
+
+	def posix_rename(self, oldpath, newpath):
+		try:
+			os.replace(self._local_path(oldpath), self._local_path(newpath))
+		except OSError as e:
+			return paramiko.SFTPServer.convert_errno(e.errno)
+		return paramiko.SFTP_OK
+
+	def mkdir(self, path, attr):
+		try:
+			os.mkdir(self._local_path(path))
+		except OSError as e:
+			return paramiko.SFTPServer.convert_errno(e.errno)
+		return paramiko.SFTP_OK
+
+	def rmdir(self, path):
+		try:
+			os.rmdir(self._local_path(path))
+		except OSError as e:
+			return paramiko.SFTPServer.convert_errno(e.errno)
+		return paramiko.SFTP_OK
+
+# SSH side - password login for the given account (or any account if no username is given), and only the SFTP subsystem
+class _StandinServer(paramiko.ServerInterface):
+	def __init__(self, root_folder, username=None, password=None):
+		self.root_folder = root_folder
+		self.username = username
+		self.password = password
+
+	def get_allowed_auths(self, username):
+		return "password"
+
+	def check_auth_password(self, username, password):
+		if self.username is None or (username == self.username and password == self.password):
+			return paramiko.AUTH_SUCCESSFUL
+		return paramiko.AUTH_FAILED
+
+	def check_channel_request(self, kind, chanid):
+		if kind == "session":
+			return paramiko.OPEN_SUCCEEDED
+		return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+# start serving root_folder over SFTP on localhost in background threads, making the TranscribeMe folder layout within it if needed
+# port 0 picks a free port. returns the port and a function that stops the server
+def start_standin_server(root_folder, port=0, username=None, password=None, layout=None):
+	layout = dict(transcribeme_layout) if layout is None else layout
+	for folder in [layout["audio"], layout["output"]]:
+		os.makedirs(os.path.join(root_folder, folder), exist_ok=True)
+	host_key = paramiko.RSAKey.generate(2048) # new key each time, clients of the stand-in don't check it anyway
+
+	listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+	listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+	listener.bind(("127.0.0.1", port))
+	listener.listen(64)
+	transports = []
+	stopped = threading.Event()
+
+	# SSH negotiation for each client happens in its own thread, so clients connecting at once are not held up behind each other
+	def start_session(client):
+		transport = paramiko.Transport(client)
+		transport.set_log_channel("paramiko.transcribeme_standin")
+		transport.add_server_key(host_key)
+		transport.set_subsystem_handler("sftp", paramiko.SFTPServer, _StandinSFTP)
+		transports.append(transport)
+		try:
+			transport.start_server(server=_StandinServer(os.path.abspath(root_folder), username=username, password=password))
+		except Exception as e:
+			print("Stand-in server failed to start a session (" + str(e) + ")")
+
+	def serve():
+		while not stopped.is_set():
+			try:
+				client, address = listener.accept()
+			except OSError:
+				break # listener closed
+			threading.Thread(target=start_session, args=(client,), daemon=True).start()
+
+	def stop():
+		stopped.set()
+		listener.close()
+		for transport in transports:
+			transport.close()
+
+	threading.Thread(target=serve, daemon=True).start()
+	return listener.getsockname()[1], stop
+
+if __name__ == '__main__':
+	# Map command line arguments to function arguments.
+	# serves the given folder until interrupted - optional port (default 2222), then username and password to require (default accepts any login)
+	try:
+		port = int(sys.argv[2])
+	except:
+		port = 2222
+	try:
+		username = sys.argv[3]
+		password = sys.argv[4]
+	except:
+		username = None
+		password = None
+	port, stop = start_standin_server(sys.argv[1], port=port, username=username, password=password)
+	print("Serving " + sys.argv[1] + " as a TranscribeMe stand-in on 127.0.0.1 port " + str(port) + ", press Ctrl+C to stop")
+	try:
+		while True:
+			time.sleep(1)
+	except KeyboardInterrupt:
+		stop()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+
+import os
+import re
+import sys
+import glob
+
+# converts redacted TranscribeMe transcript txt files to CSV, with one row per transcript line (turn) and columns study, patient, filename, subject, timefromstart, text
+# each transcript is parsed in a single pass over its lines with precompiled patterns - this replaces a bash loop that spawned several awk/echo/tr processes per transcript line
+# output matches that of the bash version exactly, including its quirks: fields are written as is rather than CSV escaped (double quotes are instead stripped from the text, which is quoted),
+# and the text is whatever falls between the first timestamp and any later timestamp like string on the line
+
+# separator patterns for the text that follows the timestamp - MM:SS.mmm normally, or MM:SS when millisecond resolution isn't provided (HH: prefixes are fine either way)
+# (the . before the milliseconds matches any character, as it did as an awk field separator)
+_timestamp_ms_split = re.compile("[0-9][0-9]:[0-9][0-9].[0-9][0-9][0-9] ")
+_timestamp_s_split = re.compile("[0-9][0-9]:[0-9][0-9] ")
+# whitespace as awk splits fields by default (not including carriage returns)
+_awk_whitespace = re.compile("[ \t\n]+")
+_non_ascii = re.compile("[^\x00-\x7f]")
+
+# second field of the string split on the given separator pattern, or empty string if there is none
+def _second_field(line, separator):
+	fields = separator.split(line)
+	return fields[1] if len(fields) > 1 else ""
+
+# the CSV row for one transcript line (without newline), or None for lines that should be skipped (i.e. empty)
+# colon_subjects is whether the transcript marks speakers like "S1:" rather than just "S1"
+def transcript_line_row(line, study, ptID, name, colon_subjects):
+	line = line.replace("\t", " ") # returned transcripts see a mix of tabs and spaces
+	text = _second_field(line, _timestamp_ms_split)
+	if text == "":
+		text = _second_field(line, _timestamp_s_split)
+		if text == "":
+			return None
+	fields = _awk_whitespace.split(line.strip(" \t\n"))
+	if colon_subjects:
+		sub = line.split(": ")[0]
+	else:
+		sub = fields[0]
+	time = fields[1] if len(fields) > 1 else ""
+	text = text.replace('"', "").replace("\r", "") # remove extra characters at end of each sentence
+	return study + "," + ptID + "," + name + "," + sub + "," + time + ",\"" + text + "\""
+
+# convert a single transcript txt to the CSV at csv_path, given its already decoded contents
+def convert_transcript_text(content, csv_path, study, ptID, name):
+	# check subject number format, as they've used a few different delimiters in the past
+	# (this does assume they are consistent with one format throughout a single file though - subject 1 is guaranteed to appear at least once as it is the initial ID they assign)
+	colon_subjects = "S1:" in content
+	lines = content.split("\n")
+	if len(lines) > 0 and lines[-1] == "":
+		lines = lines[:-1] # final newline doesn't start another line
+	# (no reason to have DPDash formatting for a transcript CSV, so these columns are chosen - some of them are just for ease of future concat/merge operations)
+	rows = ["study,patient,filename,subject,timefromstart,text"]
+	for line in lines:
+		row = transcript_line_row(line, study, ptID, name, colon_subjects)
+		if row is not None:
+			rows.append(row)
+	with open(csv_path, 'w', encoding="utf-8", newline="") as f:
+		f.write("\n".join(rows) + "\n")
+
+# check encoding and convert one transcript txt to CSV in its csv subfolder, returning whether a CSV was written
+# transcripts are expected to be ASCII, but UTF-8 is accepted with the offending lines logged; anything else is removed from GENERAL, with a note added to the email body if email_path is given
+def convert_transcript(txt_path, study, ptID, email_path=None):
+	file = os.path.basename(txt_path)
+	name = file.split(".")[0]
+	with open(txt_path, 'rb') as f:
+		raw_content = f.read()
+	try:
+		content = raw_content.decode("ascii")
+	except UnicodeDecodeError:
+		try:
+			content = raw_content.decode("utf-8")
+		except UnicodeDecodeError:
+			print("Found transcript that is not UTF8 encoded, this may cause issues with the automatic redaction! It will be completely skipped in GENERAL for now, please review manually")
+			if email_path is not None:
+				with open(email_path, 'a') as f:
+					f.write("\n")
+					f.write("Error during post processing of newly redacted transcripts!\n")
+					f.write(file + " is not UTF-8 encoded, so is not currently able to be processed. Keeping this transcript out of GENERAL currently, please manually revisit\n")
+			os.remove(txt_path)
+			return False
+		# if it's not ASCII but is UTF8, just log the relevant lines in case one wants to manually edit that part later
+		print("") # also add spacing around it because the output could end up being long
+		print("Found transcript that is not ASCII encoded, moving forward with processing but see the following offending lines if manual adjustment of " + file + " is desired:")
+		print("\n".join([x for x in content.split("\n") if _non_ascii.search(x)]))
+		print("")
+	convert_transcript_text(content, os.path.join(os.path.dirname(txt_path), "csv", name + ".csv"), study, ptID, name)
+	return True
+
+# convert all new redacted transcripts for the study, open interviews first and then psychs
+# a transcript is new if its csv subfolder doesn't have a CSV with the same name yet
+def convert_study_transcripts(data_root, study, email_path=None):
+	processed_root = os.path.join(data_root, "GENERAL", study, "processed")
+	for interview_type in ["open", "psychs"]:
+		print("Processing new " + interview_type + " interview transcripts")
+		for ptID in sorted(os.listdir(processed_root)):
+			transcripts_folder = os.path.join(processed_root, ptID, "interviews", interview_type, "transcripts")
+			if not os.path.isdir(transcripts_folder):
+				continue
+			os.makedirs(os.path.join(transcripts_folder, "csv"), exist_ok=True)
+			pt_has_new = False # only mention patients in log that had new transcripts to process
+			# all text files on top level should be approved redacted transcripts
+			for txt_path in sorted(glob.glob(os.path.join(transcripts_folder, "*.txt"))):
+				name = os.path.basename(txt_path).split(".")[0]
+				if os.path.exists(os.path.join(transcripts_folder, "csv", name + ".csv")):
+					continue
+				pt_has_new = True
+				try:
+					convert_transcript(txt_path, study, ptID, email_path=email_path)
+				except Exception as e:
+					print("Problem converting " + os.path.basename(txt_path) + " to CSV")
+					print(e)
+			if pt_has_new:
+				print("Done converting new redacted " + interview_type + " transcripts to CSV for " + ptID)
+
+if __name__ == '__main__':
+	# Map command line arguments to function arguments.
+	try: # optional third argument gives the email body file to add any encoding errors to, when called from the main pipeline
+		email_path = sys.argv[3] if sys.argv[3] != "" else None
+	except:
+		email_path = None
+	convert_study_transcripts(sys.argv[1], sys.argv[2], email_path=email_path)
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import cv2
+
+# samples still frames from an interview video for video QC, all within a single decoder session
+# (previously a separate ffmpeg process was launched per frame, each reopening and reprobing the MP4)
+# frames are taken every interval_minutes, offset by 1 second at the start of each hour to avoid capturing a possibly empty screen at the very beginning of the recording,
+# and named hour<H>_minute<MM> to match the frame file names used by the rest of the video pipeline
+
+# (frame name, time in seconds) for a sample taken cur_minute whole minutes into the video
+def sample_point(cur_minute):
+	hr, minute = divmod(cur_minute, 60)
+	return "hour" + str(hr) + "_minute" + format(minute, '02d'), cur_minute * 60 + (1 if minute == 0 else 0)
+
+# list of (frame name, time in seconds) for the sample schedule, up to the given duration
+# if duration is None, schedule goes up to 10 hours and the caller stops at the end of the video (a video is not expected to hit 10+ hours)
+def sample_schedule(duration_seconds=None, interval_minutes=4):
+	max_seconds = duration_seconds if duration_seconds is not None else 10 * 3600
+	schedule = []
+	cur_minute = 0
+	while True:
+		frame_name, cur_seconds = sample_point(cur_minute)
+		if cur_seconds >= max_seconds:
+			break
+		schedule.append((frame_name, cur_seconds))
+		cur_minute = cur_minute + interval_minutes
+	return schedule
+
+# duration of the video in seconds based on the container's frame count and rate, or None if those aren't reported
+def video_duration(capture):
+	fps = capture.get(cv2.CAP_PROP_FPS)
+	frame_count = capture.get(cv2.CAP_PROP_FRAME_COUNT)
+	if fps is None or frame_count is None or fps <= 0 or frame_count <= 0:
+		return None
+	return frame_count / fps
+
+# generator of (frame name, time in seconds, BGR numpy array) for each (frame name, time in seconds) in the schedule, read from an already open capture
+# the frame is None where it couldn't be read
+def read_scheduled_frames(capture, schedule):
+	for frame_name, cur_seconds in schedule:
+		capture.set(cv2.CAP_PROP_POS_MSEC, cur_seconds * 1000.0)
+		success, frame = capture.read()
+		yield frame_name, cur_seconds, frame if success else None
+
+# generator of (frame name, time in seconds, BGR numpy array) for each sampled frame in the video
+# seeks forward through the one open capture rather than decoding the full video, so cost scales with number of samples rather than video length
+def iter_sampled_frames(video_path, interval_minutes=4, schedule=None):
+	capture = cv2.VideoCapture(video_path)
+	if not capture.isOpened():
+		raise IOError("Unable to open video " + video_path)
+	try:
+		if schedule is None:
+			schedule = sample_schedule(video_duration(capture), interval_minutes=interval_minutes)
+		for frame_name, cur_seconds, frame in read_scheduled_frames(capture, schedule):
+			if frame is None:
+				# past the end of the video (duration unknown or slightly overestimated), nothing further to sample
+				break
+			yield frame_name, cur_seconds, frame
+	finally:
+		capture.release()
+
+# save the sampled frames from a video as JPEGs in the given folder, returning the number of frames written
+def extract_video_frames(video_path, output_folder, interval_minutes=4):
+	num_written = 0
+	for frame_name, cur_seconds, frame in iter_sampled_frames(video_path, interval_minutes=interval_minutes):
+		if cv2.imwrite(os.path.join(output_folder, frame_name + ".jpg"), frame):
+			num_written = num_written + 1
+		else:
+			print("Problem saving frame " + frame_name + " from " + video_path)
+	return num_written
+
+# for the in memory video QC mode - instead of saving JPEGs, record which video (and sampling interval) the frames should be decoded from
+# video QC then reads the frames straight from the MP4 into memory, and the file also keeps the frames folder from looking empty to the bash wrapper
+frame_source_name = "frame_source.txt"
+
+def write_frame_source(video_path, output_folder, interval_minutes=4):
+	with open(os.path.join(output_folder, frame_source_name), 'w') as f:
+		f.write(os.path.abspath(video_path) + "\n" + str(interval_minutes))
+
+# returns (video path, interval in minutes) from the frame source file in a frames folder, or None if there isn't one
+def read_frame_source(output_folder):
+	try:
+		with open(os.path.join(output_folder, frame_source_name), 'r') as f:
+			lines = f.read().splitlines()
+		return lines[0], int(lines[1])
+	except:
+		return None
+
+if __name__ == '__main__':
+	# Map command line arguments to function arguments.
+	try: # optional third argument for the sampling interval in minutes, default of 4
+		interval_minutes = int(sys.argv[3])
+		if interval_minutes < 1:
+			interval_minutes = 4
+	except:
+		interval_minutes = 4
+	try: # optional fourth argument turns on the in memory mode, where no JPEGs are saved here
+		in_memory = sys.argv[4] == "Y" or sys.argv[4] == "y"
+	except:
+		in_memory = False
+	if in_memory:
+		write_frame_source(sys.argv[1], sys.argv[2], interval_minutes=interval_minutes)
+		sys.exit(0)
+	try:
+		num_written = extract_video_frames(sys.argv[1], sys.argv[2], interval_minutes=interval_minutes)
+		print("Extracted " + str(num_written) + " frames from " + sys.argv[1])
+	except Exception as e:
+		# no frames will be in the folder then, which video QC picks up on and logs
+		print("Frame extraction failed for " + sys.argv[1])
+		print(e)
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+import os
+import cv2
+import math
+import numpy as np
+from video_frame_sampler import sample_point, video_duration, read_scheduled_frames
+
+# adaptive frame sampling for video QC, used in place of the fixed sample schedule when frames are decoded straight from the interview video (the in memory mode)
+# starts from a sparse schedule, then repeatedly adds a frame halfway between any two neighbouring samples whose face detection results disagree,
+# so that long stable interviews need fewer detector calls while stretches where the picture changes are covered more densely
+# samples stay on whole minutes and are named the same way as the fixed schedule's frames, so refinement stops once neighbouring samples are a minute apart
+
+# defaults for the starting interval in minutes, and the fewest and most frames sampled per interview
+default_adaptive_interval = 12
+default_adaptive_min_frames = 5
+default_adaptive_max_frames = 30
+# difference in mean face confidence between neighbouring frames (with the same number of faces) that counts as disagreeing
+confidence_tolerance = 0.1
+
+# whether the detected faces (lists of [x, y, width, height, score]) of two neighbouring frames disagree enough to sample between them
+def faces_disagree(faces_a, faces_b, tolerance=confidence_tolerance):
+	if len(faces_a) != len(faces_b):
+		return True
+	if len(faces_a) == 0:
+		return False
+	return abs(np.mean([x[4] for x in faces_a]) - np.mean([x[4] for x in faces_b])) > tolerance
+
+# minutes into the video for the starting sparse schedule
+# spacing is widened if needed to stay within max_frames, and narrowed (down to 1 minute) so that shorter interviews still get min_frames
+def initial_minutes(duration_seconds, interval_minutes=default_adaptive_interval, min_frames=default_adaptive_min_frames, max_frames=default_adaptive_max_frames):
+	if duration_seconds is None:
+		# length not reported - use the starting interval up to 10 hours, and reading stops at the end of the video
+		return list(range(0, 600, interval_minutes))[:max_frames]
+	num_minutes = int(math.ceil(duration_seconds / 60.0))
+	interval = min(interval_minutes, max(1, num_minutes // min_frames))
+	interval = max(interval, int(math.ceil(num_minutes / float(max_frames))))
+	return [x for x in range(0, num_minutes, interval) if sample_point(x)[1] < duration_seconds]
+
+# sample and run face detection on one interview video adaptively
+# detect takes a list of (frame name, BGR image) and returns an iterable of (frame name, detected faces or None), like detect_faces_batched - it is called once per refinement round
+# returns the list of (frame name, detected faces or None) for all sampled frames in time order
+# with save_folder given, each decoded frame is also saved there as a JPEG for audit
+def adaptive_frame_faces(video_path, detect, interval_minutes=default_adaptive_interval, min_frames=default_adaptive_min_frames, max_frames=default_adaptive_max_frames, save_folder=None):
+	capture = cv2.VideoCapture(video_path)
+	if not capture.isOpened():
+		raise IOError("Unable to open video " + video_path)
+	results = {} # minute into the video -> (frame name, detected faces)
+	attempted = set() # so a frame that can't be read isn't retried every round
+	try:
+		duration_seconds = video_duration(capture)
+		to_sample = initial_minutes(duration_seconds, interval_minutes=interval_minutes, min_frames=min_frames, max_frames=max_frames)
+		while len(to_sample) > 0:
+			attempted.update(to_sample)
+			frames = []
+			frame_minutes = {}
+			for cur_minute, (frame_name, cur_seconds, frame) in zip(to_sample, read_scheduled_frames(capture, [sample_point(x) for x in to_sample])):
+				if frame is None:
+					if duration_seconds is None:
+						break # past the end of the video
+					continue
+				if save_folder is not None:
+					cv2.imwrite(os.path.join(save_folder, frame_name + ".jpg"), frame)
+				frames.append((frame_name, frame))
+				frame_minutes[frame_name] = cur_minute
+			for frame_name, image_results in detect(frames):
+				results[frame_minutes[frame_name]] = (frame_name, image_results)
+
+			# next round - the midpoints between neighbouring samples that disagree, largest gaps first while under the cap
+			# frames where detection failed don't count as disagreeing with their neighbours
+			sampled = sorted(results.keys())
+			candidates = []
+			for minute_a, minute_b in zip(sampled[:-1], sampled[1:]):
+				faces_a = results[minute_a][1]
+				faces_b = results[minute_b][1]
+				midpoint = (minute_a + minute_b) // 2
+				if minute_b - minute_a < 2 or midpoint in attempted or faces_a is None or faces_b is None:
+					continue
+				if faces_disagree(faces_a, faces_b):
+					candidates.append((minute_b - minute_a, midpoint))
+			candidates.sort(key=lambda x: x[0], reverse=True)
+			to_sample = sorted([x[1] for x in candidates[:max(0, max_frames - len(results))]])
+	finally:
+		capture.release()
+	return [results[x] for x in sorted(results.keys())]
+
+# command line handling for the adaptive sampling settings, given the list of (up to) four argument strings - "Y" to turn it on, then the starting interval in minutes, minimum and maximum frames
+# returns None if adaptive sampling is off, otherwise a tuple of the three settings (with defaults for any blank or invalid values)
+def parse_adaptive_args(args):
+	try:
+		if args[0] != "Y" and args[0] != "y":
+			return None
+	except:
+		return None
+	try:
+		interval_minutes = max(int(args[1]), 1)
+	except:
+		interval_minutes = default_adaptive_interval
+	try:
+		min_frames = max(int(args[2]), 1)
+	except:
+		min_frames = default_adaptive_min_frames
+	try:
+		max_frames = max(int(args[3]), min_frames)
+	except:
+		max_frames = max(default_adaptive_max_frames, min_frames)
+	return interval_minutes, min_frames, max_frames
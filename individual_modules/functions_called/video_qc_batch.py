@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+
+# prevent pyfeat from logging an unneccessary warning every time
+import warnings
+warnings.filterwarnings("ignore", category=FutureWarning)
+
+import os
+import sys
+import glob
+import queue
+import shutil
+import resource
+import pandas as pd
+import multiprocessing as mp
+from feat import Detector
+from interview_video_qc import folder_face_stats, record_video_qc
+from study_metadata import get_consent_date
+from video_qc_detection import default_batch_megabytes, parse_scale_args
+from video_qc_adaptive import parse_adaptive_args
+
+# study-wide video QC - finds all new interview frame folders across patients and both interview types, and runs face detection on them using a pool of long lived worker processes
+# each worker loads the PyFeat detector once and then takes interview folders from a shared queue, rather than the detector being reloaded for every patient
+# workers are replaced after max_tasks interviews, or once their memory use goes over their share of the memory budget, to contain any leaks over a long run
+# interview level results are then added to the DPDash QC store per patient here, and a manifest CSV with one row per interview is written for the bash wrapper's error handling
+
+# current resident memory of this process in MB (peak resident memory if /proc isn't available)
+def _current_memory_mb():
+	try:
+		with open("/proc/self/statm", 'r') as f:
+			resident_pages = int(f.read().split()[1])
+		return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024.0 * 1024.0)
+	except:
+		return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+# clear any partial outputs for an interview so the bash wrapper treats it as not processed
+def _clear_partial_outputs(folder_path):
+	shutil.rmtree(os.path.join(folder_path, "PyFeatOutputsTemp"), ignore_errors=True)
+
+# loop run by each worker process - messages sent back are (kind, worker pid, task, payload)
+def _video_qc_worker(task_queue, result_queue, save_frames, batch_size, batch_megabytes, max_dimension, scale, adaptive, hash_distance, max_tasks, max_worker_mb):
+	pid = os.getpid()
+	# ok to use default models for what we are tracking, need None for the others to avoid memory issues!
+	detector = Detector(au_model=None,emotion_model=None)
+	tasks_done = 0
+	while True:
+		task = task_queue.get()
+		if task is None:
+			break
+		result_queue.put(("start", pid, task, None))
+		interview_type, ptID, folder_path = task
+		try:
+			stats = folder_face_stats(folder_path, detector, save_frames=save_frames, batch_size=batch_size, batch_megabytes=batch_megabytes, max_dimension=max_dimension, scale=scale, adaptive=adaptive, hash_distance=hash_distance)
+			if stats is None:
+				payload = ("no_frames", "no frames could be processed", None)
+			else:
+				payload = ("success", "", stats)
+		except Exception as e:
+			_clear_partial_outputs(folder_path)
+			payload = ("failed", str(e), None)
+		result_queue.put(("done", pid, task, payload))
+		tasks_done = tasks_done + 1
+		if tasks_done >= max_tasks or (max_worker_mb is not None and _current_memory_mb() > max_worker_mb):
+			break
+	result_queue.put(("exit", pid, None, None))
+
+# find the interview frame folders in the study that haven't been through video QC yet, as (interview type, patient, folder path)
+# empty folders are left alone, as the bash wrapper clears those out
+def pending_video_folders(data_root, study):
+	processed_root = os.path.join(data_root, "PROTECTED", study, "processed")
+	pending = []
+	for interview_type in ["open", "psychs"]:
+		cur_paths = glob.glob(os.path.join(processed_root, "*", "interviews", interview_type, "video_frames", "*"))
+		for folder_path in sorted(cur_paths):
+			if not os.path.isdir(folder_path) or os.path.isdir(os.path.join(folder_path, "PyFeatOutputs")) or len(os.listdir(folder_path)) == 0:
+				continue
+			ptID = folder_path.split("/")[-5]
+			pending.append((interview_type, ptID, folder_path))
+	return pending
+
+def video_qc_batch(data_root, study, num_workers=1, max_tasks=20, memory_budget_mb=None, save_frames=False, batch_size=1, batch_megabytes=default_batch_megabytes, manifest_path=None,
+				   max_dimension=None, scale=None, adaptive=None, hash_distance=None):
+	pending = pending_video_folders(data_root, study)
+	if len(pending) == 0:
+		print("No new videos to run QC on for study " + study)
+
+	results = {}
+	# patients without a valid consent date can't have their outputs recorded, so mark them crashed without running detection (as the per patient script would exit)
+	to_run = []
+	for task in pending:
+		try:
+			get_consent_date(data_root, study, task[1])
+			to_run.append(task)
+		except:
+			results[task] = ("crashed", "no consent date information in the study metadata CSV", None)
+
+	# the memory budget is split evenly across the workers
+	num_workers = max(1, min(num_workers, len(to_run)))
+	max_worker_mb = memory_budget_mb / float(num_workers) if memory_budget_mb is not None else None
+
+	if len(to_run) > 0:
+		# spawn fresh worker processes rather than forking this one, which is safer with the torch based models
+		ctx = mp.get_context("spawn")
+		task_queue = ctx.Queue()
+		result_queue = ctx.Queue()
+		for task in to_run:
+			task_queue.put(task)
+		worker_args = (task_queue, result_queue, save_frames, batch_size, batch_megabytes, max_dimension, scale, adaptive, hash_distance, max_tasks, max_worker_mb)
+		workers = {}
+		for i in range(num_workers):
+			proc = ctx.Process(target=_video_qc_worker, args=worker_args)
+			proc.start()
+			workers[proc.pid] = proc
+		in_flight = {}
+		num_started = 0
+		num_done = 0
+
+		while num_done < len(to_run):
+			try:
+				kind, pid, task, payload = result_queue.get(timeout=30)
+			except queue.Empty:
+				# check for workers that died without reporting back (e.g. killed for running out of memory)
+				for pid, proc in list(workers.items()):
+					if proc.is_alive():
+						continue
+					proc.join()
+					del workers[pid]
+					# only replace workers that died partway through an interview - one that died before taking any work (e.g. couldn't load the model) would just die again
+					if pid in in_flight:
+						lost_task = in_flight.pop(pid)
+						_clear_partial_outputs(lost_task[2])
+						results[lost_task] = ("failed", "worker process exited unexpectedly (exit code " + str(proc.exitcode) + ")", None)
+						num_done = num_done + 1
+						if num_started < len(to_run):
+							proc = ctx.Process(target=_video_qc_worker, args=worker_args)
+							proc.start()
+							workers[proc.pid] = proc
+				# workers report an interview as started right after taking it from the queue, so if nothing is in progress and the queue is empty
+				# after a full timeout, any interviews never reported as started were lost along with a worker
+				lost_unstarted = len(in_flight) == 0 and num_started < len(to_run) and task_queue.empty()
+				if (len(workers) == 0 or lost_unstarted) and num_done < len(to_run):
+					# nothing left running to pick up the remaining interviews
+					for task in to_run:
+						if task not in results:
+							# the worker's start message may not have made it out before it died, so there could still be partial outputs
+							_clear_partial_outputs(task[2])
+							results[task] = ("failed", "no video QC worker left to process this interview", None)
+					break
+				continue
+
+			if kind == "start":
+				in_flight[pid] = task
+				num_started = num_started + 1
+			elif kind == "done":
+				in_flight.pop(pid, None)
+				results[task] = payload
+				num_done = num_done + 1
+				if payload[0] == "failed":
+					print("Video QC failed for " + task[0] + " " + os.path.basename(task[2]) + " (" + task[1] + "): " + payload[1])
+			elif kind == "exit":
+				workers[pid].join()
+				del workers[pid]
+				# replace the recycled worker if there is still work waiting in the queue
+				if num_started < len(to_run):
+					proc = ctx.Process(target=_video_qc_worker, args=worker_args)
+					proc.start()
+					workers[proc.pid] = proc
+
+		# all done, so shut down the remaining workers
+		for pid in workers:
+			task_queue.put(None)
+		for proc in workers.values():
+			proc.join()
+
+	# now record the successful interviews for each patient, in chronological order
+	patient_groups = sorted(set([(x[0], x[1]) for x in to_run]))
+	for interview_type, ptID in patient_groups:
+		cur_tasks = [x for x in to_run if x[0] == interview_type and x[1] == ptID and results[x][0] == "success"]
+		if len(cur_tasks) == 0:
+			continue
+		try:
+			record_video_qc(interview_type, data_root, study, ptID, [os.path.basename(x[2]) for x in cur_tasks], [results[x][2] for x in cur_tasks])
+		except Exception as e:
+			print("Recording video QC outputs failed for " + interview_type + " " + ptID + ": " + str(e))
+			for task in cur_tasks:
+				results[task] = ("crashed", "problem recording video QC outputs: " + str(e), None)
+
+	manifest = pd.DataFrame([[x[0], x[1], os.path.basename(x[2]), results[x][0], results[x][1]] for x in pending], columns=["interview_type", "patient", "folder", "status", "message"])
+	manifest.sort_values(by=["interview_type", "patient", "folder"], inplace=True)
+	if manifest_path is not None:
+		manifest.to_csv(manifest_path, index=False)
+	return manifest
+
+if __name__ == '__main__':
+	# Map command line arguments to function arguments.
+	try: # worker count is optional, defaulting to 1
+		num_workers = max(int(sys.argv[3]), 1)
+	except:
+		num_workers = 1
+	try: # number of interviews each worker handles before being replaced
+		max_tasks = max(int(sys.argv[4]), 1)
+	except:
+		max_tasks = 20
+	try: # total memory budget for the workers in MB, no limit if not given
+		memory_budget_mb = float(sys.argv[5])
+		if memory_budget_mb <= 0:
+			memory_budget_mb = None
+	except:
+		memory_budget_mb = None
+	try:
+		save_frames = sys.argv[6] == "Y" or sys.argv[6] == "y"
+	except:
+		save_frames = False
+	try:
+		batch_size = max(int(sys.argv[7]), 1)
+	except:
+		batch_size = 1
+	try:
+		batch_megabytes = max(int(sys.argv[8]), 1)
+	except:
+		batch_megabytes = default_batch_megabytes
+	try:
+		manifest_path = sys.argv[9]
+	except:
+		manifest_path = None
+
+	# optional downscaling before face detection - max dimension in pixels, then scale factor
+	max_dimension, scale = parse_scale_args(sys.argv[10:12])
+	# optional adaptive frame sampling for in memory interviews - "Y" to turn on, then starting interval in minutes, minimum and maximum frames per interview
+	adaptive = parse_adaptive_args(sys.argv[12:16])
+	try: # optional near duplicate frame skipping, with the given maximum hash distance
+		hash_distance = max(int(sys.argv[16]), 0)
+	except:
+		hash_distance = None
+
+	video_qc_batch(sys.argv[1], sys.argv[2], num_workers=num_workers, max_tasks=max_tasks, memory_budget_mb=memory_budget_mb, save_frames=save_frames,
+				   batch_size=batch_size, batch_megabytes=batch_megabytes, manifest_path=manifest_path, max_dimension=max_dimension, scale=scale, adaptive=adaptive, hash_distance=hash_distance)
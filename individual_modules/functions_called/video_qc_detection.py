@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+
+import os
+import cv2
+import numpy as np
+import pandas as pd
+
+# face detection helpers for video QC, shared by the per patient and study level video QC scripts
+# frames are grouped into batches of the same image size so the PyFeat face model is called once per batch rather than once per frame,
+# as on CPU only servers the per call overhead dominates for the small number of frames sampled per interview
+# also has the writer and reader for the per interview face detection output file
+
+# default maximum total size of the frames held in one batch, in megabytes
+default_batch_megabytes = 512
+
+# checks that a batched detect_faces call gave one result per input frame, each being a list of faces
+# (depending on PyFeat version, an unbatched result for a single image instead is a list of faces, each a list of numbers)
+def _is_batched_result(batch_results, num_frames):
+	if not isinstance(batch_results, (list, tuple)) or len(batch_results) != num_frames:
+		return False
+	for frame_results in batch_results:
+		if not isinstance(frame_results, (list, tuple)):
+			return False
+		for face in frame_results:
+			if np.isscalar(face):
+				return False
+	return True
+
+# run the detector on a batch of same size frames, returning a list with the detected faces for each frame (None where detection failed)
+def _detect_batch(detector, batch_images):
+	if len(batch_images) > 1:
+		try:
+			batch_results = detector.detect_faces(np.stack(batch_images))
+			if _is_batched_result(batch_results, len(batch_images)):
+				return [list(x) for x in batch_results]
+		except:
+			pass # fall back on one frame at a time below, so any bad frame is isolated
+	frame_results = []
+	for cur_image in batch_images:
+		try:
+			frame_results.append(detector.detect_faces(cur_image))
+		except:
+			frame_results.append(None)
+	return frame_results
+
+# generator of (frame name, detected faces) given an iterable of (frame name, BGR image), in the same order as the input
+# detected faces is the list of [x, y, width, height, score] per face returned by PyFeat, or None if detection failed for that frame (e.g. image couldn't be loaded)
+# consecutive frames with the same dimensions are batched, up to batch_size frames and batch_megabytes of image data per batch
+def detect_faces_batched(detector, frames, batch_size=1, batch_megabytes=default_batch_megabytes):
+	max_batch_bytes = batch_megabytes * 1024 * 1024
+	batch_names = []
+	batch_images = []
+	batch_bytes = 0
+	for frame_name, cur_image in frames:
+		if cur_image is None:
+			# flush what is pending first so outputs stay in order
+			if len(batch_images) > 0:
+				for name, results in zip(batch_names, _detect_batch(detector, batch_images)):
+					yield name, results
+				batch_names, batch_images, batch_bytes = [], [], 0
+			yield frame_name, None
+			continue
+		if len(batch_images) > 0 and (cur_image.shape != batch_images[0].shape or len(batch_images) >= batch_size or batch_bytes + cur_image.nbytes > max_batch_bytes):
+			for name, results in zip(batch_names, _detect_batch(detector, batch_images)):
+				yield name, results
+			batch_names, batch_images, batch_bytes = [], [], 0
+		batch_names.append(frame_name)
+		batch_images.append(cur_image)
+		batch_bytes = batch_bytes + cur_image.nbytes
+	if len(batch_images) > 0:
+		for name, results in zip(batch_names, _detect_batch(detector, batch_images)):
+			yield name, results
+
+# optional downscaling of frames before face detection, as only face counts, confidence and area are reported for QC
+# scale factor to apply to an image of the given shape - the smaller of the fixed scale and the factor needed to fit the longest side within max_dimension, and never above 1
+def detection_scale_factor(shape, max_dimension=None, scale=None):
+	factor = 1.0
+	if scale is not None and scale > 0:
+		factor = min(factor, scale)
+	if max_dimension is not None and max_dimension > 0:
+		factor = min(factor, float(max_dimension) / max(shape[0], shape[1]))
+	return factor
+
+# generator that downscales each (frame name, image) pair as needed, recording the factor used for each frame in the factors dict
+def scaled_frames(frames, factors, max_dimension=None, scale=None):
+	for frame_name, cur_image in frames:
+		if cur_image is not None:
+			factor = detection_scale_factor(cur_image.shape, max_dimension=max_dimension, scale=scale)
+			if factor < 1.0:
+				new_size = (max(1, int(round(cur_image.shape[1] * factor))), max(1, int(round(cur_image.shape[0] * factor))))
+				cur_image = cv2.resize(cur_image, new_size, interpolation=cv2.INTER_AREA)
+				factors[frame_name] = factor
+		yield frame_name, cur_image
+
+# command line handling for the two downscaling settings, given the list of (up to) two argument strings - max dimension in pixels, then scale factor
+# blank or invalid values turn that setting off, as does a scale of 1 or more
+def parse_scale_args(args):
+	try:
+		max_dimension = int(args[0])
+		if max_dimension <= 0:
+			max_dimension = None
+	except:
+		max_dimension = None
+	try:
+		scale = float(args[1])
+		if scale <= 0 or scale >= 1:
+			scale = None
+	except:
+		scale = None
+	return max_dimension, scale
+
+# map detected face boxes from a downscaled frame back to original pixel units, so face areas keep their meaning
+def rescale_faces(image_results, factor):
+	return [[x[0] / factor, x[1] / factor, x[2] / factor, x[3] / factor] + list(x[4:]) for x in image_results]
+
+# detect_faces_batched with the optional downscaling applied - frames are downscaled before detection as configured, and face boxes mapped back to original pixels after
+def detect_faces_scaled(detector, frames, batch_size=1, batch_megabytes=default_batch_megabytes, max_dimension=None, scale=None):
+	scale_factors = {}
+	if max_dimension is not None or scale is not None:
+		frames = scaled_frames(frames, scale_factors, max_dimension=max_dimension, scale=scale)
+	for frame_name, image_results in detect_faces_batched(detector, frames, batch_size=batch_size, batch_megabytes=batch_megabytes):
+		if image_results is not None and frame_name in scale_factors:
+			image_results = rescale_faces(image_results, scale_factors[frame_name])
+		yield frame_name, image_results
+
+# near duplicate frame skipping - recordings often show the same static gallery view for long stretches, where running the detector again would not change the result
+# frames are compared by a 64 bit difference hash (whether each cell of an 8x9 grid of the grayscale image is brighter than its neighbour), which is robust to compression noise
+def difference_hash(image):
+	gray = image.astype(np.float32)
+	if gray.ndim == 3:
+		gray = gray.mean(axis=2)
+	# average over an 8 row by 9 column grid of blocks
+	row_edges = np.linspace(0, gray.shape[0], 9).astype(int)[:-1]
+	col_edges = np.linspace(0, gray.shape[1], 10).astype(int)[:-1]
+	block_sums = np.add.reduceat(np.add.reduceat(gray, row_edges, axis=0), col_edges, axis=1)
+	block_counts = np.outer(np.diff(np.append(row_edges, gray.shape[0])), np.diff(np.append(col_edges, gray.shape[1])))
+	blocks = block_sums / np.maximum(block_counts, 1)
+	return (blocks[:, 1:] > blocks[:, :-1]).flatten()
+
+# generator of (frame name, detected faces) given an iterable of (frame name, BGR image), in the same order as the input, where detect is the function running detection on the frames (like detect_faces_scaled)
+# frames whose difference hash is within max_distance bits of a frame already sent for detection reuse that frame's results rather than being run through the detector again
+# overall brightness must also be within max_brightness_difference, as the hash alone can't tell apart flat frames (e.g. a black screen vs a plain grey one)
+# the frame reused from is recorded for each such frame in the reused dict
+def detect_faces_deduplicated(detect, frames, reused, max_distance=4, max_brightness_difference=10):
+	reference_names = []
+	reference_hashes = []
+	reference_brightness = []
+	order = [] # (frame name, frame it reuses results from or None) for frames read so far that are still waiting to be output
+	results = {}
+
+	def unique_frames():
+		for frame_name, cur_image in frames:
+			if cur_image is not None and cur_image.size > 0:
+				cur_hash = difference_hash(cur_image)
+				cur_brightness = float(cur_image.mean())
+				if len(reference_hashes) > 0:
+					distances = np.count_nonzero(np.array(reference_hashes) != cur_hash, axis=1)
+					# rule out references with too different a brightness
+					distances[np.abs(np.array(reference_brightness) - cur_brightness) > max_brightness_difference] = cur_hash.size + 1
+					closest = int(np.argmin(distances))
+					if distances[closest] <= max_distance:
+						order.append((frame_name, reference_names[closest]))
+						continue
+				reference_names.append(frame_name)
+				reference_hashes.append(cur_hash)
+				reference_brightness.append(cur_brightness)
+			order.append((frame_name, None))
+			yield frame_name, cur_image
+
+	# output whatever is at the front of the line once its results are ready, so the original order is kept
+	def ready_outputs():
+		while len(order) > 0:
+			frame_name, reference_name = order[0]
+			source_name = frame_name if reference_name is None else reference_name
+			if source_name not in results:
+				return
+			order.pop(0)
+			if reference_name is not None:
+				reused[frame_name] = reference_name
+			yield frame_name, results[source_name]
+
+	for frame_name, image_results in detect(unique_frames()):
+		results[frame_name] = image_results
+		for output in ready_outputs():
+			yield output
+	for output in ready_outputs():
+		yield output
+
+# per interview face detection outputs - one CSV for all of an interview's frames, with a frame column identifying which sampled frame each detected face is from
+# saved once at the end of the interview under its PyFeatOutputs folder, rather than as a separate tiny CSV per frame
+# frames where no faces were detected get a single row with the face columns left blank, so that every processed frame is still represented
+# frames that reused the detection results of an earlier near duplicate frame give that frame's name in the reused_from column (blank for frames run through the detector)
+face_detections_name = "face_detections.csv"
+face_columns = ["FaceRectX","FaceRectY","FaceRectWidth","FaceRectHeight","FaceScore","FaceNumber"]
+
+# frame_faces is a list of (frame name, DataFrame with face_columns and one row per detected face), in processing order
+# reused is a dict from frame name to the frame whose results it reused, for any that did (see detect_faces_deduplicated)
+def save_face_detections(outputs_folder, frame_faces, reused=None):
+	if reused is None:
+		reused = {}
+	frame_col = []
+	reused_col = []
+	face_values = {x: [] for x in face_columns}
+	for frame_name, faces_df in frame_faces:
+		num_rows = max(faces_df.shape[0], 1)
+		frame_col.extend([frame_name for x in range(num_rows)])
+		reused_col.extend([reused.get(frame_name, "") for x in range(num_rows)])
+		if faces_df.shape[0] == 0:
+			for col in face_columns:
+				face_values[col].append(np.nan)
+			continue
+		for col in face_columns:
+			face_values[col].extend(faces_df[col].tolist())
+	detections = pd.DataFrame()
+	detections["frame"] = frame_col
+	for col in face_columns:
+		detections[col] = face_values[col]
+	detections["FaceNumber"] = detections["FaceNumber"].astype("Int64") # keep face IDs as integers even with blanks for the no face frames
+	detections["reused_from"] = reused_col
+	detections.to_csv(os.path.join(outputs_folder, face_detections_name), index=False)
+
+# reader for the face detection outputs of an interview, given its PyFeatOutputs (or PyFeatOutputsTemp) folder
+# returns a dict from frame name to a DataFrame of that frame's detected faces (empty if none), in the order the frames were processed
+# (which frames reused another frame's results can be read from the reused_from column of the CSV directly)
+# also reads the older layout of one CSV per frame, for interviews processed before the outputs were consolidated
+def load_face_detections(outputs_folder):
+	frame_faces = {}
+	consolidated_path = os.path.join(outputs_folder, face_detections_name)
+	if os.path.exists(consolidated_path):
+		detections = pd.read_csv(consolidated_path)
+		detections["FaceNumber"] = detections["FaceNumber"].astype("Int64")
+		for frame_name, frame_df in detections.groupby("frame", sort=False):
+			frame_faces[str(frame_name)] = frame_df[frame_df["FaceNumber"].notna()][face_columns].reset_index(drop=True)
+		return frame_faces
+	for file in sorted(os.listdir(outputs_folder)):
+		if file.endswith(".csv"):
+			frame_faces[file.split(".")[0]] = pd.read_csv(os.path.join(outputs_folder, file))
+	return frame_faces
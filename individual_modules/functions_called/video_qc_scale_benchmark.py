@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+
+# prevent pyfeat from logging an unneccessary warning every time
+import warnings
+warnings.filterwarnings("ignore", category=FutureWarning)
+
+import os
+import sys
+import glob
+import time
+import random
+import numpy as np
+import pandas as pd
+from feat import Detector
+from interview_video_qc import interview_frames
+from video_qc_detection import detect_faces_batched, scaled_frames, rescale_faces, parse_scale_args
+
+# benchmark for the downscaled face detection mode of video QC - not part of the pipeline, meant to be run by hand when choosing video_qc_max_dimension/video_qc_scale for a server
+# runs the detector on a random sample of a study's extracted interviews at full resolution and then with the given downscaling,
+# reporting detector time per frame for each along with how well the downscaled results agree with full resolution on the stats reported by video QC
+def benchmark_scaled_detection(data_root, study, num_interviews=5, max_dimension=None, scale=None, output_path=None):
+	folder_paths = [x for x in glob.glob(os.path.join(data_root, "PROTECTED", study, "processed", "*", "interviews", "*", "video_frames", "*")) if os.path.isdir(x)]
+	folder_paths.sort()
+	random.Random(0).shuffle(folder_paths) # fixed seed so repeated runs with different settings use the same sample
+	if len(folder_paths) == 0:
+		print("No extracted interview frames found for study " + study)
+		return None
+
+	# ok to use default models for what we are tracking, need None for the others to avoid memory issues!
+	detector = Detector(au_model=None,emotion_model=None)
+
+	rows = []
+	for folder_path in folder_paths:
+		if len(rows) >= num_interviews:
+			break
+		# load all the frames first, so frame reading is not counted in the detector timing
+		frames = [x for x in interview_frames(folder_path) if x[1] is not None]
+		if len(frames) == 0:
+			continue
+
+		start_time = time.time()
+		full_results = dict(detect_faces_batched(detector, frames))
+		full_seconds = time.time() - start_time
+
+		# downscaling time is counted as part of the scaled mode
+		scale_factors = {}
+		start_time = time.time()
+		scaled_results = dict(detect_faces_batched(detector, scaled_frames(frames, scale_factors, max_dimension=max_dimension, scale=scale)))
+		scaled_seconds = time.time() - start_time
+
+		count_matches = 0
+		count_diffs = []
+		conf_diffs = []
+		area_ratios = []
+		num_compared = 0
+		for frame_name, cur_image in frames:
+			full_faces = full_results.get(frame_name)
+			scaled_faces = scaled_results.get(frame_name)
+			if full_faces is None or scaled_faces is None:
+				continue
+			if frame_name in scale_factors:
+				scaled_faces = rescale_faces(scaled_faces, scale_factors[frame_name])
+			num_compared = num_compared + 1
+			count_diffs.append(abs(len(full_faces) - len(scaled_faces)))
+			if len(full_faces) == len(scaled_faces):
+				count_matches = count_matches + 1
+			if len(full_faces) > 0 and len(scaled_faces) > 0:
+				conf_diffs.append(abs(np.mean([x[4] for x in full_faces]) - np.mean([x[4] for x in scaled_faces])))
+				area_ratios.append(np.mean([float(x[2]) * x[3] for x in scaled_faces]) / np.mean([float(x[2]) * x[3] for x in full_faces]))
+
+		rows.append([os.path.relpath(folder_path, os.path.join(data_root, "PROTECTED", study, "processed")), len(frames), num_compared,
+					 frames[0][1].shape[1], frames[0][1].shape[0], round(full_seconds / len(frames), 4), round(scaled_seconds / len(frames), 4),
+					 round(full_seconds / scaled_seconds, 2) if scaled_seconds > 0 else np.nan,
+					 round(count_matches / float(num_compared), 3) if num_compared > 0 else np.nan,
+					 round(np.mean(count_diffs), 3) if len(count_diffs) > 0 else np.nan,
+					 round(np.mean(conf_diffs), 4) if len(conf_diffs) > 0 else np.nan,
+					 round(np.median(area_ratios), 3) if len(area_ratios) > 0 else np.nan])
+
+	results = pd.DataFrame(rows, columns=["interview", "num_frames", "num_frames_compared", "frame_width", "frame_height",
+										  "full_seconds_per_frame", "scaled_seconds_per_frame", "speedup",
+										  "face_count_agreement", "mean_face_count_difference", "mean_confidence_difference", "median_face_area_ratio"])
+	pd.set_option("display.width", 250)
+	print(results.to_string(index=False))
+	if results.shape[0] > 0:
+		total_frames = results["num_frames"].sum()
+		total_full = (results["full_seconds_per_frame"] * results["num_frames"]).sum()
+		total_scaled = (results["scaled_seconds_per_frame"] * results["num_frames"]).sum()
+		print("Overall: " + str(total_frames) + " frames, " + str(round(total_full / total_frames, 4)) + " s/frame at full resolution vs " + str(round(total_scaled / total_frames, 4)) + " s/frame scaled"
+			  + " (max dimension " + str(max_dimension) + ", scale " + str(scale) + ")")
+		print("Face count agreement: " + str(round((results["face_count_agreement"] * results["num_frames_compared"]).sum() / results["num_frames_compared"].sum(), 3)))
+	if output_path is not None:
+		results.to_csv(output_path, index=False)
+	return results
+
+if __name__ == '__main__':
+	# Map command line arguments to function arguments.
+	try: # number of interviews to sample, default of 5
+		num_interviews = max(int(sys.argv[3]), 1)
+	except:
+		num_interviews = 5
+	# downscaling settings to compare against full resolution - max dimension in pixels, then scale factor
+	max_dimension, scale = parse_scale_args(sys.argv[4:6])
+	if max_dimension is None and scale is None:
+		max_dimension = 640 # default comparison if no downscaling was given
+	try:
+		output_path = sys.argv[6]
+	except:
+		output_path = None
+	benchmark_scaled_detection(sys.argv[1], sys.argv[2], num_interviews=num_interviews, max_dimension=max_dimension, scale=scale, output_path=output_path)
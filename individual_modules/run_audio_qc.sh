@@ -16,6 +16,13 @@ else
 	func_root="$repo_root"/individual_modules/functions_called
 fi
 
+# run sliding window QC on all new files across the study first, using a pool of worker processes (audio_qc_workers setting, default 1)
+# this writes a manifest of which files succeeded or failed, which is used in the per patient loops below
+# if the batch step crashes outright there will be no manifest, in which case every new file is treated as failed (same as if each per file call had crashed)
+qc_manifest="$data_root"/PROTECTED/"$study"/audio_qc_batch_manifest.csv
+rm -f "$qc_manifest" # clear out the manifest from any previous run
+python "$func_root"/audio_qc_batch.py "$data_root" "$study" "$audio_qc_workers" "$audio_qc_streaming" "$qc_manifest"
+
 # move to study folder to loop over patients - python function defined per patient
 cd "$data_root"/PROTECTED/"$study"/processed
 # will do one loop for open and another for psychs
@@ -36,20 +43,15 @@ for p in *; do
 
 	echo "On patient ${p}"
 
-	# run sliding window QC script for this patient's new files first
-	# setting up output folder first, then loop through files (this function runs per individual file)
-	if [[ ! -d ../sliding_window_audio_qc ]]; then
-		mkdir ../sliding_window_audio_qc
-	fi
-	# make a folder for the current files for now too as a temporary holding - so easy to remove if a crash occurs for a particular patient!
-	mkdir ../sliding_window_audio_qc/temp
+	# sliding window QC for this patient's new files was already run by the batch step above
+	# outputs are in a temporary holding folder ../sliding_window_audio_qc/temp - so easy to remove if a crash occurs for a particular patient!
+	# (outputs still go in PROTECTED for now as at this stage they still contain dates/times)
+	# whole file stats were saved from the same decode too, so that the summary QC step below does not need to read the audio again
 	for file in *.wav; do
 		name=$(echo "$file" | awk -F '.wav' '{print $1}')
-		# outputs still go in PROTECTED for now as at this stage they still contain dates/times
-		python "$func_root"/sliding_audio_qc_func.py "$file" ../sliding_window_audio_qc/temp/"$name".csv
 
-		# check for error with any of the runs of the sliding audio function first, remove the corresponding temp audio file and log issue if so
-		if [ $? = 1 ]; then 
+		# check the manifest for an error with the sliding audio function for this file, remove the corresponding temp audio file and log issue if so
+		if [[ ! -e $qc_manifest ]] || grep -q "^open,${p},${file},failed" "$qc_manifest"; then 
 			echo "Sliding audio QC failed for open ${file} - skipping for now, please revisit"
 
 			# if calling from pipeline make a note it crashed!
@@ -92,7 +94,7 @@ for p in *; do
 	fi
 	
 	# finally run main audio QC script on this patient
-	python "$func_root"/interview_audio_qc.py "open" "$data_root" "$study" "$p"
+	python "$func_root"/interview_audio_qc.py "open" "$data_root" "$study" "$p" "$audio_qc_streaming"
 
 	# add similar handling for case where audio QC script failed
 	if [ $? = 1 ]; then 
@@ -146,20 +148,15 @@ for p in *; do
 
 	echo "On patient ${p}"
 
-	# run sliding window QC script for this patient's new files first
-	# setting up output folder first, then loop through files (this function runs per individual file)
-	if [[ ! -d ../sliding_window_audio_qc ]]; then
-		mkdir ../sliding_window_audio_qc
-	fi
-	# make a folder for the current files for now too as a temporary holding - so easy to remove if a crash occurs for a particular patient!
-	mkdir ../sliding_window_audio_qc/temp
+	# sliding window QC for this patient's new files was already run by the batch step above
+	# outputs are in a temporary holding folder ../sliding_window_audio_qc/temp - so easy to remove if a crash occurs for a particular patient!
+	# (outputs still go in PROTECTED for now as at this stage they still contain dates/times)
+	# whole file stats were saved from the same decode too, so that the summary QC step below does not need to read the audio again
 	for file in *.wav; do
 		name=$(echo "$file" | awk -F '.wav' '{print $1}')
-		# outputs still go in PROTECTED for now as at this stage they still contain dates/times
-		python "$func_root"/sliding_audio_qc_func.py "$file" ../sliding_window_audio_qc/temp/"$name".csv
 
-		# check for error with any of the runs of the sliding audio function first, remove the corresponding temp audio file and log issue if so
-		if [ $? = 1 ]; then 
+		# check the manifest for an error with the sliding audio function for this file, remove the corresponding temp audio file and log issue if so
+		if [[ ! -e $qc_manifest ]] || grep -q "^psychs,${p},${file},failed" "$qc_manifest"; then 
 			echo "Sliding audio QC failed for psychs ${file} - skipping for now, please revisit"
 
 			# if calling from pipeline make a note it crashed!
@@ -202,7 +199,7 @@ for p in *; do
 	fi
 	
 	# finally run main audio QC script on this patient
-	python "$func_root"/interview_audio_qc.py "psychs" "$data_root" "$study" "$p"
+	python "$func_root"/interview_audio_qc.py "psychs" "$data_root" "$study" "$p" "$audio_qc_streaming"
 
 	# add similar handling for case where audio QC script failed
 	if [ $? = 1 ]; then 
@@ -237,4 +234,11 @@ for p in *; do
 
 	# back out of folder before continuing to next patient
 	cd "$data_root"/PROTECTED/"$study"/processed
-done
\ No newline at end of file
+done
+
+# now that all patients are done, write the new QC rows out to the DPDash CSVs in one pass (one rewrite per patient and interview type)
+# if compaction is turned off in the config, the rows stay in the store until the summary checks step materializes them
+if [[ -z "${dpdash_qc_compaction}" || "${dpdash_qc_compaction}" = "Y" || "${dpdash_qc_compaction}" = "y" ]]; then
+	echo "Updating audio QC DPDash CSVs"
+	python "$func_root"/dpdash_qc_store.py "$data_root" "$study" "interviewMonoAudioQC"
+fi
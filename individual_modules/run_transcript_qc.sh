@@ -68,4 +68,10 @@ for p in *; do
 
 	# back out of folder before continuing to next patient
 	cd "$data_root"/GENERAL/"$study"/processed
-done
\ No newline at end of file
+done
+
+# now that all patients are done, write the QC rows out to the DPDash CSVs in one pass
+if [[ -z "${dpdash_qc_compaction}" || "${dpdash_qc_compaction}" = "Y" || "${dpdash_qc_compaction}" = "y" ]]; then
+	echo "Updating transcript QC DPDash CSVs"
+	python "$func_root"/dpdash_qc_store.py "$data_root" "$study" "interviewRedactedTranscriptQC"
+fi
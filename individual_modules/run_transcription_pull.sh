@@ -27,7 +27,7 @@ if [ $pipeline = "Y" ]; then
 	echo "" >> "$repo_root"/transcript_lab_email_body.txt # add blank line after main header. no need to add another below because those are automatically added before each patient header
 
 	# give some additional context for what will be inside this email
-	echo "Each newly pulled interview transcript and each transcript still being waited on are listed below, split by patient ID. Pulled transcripts that were sent for site review are denoted in this list. If warnings were encountered during the process of pulling an available transcript, they will be listed under the corresponding patient section." >> "$repo_root"/transcript_lab_email_body.txt
+	echo "Each newly pulled interview transcript and each transcript still being waited on are listed below, split by patient ID. Pulled transcripts that were sent for site review are denoted in this list. If warnings were encountered during the process of pulling an available transcript, they will be listed under the corresponding patient section. Any problems cleaning up the TranscribeMe server afterwards are noted at the top of the pull details, before the patient sections." >> "$repo_root"/transcript_lab_email_body.txt
 	echo "Additionally, any transcript files newly returned from this site's manual redaction review process will be listed at the end of this email. If any of the final redacted transcripts appear to require manual review, a warning will be appended below that." >> "$repo_root"/transcript_lab_email_body.txt
 	echo "" >> "$repo_root"/transcript_lab_email_body.txt
 
@@ -57,7 +57,7 @@ if [ $pipeline = "Y" ]; then
 	trans_updates=0 # variable will track if there are any updates across this study - will flip to 1 if get any, and regardless will export this at the end
 fi
 
-# now start going through patients for the download - do open and psychs separately
+# now start going through patients for the download - first make sure the folders for open and psychs are set up
 cd "$data_root"/PROTECTED/"$study"/processed
 for p in *; do # loop over all patients in the specified study folder on PHOENIX
 	if [[ ! -d ${p}/interviews ]]; then
@@ -101,14 +101,28 @@ for p in *; do # loop over all patients in the specified study folder on PHOENIX
 		cd ..
 	fi
 
+	# back out of pt folder when done
+	cd "$data_root"/PROTECTED/"$study"/processed
+done
+
+# this script will go through the pending_audio folders for all patients in the study, check for corresponding named outputs on the transcribeme server, pulling them if available
+# the server output folder is listed once to see which transcripts are ready, and everything is done over one connection
+# it will also do file management on the server, update the pending_audio folders accordingly
+# (transcribeme_host and transcribeme_port only need to be set to point the pull at another server, like the local stand-in used for testing)
+# behaves slightly differently whether this is called individually or via pipeline, because when called via pipeline have email alert related work to do
+python "$func_root"/interview_transcribeme_sftp_pull.py "$data_root" "$study" "$transcribeme_username" "$transcribeme_password" "$transcription_language" "$pipeline" "$repo_root"/transcript_lab_email_body.txt "$transcribeme_host" "$transcribeme_port"
+
+# then go back through patients to handle the pulled transcripts
+cd "$data_root"/PROTECTED/"$study"/processed
+for p in *; do # loop over all patients in the specified study folder on PHOENIX
+	if [[ ! -d ${p}/interviews ]]; then
+		continue
+	fi
+	cd "$p"/interviews
+
 	if [[ -d open ]]; then
 		cd open
 
-		# this script will go through the pending_audio folder for this patient, check for corresponding named outputs on the transcribeme server, pulling them if available
-		# it will also do file management on the server, update the pending_audio folder accordingly
-		# behaves slightly differently whether this is called individually or via pipeline, because when called via pipeline have email alert related work to do
-		python "$func_root"/interview_transcribeme_sftp_pull.py "open" "$data_root" "$study" "$p" "$transcribeme_username" "$transcribeme_password" "$transcription_language" "$pipeline" "$repo_root"/transcript_lab_email_body.txt
-
 		# now add new info about this patient to email alert body (if this is part of pipeline and there was pending audio)
 		if [[ $pipeline = "Y" && -d pending_audio && ! -z "$(ls -A pending_audio)" ]]; then
 			# if reach this point there is something to put in the email!
@@ -177,8 +191,6 @@ for p in *; do # loop over all patients in the specified study folder on PHOENIX
 	if [[ -d psychs ]]; then 
 		cd psychs
 
-		python "$func_root"/interview_transcribeme_sftp_pull.py "psychs" "$data_root" "$study" "$p" "$transcribeme_username" "$transcribeme_password" "$transcription_language" "$pipeline" "$repo_root"/transcript_lab_email_body.txt
-		
 		if [[ $pipeline = "Y" && -d pending_audio && ! -z "$(ls -A pending_audio)" ]]; then
 			# if reach this point there is something to put in the email!
 			trans_updates=1
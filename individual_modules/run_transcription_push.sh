@@ -41,80 +41,47 @@ if [ $auto_send_limit_bool = "Y" ] || [ $auto_send_limit_bool = "y" ]; then
 	fi
 fi
 
-# now start going through patients for the upload - do open and psychs separately
-echo "Uploading open interviews to TranscribeMe"
+# now start going through patients for the upload - first set up the folders for open and psychs for each patient
 cd "$data_root"/PROTECTED/"$study"/processed
 for p in *; do # loop over all patients in the specified study folder
-	# first check that it is truly a patient ID that has open interview audio data to send
-	if [[ ! -d $p/interviews/open/audio_to_send ]]; then # check for to_send folder
-		continue
-	fi
-	cd "$p"/interviews/open
-
-	# create a folder of audios that have been sent to TranscribeMe, and are waiting on result
-	# (this folder will only be made for new patient/study, otherwise it will just sit empty when no pending transcripts)
-	if [[ ! -d pending_audio ]]; then
-		mkdir pending_audio
-	fi
-	# make this folder before the check that to_send is empty, that way a new participant that has had some audios processed will still appear in email alerts
-
-	if [ -z "$(ls -A audio_to_send)" ]; then # also check that to_send isn't empty
-		rm -rf audio_to_send # if it is empty, clear it out!
-		cd "$data_root"/PROTECTED/"$study"/processed # back out of pt folder before skipping
-		continue
-	fi
-
-	# this script will go through the files in to_send and send them to transcribeme, moving them to pending_audio if push was successful
-	# behaves slightly differently whether this is called individually or via pipeline, because when called via pipeline have email alert related work to do
-	python "$func_root"/interview_transcribeme_sftp_push.py "open" "$data_root" "$study" "$p" "$transcribeme_username" "$transcribeme_password" "$transcription_language" "$pipeline"
+	for interview_type in open psychs; do
+		# first check that it is truly a patient ID that has interview audio data to send
+		if [[ ! -d $p/interviews/$interview_type/audio_to_send ]]; then # check for to_send folder
+			continue
+		fi
 
-	# check if to_send is empty now - if so delete it, if not print an error message
-	if [ -z "$(ls -A audio_to_send)" ]; then
-   		rm -rf audio_to_send
-	else
-		echo ""
-   		echo "Warning: some interviews meant to be pushed to TranscribeMe failed to upload. Check ${data_root}/PROTECTED/${study}/processed/${p}/interviews/open/audio_to_send for more info."
-   		echo ""
-	fi
+		# create a folder of audios that have been sent to TranscribeMe, and are waiting on result
+		# (this folder will only be made for new patient/study, otherwise it will just sit empty when no pending transcripts)
+		if [[ ! -d $p/interviews/$interview_type/pending_audio ]]; then
+			mkdir "$p"/interviews/"$interview_type"/pending_audio
+		fi
+		# make this folder before the check that to_send is empty, that way a new participant that has had some audios processed will still appear in email alerts
 
-	# back out of pt folder when done
-	cd "$data_root"/PROTECTED/"$study"/processed
+		if [ -z "$(ls -A "$p"/interviews/"$interview_type"/audio_to_send)" ]; then # also check that to_send isn't empty
+			rm -rf "$p"/interviews/"$interview_type"/audio_to_send # if it is empty, clear it out!
+		fi
+	done
 done
 
-echo "Uploading psychs interviews to TranscribeMe"
-for p in *; do # loop over all patients in the specified study folder
-	# first check that it is truly a patient ID that has psychs interview audio data to send
-	if [[ ! -d $p/interviews/psychs/audio_to_send ]]; then # check for to_send folder
-		continue
-	fi
-	cd "$p"/interviews/psychs
+# this script will go through the files in to_send for every patient and send them to transcribeme (open then psychs), moving them to pending_audio if push was successful
+# all uploads for the study share the connection(s) to the TranscribeMe server, with transcribeme_upload_streams files sent at once (default 1) and their combined rate capped by transcribeme_upload_limit MB/s if set
+# (transcribeme_host and transcribeme_port only need to be set to point the upload at another server, like the local stand-in used for testing)
+# behaves slightly differently whether this is called individually or via pipeline, because when called via pipeline have email alert related work to do
+python "$func_root"/interview_transcribeme_sftp_push.py "$data_root" "$study" "$transcribeme_username" "$transcribeme_password" "$transcription_language" "$pipeline" "$transcribeme_upload_streams" "$transcribeme_upload_limit" "$transcribeme_host" "$transcribeme_port"
 
-	# create a folder of audios that have been sent to TranscribeMe, and are waiting on result
-	# (this folder will only be made for new patient/study, otherwise it will just sit empty when no pending transcripts)
-	if [[ ! -d pending_audio ]]; then
-		mkdir pending_audio
-	fi
-	# make this folder before the check that to_send is empty, that way a new participant that has had some audios processed will still appear in email alerts
-
-	if [ -z "$(ls -A audio_to_send)" ]; then # also check that to_send isn't empty
-		rm -rf audio_to_send # if it is empty, clear it out!
-		cd "$data_root"/PROTECTED/"$study"/processed # back out of pt folder before skipping
-		continue
-	fi
-
-	# this script will go through the files in to_send and send them to transcribeme, moving them to pending_audio if push was successful
-	# behaves slightly differently whether this is called individually or via pipeline, because when called via pipeline have email alert related work to do
-	python "$func_root"/interview_transcribeme_sftp_push.py "psychs" "$data_root" "$study" "$p" "$transcribeme_username" "$transcribeme_password" "$transcription_language" "$pipeline"
-
-	# check if to_send is empty now - if so delete it, if not print an error message
-	if [ -z "$(ls -A audio_to_send)" ]; then
-   		rm -rf audio_to_send
-	else
-		echo ""
-   		echo "Warning: some interviews meant to be pushed to TranscribeMe failed to upload. Check ${data_root}/PROTECTED/${study}/processed/${p}/interviews/psychs/audio_to_send for more info."
-   		echo ""
-	fi
-
-	# back out of pt folder when done
-	cd "$data_root"/PROTECTED/"$study"/processed
-done
\ No newline at end of file
+# check if each to_send is empty now - if so delete it, if not print an error message
+cd "$data_root"/PROTECTED/"$study"/processed
+for interview_type in open psychs; do
+	for p in *; do
+		if [[ ! -d $p/interviews/$interview_type/audio_to_send ]]; then
+			continue
+		fi
+		if [ -z "$(ls -A "$p"/interviews/"$interview_type"/audio_to_send)" ]; then
+			rm -rf "$p"/interviews/"$interview_type"/audio_to_send
+		else
+			echo ""
+			echo "Warning: some interviews meant to be pushed to TranscribeMe failed to upload. Check ${data_root}/PROTECTED/${study}/processed/${p}/interviews/${interview_type}/audio_to_send for more info."
+			echo ""
+		fi
+	done
+done
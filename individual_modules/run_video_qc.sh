@@ -16,8 +16,17 @@ else
 	func_root="$repo_root"/individual_modules/functions_called
 fi
 
-# move to study folder to loop over patients - python function defined per patient
+# move to study folder to loop over patients
 cd "$data_root"/PROTECTED/"$study"/processed
+
+# run face detection on all new interviews across the study at once, using a pool of worker processes that each load the face detection model only once
+# (any empty extracted frames folders are skipped there, and cleared out per patient below)
+# also updates the DPDash QC store for every patient with new results
+# results for each interview are logged to a manifest, which is then used for the error handling per patient below
+qc_manifest="$data_root"/PROTECTED/"$study"/video_qc_batch_manifest.csv
+rm -f "$qc_manifest" # clear out the manifest from any previous run
+python "$func_root"/video_qc_batch.py "$data_root" "$study" "$video_qc_workers" "$video_qc_worker_tasks" "$video_qc_memory_mb" "$video_audit_frames" "$video_qc_batch_size" "$video_qc_batch_megabytes" "$qc_manifest" "$video_qc_max_dimension" "$video_qc_scale" "$video_qc_adaptive" "$video_qc_adaptive_interval" "$video_qc_adaptive_min_frames" "$video_qc_adaptive_max_frames" "$video_qc_hash_distance"
+
 # will do one loop for open and another for psychs
 echo "Processing new open interviews"
 for p in *; do
@@ -52,11 +61,9 @@ for p in *; do
 	# now safe to start
 	echo "On patient ${p}"
 	
-	# now can run main video QC script on this patient
-	python "$func_root"/interview_video_qc.py "open" "$data_root" "$study" "$p"
-
+	# main video QC for this patient's new interviews was already run by the study level step above
 	# check if video qc crashed and handle that accordingly by treating the interviews as unprocessed and logging/emailing warning about the subject ID
-	if [ $? = 1 ]; then 
+	if [[ ! -e $qc_manifest ]] || grep -q "^open,${p},[^,]*,crashed," "$qc_manifest"; then 
 		echo "Video QC script failed for subject ${p} open interviews today, so they skip being processed - please check manually"
 	
 		# if calling from pipeline make a note it crashed!
@@ -147,11 +154,9 @@ for p in *; do
 	# now safe to start
 	echo "On patient ${p}"
 	
-	# now can run main video QC script on this patient
-	python "$func_root"/interview_video_qc.py "psychs" "$data_root" "$study" "$p"
-
+	# main video QC for this patient's new interviews was already run by the study level step above
 	# check if video qc crashed and handle that accordingly by treating the interviews as unprocessed and logging/emailing warning about the subject ID
-	if [ $? = 1 ]; then 
+	if [[ ! -e $qc_manifest ]] || grep -q "^psychs,${p},[^,]*,crashed," "$qc_manifest"; then 
 		echo "Video QC script failed for subject ${p} psychs interviews today, so they skip being processed - please check manually"
 	
 		# if calling from pipeline make a note it crashed!
@@ -207,4 +212,11 @@ for p in *; do
 
 	# back out of folder before continuing to next patient
 	cd "$data_root"/PROTECTED/"$study"/processed
-done
\ No newline at end of file
+done
+
+# now that all patients are done, write the new QC rows out to the DPDash CSVs in one pass (one rewrite per patient and interview type)
+# if compaction is turned off in the config, the rows stay in the store until the summary checks step materializes them
+if [[ -z "${dpdash_qc_compaction}" || "${dpdash_qc_compaction}" = "Y" || "${dpdash_qc_compaction}" = "y" ]]; then
+	echo "Updating video QC DPDash CSVs"
+	python "$func_root"/dpdash_qc_store.py "$data_root" "$study" "interviewVideoQC"
+fi
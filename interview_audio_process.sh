@@ -273,6 +273,12 @@ echo "Compiling/updating file lists with processing date"
 bash "$repo_root"/individual_modules/run_final_audio_accounting.sh "$data_root" "$study"
 echo ""
 
+# also refresh the study's audio duration index (durations read from file headers only), used by the length limit check and email cost estimates
+# only new or modified files actually need their headers read, so this is fast after the first run for a study
+echo "Updating audio duration index"
+python "$repo_root"/individual_modules/functions_called/audio_duration_index.py "$data_root" "$study"
+echo ""
+
 # add current time for runtime tracking purposes
 now=$(date +"%T")
 echo "Current time: ${now}"
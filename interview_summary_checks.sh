@@ -123,6 +123,11 @@ now=$(date +"%T")
 echo "Current time: ${now}"
 echo ""
 
+# make sure any QC rows still waiting in the per patient DPDash QC stores are written out to the DPDash CSVs before they are checked
+# (only the case when dpdash_qc_compaction is set to "N" in the config, otherwise each QC module already did this at the end of its run)
+python "$repo_root"/individual_modules/functions_called/dpdash_qc_store.py "$data_root" "$study"
+echo ""
+
 # identify any new warnings both from newly processed files (check basic accounting and QC CSVs) and from newly detected SOP issues in raw
 bash "$repo_root"/individual_modules/run_processed_accounting_check.sh "$data_root" "$study"
 echo ""
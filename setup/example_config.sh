@@ -39,6 +39,69 @@ export site_email_list
 export server_version
 export transcription_language
 
+# performance settings for processing large/many files on a shared server
+# if "Y", audio QC reads each file in fixed size blocks instead of loading the whole recording, so memory use stays constant regardless of interview length
+audio_qc_streaming="N"
+export audio_qc_streaming
+# number of worker processes used to run audio QC on new files across the study in parallel
+audio_qc_workers=1
+export audio_qc_workers
+# if "Y", the DPDash QC CSVs are rewritten with the new rows at the end of each QC module, if "N" the new rows are kept in a per patient row log until the summary checks step
+dpdash_qc_compaction="Y"
+export dpdash_qc_compaction
+# number of minutes between the still frames sampled from each new interview video for video QC
+video_frame_interval=4
+export video_frame_interval
+# if "Y", the sampled video frames are decoded straight from the interview video into memory during video QC, rather than saved as JPEGs by the extraction step and loaded back
+video_qc_in_memory="N"
+export video_qc_in_memory
+# if "Y" along with video_qc_in_memory, video QC still saves the decoded frames as JPEGs so they can be audited
+video_audit_frames="N"
+export video_audit_frames
+# number of same size frames passed to the face detector in one call during video QC, and the most memory (in MB) those frames can take up together
+video_qc_batch_size=1
+export video_qc_batch_size
+video_qc_batch_megabytes=512
+export video_qc_batch_megabytes
+# number of worker processes used to run video QC on new interviews across the study in parallel
+video_qc_workers=1
+export video_qc_workers
+# number of interviews each video QC worker handles before it is replaced, and the total memory (in MB) the workers can use before being replaced early - leave blank for no memory limit
+video_qc_worker_tasks=20
+export video_qc_worker_tasks
+video_qc_memory_mb=""
+export video_qc_memory_mb
+# optional downscaling of frames before face detection in video QC - longest side in pixels, and/or a fixed scale factor below 1 - leave both blank to detect at full resolution
+# face boxes are mapped back to full resolution units, so face areas stay comparable; see video_qc_scale_benchmark.py to check agreement on a study's own videos before turning this on
+video_qc_max_dimension=""
+export video_qc_max_dimension
+video_qc_scale=""
+export video_qc_scale
+# if "Y" along with video_qc_in_memory, video QC samples frames adaptively rather than on the fixed video_frame_interval schedule - starting from a sample every video_qc_adaptive_interval minutes,
+# frames are added between neighbouring samples that disagree on face count or confidence, with at least video_qc_adaptive_min_frames and at most video_qc_adaptive_max_frames per interview
+video_qc_adaptive="N"
+export video_qc_adaptive
+video_qc_adaptive_interval=12
+export video_qc_adaptive_interval
+video_qc_adaptive_min_frames=5
+export video_qc_adaptive_min_frames
+video_qc_adaptive_max_frames=30
+export video_qc_adaptive_max_frames
+# if set, video QC reuses the face detection results of an earlier frame for any frame whose 64 bit difference hash differs from it in at most this many bits, rather than running the detector again - leave blank to run detection on every frame
+video_qc_hash_distance=""
+export video_qc_hash_distance
+# number of audio files uploaded to TranscribeMe at once, each over its own SFTP connection
+transcribeme_upload_streams=1
+export transcribeme_upload_streams
+# if set, caps the combined TranscribeMe upload rate across all streams, in megabytes per second - leave blank for no cap
+transcribeme_upload_limit=""
+export transcribeme_upload_limit
+# SFTP server to upload to and pull from - leave blank for TranscribeMe's server (sftp.transcribeme.com, port 22), only meant to be changed for testing against a stand-in server
+transcribeme_host=""
+export transcribeme_host
+transcribeme_port=""
+export transcribeme_port
+
 # finally setup the secure passwords
 # provide path to a hidden .sh file that should be viewable only be the user calling the pipeline
 # if put inside repository folder, make sure the filename is in the gitignore